@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from validate_tech_parity import validate_parity, check_parity
+from parity_order import AdaptiveParity
+from spec_records import SpecRecord, get_schema
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_PATH = os.path.join(ROOT_DIR, ".agent", "skills", "matching-hardware", "resources", "category_rules.json")
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bench")
+
+GATE_VALUES = 3
+MISSING_RATE = 0.05
+NUMERIC_SPREAD = 0.5
+LATENCY_SAMPLE_PAIRS = 1000
+
+Matcher = Callable[[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]], List[Tuple[int, float]]]
+
+
+def match_validate_parity(target: Dict[str, Any], candidates: List[Dict[str, Any]], rules: Dict[str, Any]) -> List[Tuple[int, float]]:
+    matches = []
+    for i, specs in enumerate(candidates):
+        is_match, score, _ = validate_parity(target, specs, rules)
+        if is_match:
+            matches.append((i, score))
+    return matches
+
+
+def match_check_parity(target: Dict[str, Any], candidates: List[Dict[str, Any]], rules: Dict[str, Any]) -> List[Tuple[int, float]]:
+    matches = []
+    for i, specs in enumerate(candidates):
+        is_match, score, _ = check_parity(target, specs, rules)
+        if is_match:
+            matches.append((i, score))
+    return matches
+
+
+_adaptive: Dict[int, AdaptiveParity] = {}
+
+
+def match_adaptive(target: Dict[str, Any], candidates: List[Dict[str, Any]], rules: Dict[str, Any]) -> List[Tuple[int, float]]:
+    # One learner per rules dict, so the order carries over between targets of a category
+    parity = _adaptive.get(id(rules))
+    if parity is None:
+        parity = _adaptive[id(rules)] = AdaptiveParity(str(id(rules)), rules)
+    check = parity.check
+    matches = []
+    for i, specs in enumerate(candidates):
+        is_match, score, _ = check(target, specs)
+        if is_match:
+            matches.append((i, score))
+    return matches
+
+
+_parsed: Dict[int, Tuple[List[Dict[str, Any]], List[SpecRecord]]] = {}
+
+
+def match_records(target: Dict[str, Any], candidates: List[Dict[str, Any]], rules: Dict[str, Any]) -> List[Tuple[int, float]]:
+    # The catalog is parsed once (on the first target) and reused, as a real catalog would be
+    schema = get_schema("bench", rules)
+    cached = _parsed.get(id(candidates))
+    if cached is None or cached[0] is not candidates:
+        cached = _parsed[id(candidates)] = (candidates, schema.parse_all(candidates))
+    return schema.scan(schema.parse(target), cached[1])
+
+
+# Matchers under test, by name: (target specs, candidate specs list, rules) -> [(candidate index, score)]
+MATCHERS: Dict[str, Matcher] = {
+    "validate_parity": match_validate_parity,
+    "check_parity": match_check_parity,
+    "adaptive": match_adaptive,
+    "records": match_records
+}
+
+
+def load_rules(path: str = RULES_PATH) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class SpecGenerator:
+    """
+    Synthetic spec dicts shaped like one category's rules: a few values per gate (with the
+    casing/whitespace noise seen in scraped data), numeric specs spread around a per-category
+    centre, the occasional missing field or numeric-as-string, and structural tiers.
+    """
+    def __init__(self, category: str, rules: Dict[str, Any], seed: int):
+        self.rng = random.Random(f"{seed}:{category}")
+        structural = rules.get("structural_specs", {})
+        self.gates = {
+            feature: structural.get(feature) or [f"{feature}-{i}" for i in range(GATE_VALUES)]
+            for feature in rules.get("gatekeeping", {})
+        }
+        self.centres = {key: self.rng.uniform(5, 2000) for key in rules.get("numeric_specs", [])}
+        self.structural = dict(structural)
+
+    def specs(self) -> Dict[str, Any]:
+        rng = self.rng
+        specs: Dict[str, Any] = {}
+        for feature, values in self.gates.items():
+            if rng.random() < MISSING_RATE:
+                continue
+            value = rng.choice(values)
+            roll = rng.random()
+            if roll < 0.1:
+                value = value.upper()
+            elif roll < 0.15:
+                value = f" {value} "
+            specs[feature] = value
+        for key, centre in self.centres.items():
+            if rng.random() < MISSING_RATE:
+                continue
+            value = round(centre * (1 + rng.uniform(-NUMERIC_SPREAD, NUMERIC_SPREAD)), 2)
+            specs[key] = str(value) if rng.random() < 0.05 else value
+        for key, tiers in self.structural.items():
+            if rng.random() >= MISSING_RATE:
+                specs[key] = rng.choice(tiers)
+        return specs
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def bench_category(category: str, rules: Dict[str, Any], size: int, targets: int, matcher: Matcher, seed: int, memory: bool = True) -> Dict[str, Any]:
+    """
+    Matches `targets` synthetic products against a `size`-candidate catalog.
+    Latency is per target (one full catalog scan, as perform_global_match does per product);
+    the memory peak is taken on a separate single-target pass under tracemalloc.
+    """
+    gen = SpecGenerator(category, rules, seed)
+    catalog = [gen.specs() for _ in range(size)]
+    target_specs = [gen.specs() for _ in range(targets)]
+
+    latencies = []
+    matched = 0
+    started = time.perf_counter()
+    for target in target_specs:
+        t0 = time.perf_counter()
+        matched += len(matcher(target, catalog, rules))
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - started
+    latencies.sort()
+
+    # Per-pair latency on a small slice, to see the tail of individual checks
+    pair_latencies = []
+    sample = catalog[:LATENCY_SAMPLE_PAIRS]
+    for specs in sample:
+        t0 = time.perf_counter_ns()
+        matcher(target_specs[0], [specs], rules)
+        pair_latencies.append((time.perf_counter_ns() - t0) / 1000)
+    pair_latencies.sort()
+
+    peak_kb = None
+    if memory:
+        tracemalloc.start()
+        matcher(target_specs[0], catalog, rules)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_kb = round(peak / 1024, 1)
+
+    pairs = size * targets
+    return {
+        "category": category,
+        "size": size,
+        "targets": targets,
+        "pairs": pairs,
+        "matches": matched,
+        "match_rate": round(matched / pairs, 6) if pairs else 0.0,
+        "seconds": round(wall, 4),
+        "pairs_per_s": round(pairs / wall, 1) if wall else 0.0,
+        "target_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p90": round(_percentile(latencies, 0.90) * 1000, 3),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3)
+        },
+        "pair_us": {
+            "p50": round(_percentile(pair_latencies, 0.50), 3),
+            "p99": round(_percentile(pair_latencies, 0.99), 3)
+        },
+        "match_peak_kb": peak_kb
+    }
+
+
+def run_suite(categories: List[str], sizes: List[int], targets: int, matcher_name: str, seed: int, memory: bool = True) -> Dict[str, Any]:
+    all_rules = load_rules()
+    matcher = MATCHERS[matcher_name]
+    results = []
+    for category in categories:
+        rules = all_rules[category]
+        for size in sizes:
+            result = bench_category(category, rules, size, targets, matcher, seed, memory)
+            results.append(result)
+            print(f"  {category:<13} {size:>8} cand  {result['pairs_per_s']:>12,.0f} pairs/s  "
+                  f"target p50 {result['target_ms']['p50']:.1f}ms p99 {result['target_ms']['p99']:.1f}ms  "
+                  f"peak {result['match_peak_kb']} KB  matches {result['matches']}")
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "matcher": matcher_name,
+        "seed": seed,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Lists regressions beyond `threshold` (fraction): lower throughput, higher p99 target latency
+    or higher memory peak, per (category, size) present in both runs.
+    """
+    base = {(r["category"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["category"], r["size"]))
+        if b is None:
+            continue
+        label = f"{r['category']}@{r['size']}"
+        if b["pairs_per_s"] and r["pairs_per_s"] < b["pairs_per_s"] * (1 - threshold):
+            regressions.append(f"{label}: throughput {b['pairs_per_s']:,.0f} -> {r['pairs_per_s']:,.0f} pairs/s")
+        if b["target_ms"]["p99"] and r["target_ms"]["p99"] > b["target_ms"]["p99"] * (1 + threshold):
+            regressions.append(f"{label}: p99 target latency {b['target_ms']['p99']}ms -> {r['target_ms']['p99']}ms")
+        if b.get("match_peak_kb") and r.get("match_peak_kb") and r["match_peak_kb"] > b["match_peak_kb"] * (1 + threshold):
+            regressions.append(f"{label}: memory peak {b['match_peak_kb']} KB -> {r['match_peak_kb']} KB")
+        if b["matches"] != r["matches"]:
+            regressions.append(f"{label}: match count changed {b['matches']} -> {r['matches']}")
+    return regressions
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _report(regressions: List[str]) -> int:
+    if regressions:
+        print(f"{len(regressions)} regression(s):")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Matching engine benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="Run the benchmark and write a JSON result")
+    run_p.add_argument("--category", action="append", help="Category to run (repeatable, default: all)")
+    run_p.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated catalog sizes, up to 1000000")
+    run_p.add_argument("--targets", type=int, default=20, help="Target products matched per catalog")
+    run_p.add_argument("--matcher", default="validate_parity", choices=sorted(MATCHERS))
+    run_p.add_argument("--seed", type=int, default=7)
+    run_p.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    run_p.add_argument("--out", help="Result JSON path (default: tools/.bench/matching-<timestamp>.json)")
+    run_p.add_argument("--baseline", help="Compare against this result JSON when done")
+    run_p.add_argument("--threshold", type=float, default=0.10, help="Allowed regression as a fraction")
+
+    cmp_p = sub.add_parser("compare", help="Compare two result JSON files")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        sys.exit(_report(compare(_load(args.baseline), _load(args.current), args.threshold)))
+
+    categories = args.category or list(load_rules().keys())
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    print(f"Benchmarking {args.matcher} on {len(categories)} categories x sizes {sizes} ({args.targets} targets each)")
+    result = run_suite(categories, sizes, args.targets, args.matcher, args.seed, memory=not args.no_memory)
+
+    out = args.out or os.path.join(BENCH_DIR, f"matching-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {out}")
+
+    if args.baseline:
+        sys.exit(_report(compare(_load(args.baseline), result, args.threshold)))
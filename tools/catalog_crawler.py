@@ -0,0 +1,374 @@
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+import urllib.parse
+from html.parser import HTMLParser
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from product_extractor import extract_product, parse_price
+from catalog_store import SnapshotWriter, STORE_DIR
+from http_cassette import fetch
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+PRICE_RE = re.compile(r'(?:US\$|U\$S|USD|UYU|CLP|\$)\s*([\d][\d\.,]*)', re.IGNORECASE)
+
+
+class HostLimiter:
+    """
+    Per-host politeness limits.
+    Caps concurrent requests against a host and spaces request starts by `min_interval` seconds.
+    """
+    def __init__(self, max_concurrent: int = 2, min_interval: float = 1.0):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    @contextmanager
+    def slot(self, host: str):
+        with self._lock:
+            sem = self._slots.setdefault(host, threading.Semaphore(self.max_concurrent))
+        with sem:
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start_at + self.min_interval
+            if start_at > now:
+                time.sleep(start_at - now)
+            yield
+
+
+def fetch_page(url: str, limiter: HostLimiter, timeout: int = 15) -> Tuple[Optional[str], bool]:
+    """
+    GETs a page under the host's politeness limit.
+    Returns (body or None, failed): failed is True for network errors, 429 and 5xx, i.e. a page
+    that may well exist but could not be read; a 404 past the last listing page is not a failure.
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    with limiter.slot(host):
+        response = fetch(url, headers={'User-Agent': USER_AGENT}, timeout=timeout)
+    if response.error:
+        print(f"  [Fetch Error] {url}: {response.error}")
+        return None, True
+    if response.status >= 400:
+        print(f"  [HTTP {response.status}] {url}")
+        return None, response.status == 429 or response.status >= 500
+    return response.body, False
+
+
+def fetch_html(url: str, limiter: HostLimiter, timeout: int = 15) -> Optional[str]:
+    """
+    GETs a page under the host's politeness limit. Returns None on HTTP/network errors.
+    """
+    return fetch_page(url, limiter, timeout)[0]
+
+
+class _ListingParser(HTMLParser):
+    """
+    Splits a category page into product "cards".
+    A card starts at an anchor pointing to a product URL and collects all text up to the next product anchor.
+    """
+    def __init__(self, base_url: str, product_link_re: 're.Pattern'):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.product_link_re = product_link_re
+        self.cards: List[Dict[str, Any]] = []
+        self._in_anchor = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'a':
+            href = attrs.get('href')
+            if href and self.product_link_re.search(href):
+                url = urllib.parse.urljoin(self.base_url, href).split('#')[0]
+                if not self.cards or self.cards[-1]['url'] != url:
+                    self.cards.append({'url': url, 'titles': [], 'text': []})
+                self._in_anchor = True
+        elif tag == 'img' and self._in_anchor and attrs.get('alt'):
+            self.cards[-1]['titles'].append(attrs['alt'].strip())
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._in_anchor = False
+
+    def handle_data(self, data):
+        if not self.cards:
+            return
+        text = data.strip()
+        if not text:
+            return
+        card = self.cards[-1]
+        card['text'].append(text)
+        if self._in_anchor:
+            card['titles'].append(text)
+
+
+class _ProductPageParser(HTMLParser):
+    """
+    Reads title, price and page text from a single product page.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title_parts: List[str] = []
+        self.text: List[str] = []
+        self._in_title = False
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'meta':
+            attrs = dict(attrs)
+            key = attrs.get('property') or attrs.get('name') or attrs.get('itemprop')
+            if key and attrs.get('content'):
+                self.meta.setdefault(key.lower(), attrs['content'].strip())
+        elif tag == 'title':
+            self._in_title = True
+        elif tag in ('script', 'style'):
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        elif tag in ('script', 'style') and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title_parts.append(data.strip())
+        elif not self._skip_depth and data.strip():
+            self.text.append(data.strip())
+
+
+class RetailerAdapter:
+    """
+    Base adapter. Subclasses describe one retailer's category pages and how to read product cards from them.
+    """
+    name = ""
+    short_name = ""
+    country = ""
+    currency = None
+    category_urls: Dict[str, str] = {}
+    sitemap_urls: List[str] = []
+    product_link_re = re.compile(r'$^')
+    out_of_stock_markers = ('agotado', 'sin stock')
+    max_pages = 50
+
+    def page_url(self, category_url: str, page: int) -> str:
+        return category_url if page == 1 else f"{category_url}?page={page}"
+
+    def parse_listing(self, html: str, page_url: str, category: str) -> List[Dict[str, Any]]:
+        parser = _ListingParser(page_url, self.product_link_re)
+        parser.feed(html)
+        parser.close()
+
+        products = []
+        for card in parser.cards:
+            title = max(card['titles'], key=len) if card['titles'] else None
+            if not title:
+                continue
+            text = " ".join(card['text'])
+            price_match = PRICE_RE.search(text)
+            lowered = text.lower()
+            products.append({
+                "title": title,
+                "url": card['url'],
+                "price": parse_price(price_match.group(1)) if price_match else None,
+                "currency": self.currency,
+                "available": not any(marker in lowered for marker in self.out_of_stock_markers),
+                "retailer": self.name,
+                "country": self.country,
+                "category": category
+            })
+        return products
+
+    def parse_product(self, html: str, url: str, category: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Parses a single product page (used when product URLs come from sitemaps rather than listings).
+        Structured data (JSON-LD / microdata / dataLayer) wins; meta tags and page text are the fallback.
+        """
+        structured = extract_product(html)
+        if structured and structured.get("name") and structured.get("price") is not None:
+            return {
+                "title": structured["name"],
+                "url": url,
+                "sku": structured.get("sku"),
+                "brand": structured.get("brand"),
+                "price": structured["price"],
+                "currency": structured.get("currency") or self.currency,
+                "available": structured.get("available"),
+                "retailer": self.name,
+                "country": self.country,
+                "category": category,
+                "specs": structured.get("specs") or {}
+            }
+
+        parser = _ProductPageParser()
+        parser.feed(html)
+        parser.close()
+
+        title = parser.meta.get('og:title') or " ".join(p for p in parser.title_parts if p)
+        if not title:
+            return None
+        text = " ".join(parser.text)
+        raw_price = parser.meta.get('product:price:amount') or parser.meta.get('price')
+        if not raw_price:
+            price_match = PRICE_RE.search(text)
+            raw_price = price_match.group(1) if price_match else None
+        lowered = text.lower()
+        return {
+            "title": title,
+            "url": url,
+            "price": parse_price(raw_price),
+            "currency": parser.meta.get('product:price:currency') or self.currency,
+            "available": not any(marker in lowered for marker in self.out_of_stock_markers),
+            "retailer": self.name,
+            "country": self.country,
+            "category": category
+        }
+
+
+class NnetAdapter(RetailerAdapter):
+    name = "nnet.com.uy"
+    short_name = "nnet"
+    country = "uruguay"
+    currency = "USD"
+    category_urls = {
+        "monitors": "https://www.nnet.com.uy/monitor-gamer/"
+    }
+    sitemap_urls = ["https://www.nnet.com.uy/sitemap.xml"]
+    product_link_re = re.compile(r'nnet\.com\.uy/productos/|^/productos/')
+
+
+class WinpyAdapter(RetailerAdapter):
+    name = "winpy.cl"
+    short_name = "winpy"
+    country = "chile"
+    currency = "CLP"
+    category_urls = {
+        "monitors": "https://www.winpy.cl/monitores/"
+    }
+    sitemap_urls = ["https://www.winpy.cl/sitemap.xml"]
+    product_link_re = re.compile(r'winpy\.cl/venta/|^/venta/')
+
+    def page_url(self, category_url: str, page: int) -> str:
+        return category_url if page == 1 else f"{category_url}paged/{page}/"
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (NnetAdapter(), WinpyAdapter())}
+
+
+def crawl_category(adapter: RetailerAdapter, category: str, limiter: HostLimiter, page_pool: ThreadPoolExecutor) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Walks one category's pagination in windows of concurrent page fetches.
+    Stops at the first window that yields no product URL we have not already seen.
+    Returns (products, complete): a failed page fetch (or a missing first page) makes the walk
+    incomplete, and so does reaching `max_pages` while pages still yield new products.
+    """
+    category_url = adapter.category_urls[category]
+    window = max(1, limiter.max_concurrent)
+    seen: Dict[str, Dict[str, Any]] = {}
+    complete = True
+    page = 1
+
+    while page <= adapter.max_pages:
+        pages = list(range(page, min(page + window, adapter.max_pages + 1)))
+        urls = [adapter.page_url(category_url, p) for p in pages]
+        fetched = list(page_pool.map(lambda u: fetch_page(u, limiter), urls))
+
+        new_count = 0
+        for p, url, (html, failed) in zip(pages, urls, fetched):
+            if failed or (p == 1 and not html):
+                complete = False
+            if not html:
+                continue
+            for product in adapter.parse_listing(html, url, category):
+                if product["url"] not in seen:
+                    seen[product["url"]] = product
+                    new_count += 1
+
+        print(f"[{adapter.name}] {category} pages {pages[0]}-{pages[-1]}: +{new_count} products")
+        if new_count == 0 or not complete:
+            break
+        page += window
+    else:
+        # The cap cut the walk short: products past it would read as disappeared in snapshot_diff
+        print(f"[{adapter.name}] {category}: reached max_pages={adapter.max_pages} while pages still had new products")
+        complete = False
+
+    return list(seen.values()), complete
+
+
+def crawl(adapters: List[RetailerAdapter], limiter: HostLimiter, workers: int = 8) -> Tuple[Dict[str, List[Dict[str, Any]]], Set[str]]:
+    """
+    Crawls every (retailer, category) pair concurrently.
+    Returns ({retailer: [product, ...]}, retailers whose crawl failed, stopped early on fetch errors or hit max_pages).
+    """
+    jobs: List[Tuple[RetailerAdapter, str]] = [(a, c) for a in adapters for c in a.category_urls]
+    results: Dict[str, List[Dict[str, Any]]] = {a.name: [] for a in adapters}
+    incomplete: Set[str] = set()
+
+    with ThreadPoolExecutor(max_workers=workers) as page_pool, ThreadPoolExecutor(max_workers=max(1, len(jobs))) as job_pool:
+        futures = [(a, job_pool.submit(crawl_category, a, c, limiter, page_pool)) for a, c in jobs]
+        for adapter, future in futures:
+            try:
+                products, complete = future.result()
+            except Exception as e:
+                print(f"[{adapter.name}] Crawl failed: {e}")
+                incomplete.add(adapter.name)
+                continue
+            results[adapter.name].extend(products)
+            if not complete:
+                incomplete.add(adapter.name)
+
+    return results, incomplete
+
+
+def write_snapshot(adapter: RetailerAdapter, products: List[Dict[str, Any]], store_dir: str = STORE_DIR) -> str:
+    """
+    Appends the crawl as a new segment in the catalog snapshot store. Returns the crawl id.
+    """
+    meta = {"country": adapter.country, "crawled_at": datetime.utcnow().isoformat()}
+    with SnapshotWriter(adapter.name, meta=meta, store_dir=store_dir) as writer:
+        writer.extend(products)
+    return writer.crawl_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent retailer catalog crawler")
+    parser.add_argument("--retailer", action="append", choices=sorted(ADAPTERS), help="Retailer to crawl (repeatable). Defaults to all adapters.")
+    parser.add_argument("--per-host", type=int, default=2, help="Max concurrent requests per host")
+    parser.add_argument("--delay", type=float, default=1.0, help="Min seconds between request starts per host")
+    parser.add_argument("--workers", type=int, default=8, help="Total page fetch threads")
+    args = parser.parse_args()
+
+    adapters = [ADAPTERS[name] for name in (args.retailer or sorted(ADAPTERS))]
+    limiter = HostLimiter(max_concurrent=args.per_host, min_interval=args.delay)
+
+    started = time.monotonic()
+    results, incomplete = crawl(adapters, limiter, workers=args.workers)
+
+    for adapter in adapters:
+        products = results[adapter.name]
+        if adapter.name in incomplete:
+            # A partial snapshot would read as mass removals in snapshot_diff
+            print(f"[{adapter.name}] Crawl incomplete ({len(products)} products); no snapshot written")
+            continue
+        crawl_id = write_snapshot(adapter, products)
+        print(f"[{adapter.name}] {len(products)} products -> snapshot {crawl_id}")
+
+    print(f"Crawl complete in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
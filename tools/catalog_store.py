@@ -0,0 +1,254 @@
+import os
+import re
+import sys
+import json
+import mmap
+import uuid
+import argparse
+import urllib.parse
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+STORE_DIR = os.environ.get("CATALOG_STORE_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "catalog_snapshots")
+
+
+def canonical_sku(value: Optional[str]) -> Optional[str]:
+    """'G27C4 ', 'g27-c4' and 'G27 C4' all map to 'G27C4'."""
+    if not value:
+        return None
+    cleaned = re.sub(r'[^0-9A-Za-z]', '', str(value)).upper()
+    return cleaned or None
+
+
+def canonical_url(url: Optional[str]) -> Optional[str]:
+    """Lowercases the host, drops 'www.', query strings, fragments and trailing slashes."""
+    if not url:
+        return None
+    parts = urllib.parse.urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/') or '/'
+    return f"{host}{path}"
+
+
+def new_crawl_id() -> str:
+    """Sortable by start time and unique even for crawls started in the same second (parallel retailers, quick retries)."""
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+
+
+class SnapshotWriter:
+    """
+    Appends rows to one (retailer, crawl) JSONL segment and builds its URL/SKU -> byte offset index.
+    The index is written when the writer is closed. A `with` block that raises leaves the segment
+    unindexed, so a crashed crawl is never listed as a snapshot; `rebuild_index` can recover it.
+    """
+    def __init__(self, retailer: str, crawl_id: Optional[str] = None, kind: str = "full", meta: Optional[Dict[str, Any]] = None, store_dir: str = STORE_DIR):
+        self.retailer = retailer
+        self.crawl_id = crawl_id or new_crawl_id()
+        self.dir = os.path.join(store_dir, retailer)
+        os.makedirs(self.dir, exist_ok=True)
+        self.path = os.path.join(self.dir, f"{self.crawl_id}.jsonl")
+        self.meta = dict(meta or {}, retailer=retailer, crawl_id=self.crawl_id, kind=kind)
+        self.index: Dict[str, Dict[str, Any]] = {"url": {}, "sku": {}}
+        self.rows = 0
+        # Exclusive create: two writers must never share a segment, or the index offsets go wrong
+        self._f = open(self.path, 'xb')
+        self._offset = 0
+
+    def append(self, row: Dict[str, Any]):
+        line = (json.dumps(row, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        _index_row(self.index, row, self._offset)
+        self._f.write(line)
+        self._offset += len(line)
+        self.rows += 1
+
+    def extend(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            self.append(row)
+
+    def close(self):
+        self._f.close()
+        self.meta["rows"] = self.rows
+        _write_index(self.path, self.meta, self.index)
+
+    def abort(self):
+        """Closes the segment without indexing it."""
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _index_row(index: Dict[str, Dict[str, Any]], row: Dict[str, Any], offset: int):
+    url = canonical_url(row.get("url"))
+    if url:
+        index["url"][url] = offset
+    sku = canonical_sku(row.get("sku"))
+    if sku:
+        index["sku"].setdefault(sku, []).append(offset)
+
+
+def _write_index(segment_path: str, meta: Dict[str, Any], index: Dict[str, Dict[str, Any]]):
+    idx_path = segment_path[:-len(".jsonl")] + ".idx.json"
+    tmp_path = idx_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"meta": meta, "url": index["url"], "sku": index["sku"]}, f)
+    os.replace(tmp_path, idx_path)
+
+
+def rebuild_index(retailer: str, crawl_id: str, kind: Optional[str] = None, store_dir: str = STORE_DIR):
+    """
+    Rescans a segment (e.g. after an interrupted crawl) and rewrites its side index.
+    An existing index keeps its meta (kind, crawl metadata); `kind` overrides it, and a segment
+    that was never indexed defaults to "full".
+    """
+    path = os.path.join(store_dir, retailer, f"{crawl_id}.jsonl")
+    idx_path = path[:-len(".jsonl")] + ".idx.json"
+    meta: Dict[str, Any] = {}
+    if os.path.exists(idx_path):
+        with open(idx_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f).get("meta") or {}
+    index: Dict[str, Dict[str, Any]] = {"url": {}, "sku": {}}
+    rows = 0
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                try:
+                    _index_row(index, json.loads(line), offset)
+                    rows += 1
+                except ValueError:
+                    pass
+            offset += len(line)
+    meta.update(retailer=retailer, crawl_id=crawl_id, kind=kind or meta.get("kind", "full"), rows=rows)
+    _write_index(path, meta, index)
+
+
+class SnapshotReader:
+    """
+    Memory-mapped access to one snapshot segment. Single-row lookups touch only the indexed line.
+    """
+    def __init__(self, retailer: str, crawl_id: str, store_dir: str = STORE_DIR):
+        base = os.path.join(store_dir, retailer, crawl_id)
+        with open(base + ".idx.json", 'r', encoding='utf-8') as f:
+            idx = json.load(f)
+        self.meta: Dict[str, Any] = idx["meta"]
+        self._url_index: Dict[str, int] = idx["url"]
+        self._sku_index: Dict[str, List[int]] = idx["sku"]
+        self._f = open(base + ".jsonl", 'rb')
+        size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def _row_at(self, offset: int) -> Dict[str, Any]:
+        end = self._mm.find(b"\n", offset)
+        return json.loads(self._mm[offset:end if end != -1 else len(self._mm)])
+
+    def get_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        offset = self._url_index.get(canonical_url(url))
+        return self._row_at(offset) if offset is not None else None
+
+    def get_by_sku(self, sku: str) -> List[Dict[str, Any]]:
+        return [self._row_at(o) for o in self._sku_index.get(canonical_sku(sku), [])]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if self._mm is None:
+            return
+        offset = 0
+        size = len(self._mm)
+        while offset < size:
+            end = self._mm.find(b"\n", offset)
+            end = size if end == -1 else end
+            line = self._mm[offset:end]
+            if line.strip():
+                yield json.loads(line)
+            offset = end + 1
+
+    def __len__(self) -> int:
+        return self.meta.get("rows", len(self._url_index))
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def list_retailers(store_dir: str = STORE_DIR) -> List[str]:
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(d for d in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, d)))
+
+
+def list_snapshots(retailer: str, kind: Optional[str] = "full", store_dir: str = STORE_DIR) -> List[str]:
+    """
+    Crawl ids for a retailer, oldest first. Only indexed (completed) segments are listed.
+    """
+    retailer_dir = os.path.join(store_dir, retailer)
+    if not os.path.isdir(retailer_dir):
+        return []
+    crawl_ids = []
+    for name in sorted(os.listdir(retailer_dir)):
+        if not name.endswith(".idx.json"):
+            continue
+        crawl_id = name[:-len(".idx.json")]
+        if kind:
+            with open(os.path.join(retailer_dir, name), 'r', encoding='utf-8') as f:
+                if json.load(f)["meta"].get("kind", "full") != kind:
+                    continue
+        crawl_ids.append(crawl_id)
+    return crawl_ids
+
+
+def open_latest(retailer: str, store_dir: str = STORE_DIR) -> Optional[SnapshotReader]:
+    snapshots = list_snapshots(retailer, store_dir=store_dir)
+    return SnapshotReader(retailer, snapshots[-1], store_dir=store_dir) if snapshots else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog snapshot store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="List retailers and their snapshots")
+    lookup = sub.add_parser("lookup", help="Look up one product in the latest (or given) snapshot")
+    lookup.add_argument("--retailer", required=True)
+    lookup.add_argument("--crawl-id")
+    lookup.add_argument("--url")
+    lookup.add_argument("--sku")
+    rebuild = sub.add_parser("reindex", help="Rebuild a segment's side index")
+    rebuild.add_argument("--retailer", required=True)
+    rebuild.add_argument("--crawl-id", required=True)
+    rebuild.add_argument("--kind", choices=["full", "delta"], help="Label for the segment (default: keep its current kind, else full)")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        for retailer in list_retailers():
+            print(f"{retailer}: {', '.join(list_snapshots(retailer, kind=None)) or '-'}")
+    elif args.cmd == "lookup":
+        reader = SnapshotReader(args.retailer, args.crawl_id) if args.crawl_id else open_latest(args.retailer)
+        if not reader:
+            print(f"No snapshots for {args.retailer}")
+            sys.exit(1)
+        with reader:
+            result = reader.get_by_url(args.url) if args.url else reader.get_by_sku(args.sku)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif args.cmd == "reindex":
+        rebuild_index(args.retailer, args.crawl_id, args.kind)
+        print(f"Rebuilt index for {args.retailer}/{args.crawl_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+JOURNAL_PATH = os.environ.get("CHECKPOINT_JOURNAL") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".journal.sqlite")
+
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT,
+    at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_run ON events (run_id, seq);
+CREATE TABLE IF NOT EXISTS run_meta (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+
+def item_key(*parts: Any) -> str:
+    """Stable key for a work item made of several fields, e.g. item_key(country, retailer, brand, sku)."""
+    return json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+
+
+class Journal:
+    """
+    Append-only record of a long run's work items in SQLite (WAL), one event per state change:
+    started -> done (with a JSON result) or failed. Every event is committed on its own, so a
+    crash loses at most the item in flight. With resume=True the latest unfinished run of the
+    same name is continued: is_done()/result() answer from the journal, so finished items are
+    skipped without repeating their searches, and inputs saved with set_meta() (e.g. the work
+    list) can be reloaded instead of re-reading whole tables. Safe to share between threads.
+    """
+    def __init__(self, name: str, resume: bool = False, path: str = JOURNAL_PATH):
+        self.name = name
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Tuple[str, Optional[str]]] = {}
+
+        row = None
+        if resume:
+            row = self._db.execute(
+                "SELECT run_id FROM runs WHERE name = ? AND finished_at IS NULL ORDER BY run_id DESC LIMIT 1", (name,)
+            ).fetchone()
+        if row:
+            self.run_id = row[0]
+            self.resumed = True
+            for item, state, result in self._db.execute("SELECT item, state, result FROM events WHERE run_id = ? ORDER BY seq", (self.run_id,)):
+                self._latest[item] = (state, result)
+        else:
+            self.run_id = self._db.execute("INSERT INTO runs (name, started_at) VALUES (?, ?)", (name, datetime.utcnow().isoformat())).lastrowid
+            self.resumed = False
+
+    def _append(self, item: str, state: str, result: Any = None):
+        raw = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO events (run_id, item, state, result, at) VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, item, state, raw, datetime.utcnow().isoformat())
+            )
+            self._latest[item] = (state, raw)
+
+    def start(self, item: str):
+        self._append(item, STARTED)
+
+    def done(self, item: str, result: Any = None):
+        self._append(item, DONE, result)
+
+    def failed(self, item: str, error: str):
+        self._append(item, FAILED, {"error": error})
+
+    def state(self, item: str) -> Optional[str]:
+        entry = self._latest.get(item)
+        return entry[0] if entry else None
+
+    def is_done(self, item: str) -> bool:
+        return self.state(item) == DONE
+
+    def result(self, item: str) -> Any:
+        entry = self._latest.get(item)
+        return json.loads(entry[1]) if entry and entry[1] is not None else None
+
+    def pending(self, items: Iterable[str]) -> List[str]:
+        """Items not yet done (never seen, interrupted while started, or failed)."""
+        return [item for item in items if not self.is_done(item)]
+
+    def set_meta(self, name: str, value: Any):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO run_meta VALUES (?, ?, ?)", (self.run_id, name, json.dumps(value, ensure_ascii=False, default=str)))
+
+    def meta(self, name: str, default: Any = None) -> Any:
+        row = self._db.execute("SELECT value FROM run_meta WHERE run_id = ? AND name = ?", (self.run_id, name)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for state, _ in self._latest.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def finish(self):
+        """Marks the run complete: the next --resume starts a fresh run."""
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (datetime.utcnow().isoformat(), self.run_id))
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def describe(self) -> str:
+        counts = self.counts()
+        summary = ", ".join(f"{n} {s}" for s, n in sorted(counts.items())) or "no items yet"
+        return f"{'Resuming' if self.resumed else 'Started'} run {self.run_id} of '{self.name}' ({summary})"
+
+
+def list_runs(path: str = JOURNAL_PATH) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute("""
+            SELECT r.run_id, r.name, r.started_at, r.finished_at,
+                   (SELECT COUNT(DISTINCT item) FROM events e WHERE e.run_id = r.run_id)
+            FROM runs r ORDER BY r.run_id
+        """).fetchall()
+    finally:
+        db.close()
+    return [{"run_id": r[0], "name": r[1], "started_at": r[2], "finished_at": r[3], "items": r[4]} for r in rows]
+
+
+def prune_finished(path: str = JOURNAL_PATH) -> int:
+    """Drops events of finished runs (their results already live in the database)."""
+    db = sqlite3.connect(path)
+    try:
+        with db:
+            deleted = db.execute("DELETE FROM events WHERE run_id IN (SELECT run_id FROM runs WHERE finished_at IS NOT NULL)").rowcount
+            db.execute("DELETE FROM run_meta WHERE run_id IN (SELECT run_id FROM runs WHERE finished_at IS NOT NULL)")
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the checkpoint journal of long discovery runs")
+    parser.add_argument("command", choices=["list", "prune"])
+    parser.add_argument("--path", default=JOURNAL_PATH)
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        print(f"Deleted {prune_finished(args.path)} events of finished runs.")
+    runs = list_runs(args.path)
+    if not runs:
+        print("No journaled runs.")
+    for run in runs:
+        status = f"finished {run['finished_at']}" if run["finished_at"] else "UNFINISHED (resumable)"
+        print(f"  #{run['run_id']:<4} {run['name']:<28} started {run['started_at']}  {run['items']:>6} items  {status}")
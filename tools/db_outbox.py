@@ -0,0 +1,390 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_trace import span, count
+
+OUTBOX_PATH = os.environ.get("DB_OUTBOX_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".db_outbox.sqlite")
+
+BATCH_ROWS = 500
+BASE_DELAY = 2.0
+MAX_DELAY = 300.0
+# After this many failed replays an operation is parked as dead (see `retry-dead`)
+MAX_ATTEMPTS = 10
+# Inline retries for a stale PostgREST schema cache, as retry_upsert used to do
+SCHEMA_CACHE_RETRIES = 3
+SCHEMA_CACHE_WAIT = 1.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    op TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    on_conflict TEXT,
+    filters TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    dead INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+)
+"""
+
+Filter = Tuple[str, str, Any]
+
+
+WRITTEN_OPS = {"upsert": "upserted", "insert": "inserted", "update": "updated", "delete": "deleted"}
+
+
+def _row_count(op: str, payload: Any, filters: Optional[List[Filter]]) -> int:
+    if op in ("upsert", "insert"):
+        return len(payload)
+    # Updates/deletes target one row per eq filter, or one per id of an in_ filter
+    ids = [value for method, _, value in filters or [] if method == "in_"]
+    return len(ids[0]) if ids else 1
+
+
+def _schema_cache_miss(error: Exception) -> bool:
+    text = str(error)
+    return 'PGRST205' in text or 'Could not find the table' in text
+
+
+ERROR_CODE_RE = re.compile(r"""['"]code['"]\s*:\s*['"]?(\w+)""")
+# SQLSTATE classes a replay can't fix: data exceptions, constraint violations, bad SQL/columns
+PERMANENT_SQLSTATES = ("22", "23", "42")
+
+
+def _error_code(error: Exception) -> Optional[str]:
+    # PostgREST/SQLSTATE codes are strings; an int `code` is an HTTP status (see _status_code)
+    code = getattr(error, "code", None)
+    if not isinstance(code, str):
+        match = ERROR_CODE_RE.search(str(error))
+        code = match.group(1) if match else None
+    return code
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for status in (getattr(error, "status_code", None), getattr(getattr(error, "response", None), "status_code", None), getattr(error, "code", None)):
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_permanent(error: Exception) -> bool:
+    """
+    True for errors replaying the same write can't fix: constraint violations, invalid input,
+    unknown columns, other 4xx request errors. Outages, timeouts, 5xx, 429 and a stale schema
+    cache (PGRST205) are transient; so is anything unrecognised.
+    """
+    if _schema_cache_miss(error):
+        return False
+    code = _error_code(error)
+    if code:
+        if code.startswith("PGRST"):
+            # PGRST0xx: PostgREST couldn't reach the database or timed out
+            return not code.startswith("PGRST0")
+        if len(code) == 5 and code[:2] in PERMANENT_SQLSTATES:
+            return True
+    status = _status_code(error)
+    if status is not None:
+        return 400 <= status < 500 and status not in (408, 429)
+    text = str(error).lower()
+    return "violates" in text or "invalid input" in text
+
+
+def _columns(rows: Any) -> Optional[frozenset]:
+    """The column set every row writes, or None if the rows disagree (such an op is never merged)."""
+    if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+        return None
+    columns = frozenset(rows[0])
+    return columns if all(frozenset(row) == columns for row in rows[1:]) else None
+
+
+class OutboxRejected(Exception):
+    """A queued write the database refused for good; it stays parked as dead (see `retry-dead`)."""
+    def __init__(self, seq: int, table_name: str, op: str, error: str):
+        super().__init__(f"{op} into {table_name} rejected: {error}")
+        self.seq = seq
+        self.table_name = table_name
+        self.op = op
+        self.error = error
+
+
+class Outbox:
+    """
+    Durable queue of database writes in a local SQLite file (WAL).
+    Every write is committed to the outbox before it is sent, then replayed in order:
+    consecutive upserts/inserts into the same table that set the same columns are merged into
+    batches of up to BATCH_ROWS rows (later rows win on the conflict key). Only one flush
+    delivers at a time, and it sends outside the queue lock, so enqueue() never waits on the
+    network. A failed batch stays queued with
+    exponential backoff, and later writes to that table wait behind it so per-table order
+    holds; other tables keep flowing. Writes the database refuses for good (see is_permanent)
+    are parked as dead at once and listed in `parked` instead of blocking the queue.
+    Whatever is left is replayed by the next write, the next run, or `db_outbox.py flush`.
+    """
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(SCHEMA)
+        # Guards the SQLite handle; held only for local reads and writes
+        self._lock = threading.RLock()
+        # Serializes deliveries, so no op is sent twice by concurrent flushes
+        self._flush_lock = threading.RLock()
+        # Ops the last flush() parked as dead: refused for good, or out of attempts
+        self.parked: List[OutboxRejected] = []
+
+    def enqueue(self, table_name: str, op: str, rows: Any, on_conflict: Optional[str] = None, filters: Optional[List[Filter]] = None) -> int:
+        """Records one write; nothing is sent until flush(). Returns its queue sequence number."""
+        with self._lock:
+            return self._db.execute(
+                "INSERT INTO outbox (table_name, op, rows, on_conflict, filters, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (table_name, op, json.dumps(rows, ensure_ascii=False, default=str), on_conflict,
+                 json.dumps(filters, default=str) if filters else None, datetime.utcnow().isoformat())
+            ).lastrowid
+
+    def _deliver(self, client, seq: int) -> bool:
+        # True once the op is sent; raises if the database refused it, like a direct write would
+        with self._flush_lock:
+            self.flush(client)
+            for rejected in self.parked:
+                if rejected.seq == seq:
+                    raise rejected
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM outbox WHERE seq = ?", (seq,)).fetchone() is None
+
+    def upsert(self, client, table_name: str, rows: Any, on_conflict: str) -> bool:
+        """
+        Queues an upsert (one row dict or a list) and tries to deliver the queue. True if it was
+        delivered, False if it stays queued; raises OutboxRejected if the database refused it.
+        """
+        return self._deliver(client, self.enqueue(table_name, "upsert", rows if isinstance(rows, list) else [rows], on_conflict))
+
+    def insert(self, client, table_name: str, rows: Any) -> bool:
+        return self._deliver(client, self.enqueue(table_name, "insert", rows if isinstance(rows, list) else [rows]))
+
+    def update(self, client, table_name: str, values: Dict[str, Any], filters: List[Filter]) -> bool:
+        """Queues `update(values)` narrowed by filters such as [("eq", "id", 5)] or [("in_", "id", ids)]."""
+        return self._deliver(client, self.enqueue(table_name, "update", values, filters=filters))
+
+    def delete(self, client, table_name: str, filters: List[Filter]) -> bool:
+        return self._deliver(client, self.enqueue(table_name, "delete", {}, filters=filters))
+
+    def _due(self, now: Optional[float] = None) -> List[Tuple[Any, ...]]:
+        """
+        Live ops in order. With `now`, a table's ops from its first one still backing off onward
+        are left out, so later writes never overtake a pending one.
+        """
+        with self._lock:
+            ops = self._db.execute(
+                "SELECT seq, table_name, op, rows, on_conflict, filters, attempts, next_attempt_at FROM outbox WHERE dead = 0 ORDER BY seq"
+            ).fetchall()
+        waiting: Set[str] = set()
+        due = []
+        for op in ops:
+            if now is not None and op[7] > now:
+                waiting.add(op[1])
+            if op[1] not in waiting:
+                due.append(op[:7])
+        return due
+
+    def _batches(self, ops: List[Tuple[Any, ...]]) -> List[Tuple[List[int], int, str, str, Any, Optional[str], Any]]:
+        """
+        Groups queued ops, in order, into (seqs, attempts, table, op, payload, on_conflict, filters).
+        Only consecutive row writes to the same table/conflict key are merged, so replay order holds,
+        and only when every row sets the same columns: PostgREST sends the union of the keys, so a
+        row merged with wider ones would have its missing columns overwritten with NULL.
+        """
+        batches = []
+        last_columns = None
+        for seq, table_name, op, raw_rows, on_conflict, raw_filters, attempts in ops:
+            payload = json.loads(raw_rows)
+            filters = json.loads(raw_filters) if raw_filters else None
+            columns = _columns(payload) if op in ("upsert", "insert") else None
+            last = batches[-1] if batches else None
+            if (columns is not None and last and columns == last_columns and last[3] == op and last[2] == table_name
+                    and last[5] == on_conflict and len(last[4]) + len(payload) <= BATCH_ROWS):
+                last[0].append(seq)
+                last[4].extend(payload)
+                batches[-1] = (last[0], max(last[1], attempts), *last[2:])
+            else:
+                batches.append(([seq], attempts, table_name, op, payload, on_conflict, filters))
+                last_columns = columns
+        return batches
+
+    @staticmethod
+    def _dedupe(rows: List[Dict[str, Any]], on_conflict: Optional[str]) -> List[Dict[str, Any]]:
+        # Postgres rejects an upsert that touches the same row twice; the latest write wins
+        if not on_conflict:
+            return rows
+        keys = [k.strip() for k in on_conflict.split(",")]
+        latest: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+        for row in rows:
+            latest[tuple(json.dumps(row.get(k), default=str) for k in keys)] = row
+        return list(latest.values())
+
+    def _send(self, client, table_name: str, op: str, payload: Any, on_conflict: Optional[str], filters: Optional[List[Filter]]):
+        table = client.table(table_name)
+        if op == "upsert":
+            query = table.upsert(self._dedupe(payload, on_conflict), on_conflict=on_conflict)
+        elif op == "insert":
+            query = table.insert(payload)
+        elif op == "update":
+            query = table.update(payload)
+        elif op == "delete":
+            query = table.delete()
+        else:
+            raise ValueError(f"Unknown outbox operation {op!r}")
+        for method, column, value in filters or []:
+            query = getattr(query, method)(column, value)
+        for attempt in range(SCHEMA_CACHE_RETRIES):
+            try:
+                return query.execute()
+            except Exception as e:
+                # A stale schema cache (e.g. right after table setup) usually clears within seconds
+                if not _schema_cache_miss(e) or attempt == SCHEMA_CACHE_RETRIES - 1:
+                    raise
+                time.sleep(SCHEMA_CACHE_WAIT)
+
+    def flush(self, client, force: bool = False) -> int:
+        """
+        Replays queued writes, in order per table; returns how many operations are still pending.
+        Tables waiting out a backoff are skipped unless `force`; ops parked as dead during this
+        flush are listed in `self.parked`. The pending ops are read once under the queue lock and
+        sent without it; writes enqueued meanwhile wait for the next flush.
+        """
+        with self._flush_lock:
+            self.parked = []
+            if client is None:
+                return self.pending()
+            blocked: Set[str] = set()
+            batches = self._batches(self._due(None if force else time.time()))
+            while batches:
+                seqs, attempts, table_name, op, payload, on_conflict, filters = batches.pop(0)
+                if table_name in blocked:
+                    continue
+                marks = ",".join("?" * len(seqs))
+                try:
+                    with span("db_write", table=table_name, op=op, outbox=True):
+                        self._send(client, table_name, op, payload, on_conflict, filters)
+                except Exception as e:
+                    permanent = is_permanent(e)
+                    if permanent and len(seqs) > 1:
+                        # One bad row fails the merged batch; replay its ops one by one to park only that op
+                        with self._lock:
+                            ops = self._db.execute(
+                                f"SELECT seq, table_name, op, rows, on_conflict, filters, attempts FROM outbox WHERE seq IN ({marks}) ORDER BY seq", seqs
+                            ).fetchall()
+                        batches[:0] = [self._batches([single])[0] for single in ops]
+                        continue
+                    attempts += 1
+                    delay = min(MAX_DELAY, BASE_DELAY * 2 ** (attempts - 1) * random.uniform(0.8, 1.2))
+                    dead = permanent or attempts >= MAX_ATTEMPTS
+                    with self._lock:
+                        self._db.execute(
+                            f"UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, dead = ? WHERE seq IN ({marks})",
+                            (attempts, time.time() + delay, str(e)[:500], int(dead), *seqs)
+                        )
+                    count("outbox_failures", table=table_name, op=op, permanent=permanent)
+                    if dead:
+                        self.parked.extend(OutboxRejected(seq, table_name, op, str(e)[:500]) for seq in seqs)
+                        outcome = "parked as dead, see `db_outbox.py retry-dead`"
+                    else:
+                        # Later writes to this table wait behind it; other tables carry on
+                        blocked.add(table_name)
+                        outcome = f"retry in {delay:.0f}s"
+                    print(f"Outbox: {op} into {table_name} failed (attempt {attempts}, {outcome}): {e}")
+                    continue
+                with self._lock:
+                    self._db.execute(f"DELETE FROM outbox WHERE seq IN ({marks})", seqs)
+                count("rows_written", _row_count(op, payload, filters), table=table_name, op=WRITTEN_OPS[op])
+            return self.pending()
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def dead(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox WHERE dead = 1").fetchone()[0]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            per_table = self._db.execute(
+                "SELECT table_name, op, dead, COUNT(*), MAX(attempts), MIN(created_at) FROM outbox GROUP BY table_name, op, dead ORDER BY table_name"
+            ).fetchall()
+            last_error = self._db.execute("SELECT last_error FROM outbox WHERE last_error IS NOT NULL ORDER BY seq DESC LIMIT 1").fetchone()
+        return {
+            "pending": self.pending(),
+            "dead": self.dead(),
+            "groups": [{"table": t, "op": o, "dead": bool(d), "ops": n, "max_attempts": a, "oldest": c} for t, o, d, n, a, c in per_table],
+            "last_error": last_error[0] if last_error else None
+        }
+
+    def retry_dead(self) -> int:
+        with self._lock:
+            return self._db.execute("UPDATE outbox SET dead = 0, attempts = 0, next_attempt_at = 0 WHERE dead = 1").rowcount
+
+    def close(self):
+        self._db.close()
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Process-wide outbox at DB_OUTBOX_PATH."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
+
+
+def flush_report(client, label: str) -> int:
+    """Flushes the process outbox and prints what stays queued or was parked; returns the pending count."""
+    outbox = get_outbox()
+    pending = outbox.flush(client)
+    if pending:
+        print(f"{label}: {pending} write operations queued in the local outbox; replay with 'python tools/db_outbox.py flush'.")
+    for rejected in outbox.parked:
+        print(f"{label}: rejected by the database and parked as dead: {rejected}")
+    return pending
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay the local database outbox")
+    parser.add_argument("command", choices=["status", "flush", "retry-dead"])
+    parser.add_argument("--force", action="store_true", help="Replay even ops that are still backing off")
+    args = parser.parse_args()
+
+    outbox = get_outbox()
+    if args.command == "retry-dead":
+        print(f"Re-queued {outbox.retry_dead()} dead operations.")
+    if args.command in ("flush", "retry-dead"):
+        from supabase_ingest import get_supabase_client
+        left = outbox.flush(get_supabase_client(), force=True if args.command == "retry-dead" else args.force)
+        print(f"{left} operations still pending, {len(outbox.parked)} parked as dead by this replay.")
+    status = outbox.status()
+    print(f"Outbox {outbox.path}: {status['pending']} pending operations, {status['dead']} dead")
+    for group in status["groups"]:
+        state = "DEAD" if group["dead"] else "pending"
+        print(f"  {group['table']:<24} {group['op']:<7} {group['ops']:>6} ops  {state}  max attempts {group['max_attempts']}  oldest {group['oldest']}")
+    if status["last_error"]:
+        print(f"Last error: {status['last_error']}")
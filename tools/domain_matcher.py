@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import threading
+import urllib.parse
+from typing import Dict, Any, List, Optional, Iterable
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retailer_config.json")
+
+ALLOW = 1
+BLOCK = 2
+_END = ""  # trie key holding the verdict for a complete domain
+
+
+def host_of(url: str) -> Optional[str]:
+    """
+    Lowercased hostname of a URL (scheme optional), without port, credentials or trailing dot.
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if "://" not in url and not url.startswith("//"):
+        url = "//" + url
+    try:
+        host = urllib.parse.urlsplit(url).hostname
+    except ValueError:
+        return None
+    return host.rstrip(".") if host else None
+
+
+def _insert(trie: Dict[str, Any], domain: str, verdict: int):
+    node = trie
+    for label in reversed(domain.lower().strip(".").split(".")):
+        node = node.setdefault(label, {})
+    node[_END] = node.get(_END, 0) | verdict
+
+
+class DomainMatcher:
+    """
+    Per-country whitelist/blacklist compiled into tries over reversed domain labels.
+    A listed domain matches itself and its subdomains only ("pcfactory.cl" matches "www.pcfactory.cl",
+    never "notpcfactory.cl" or "pcfactory.cl.evil.com"). Blacklist wins over whitelist; unknown hosts are rejected.
+    """
+    def __init__(self, config: Dict[str, Any]):
+        self.tries: Dict[str, Dict[str, Any]] = {}
+        for country, lists in config.items():
+            trie: Dict[str, Any] = {}
+            for domain in lists.get("whitelist", []):
+                _insert(trie, domain, ALLOW)
+            for domain in lists.get("blacklist", []):
+                _insert(trie, domain, BLOCK)
+            self.tries[country.lower()] = trie
+
+    def countries(self) -> List[str]:
+        return list(self.tries)
+
+    def verdict(self, host: Optional[str], country: str) -> int:
+        """
+        0 = unknown, ALLOW or BLOCK for a bare hostname.
+        """
+        trie = self.tries.get(country.lower())
+        if not trie or not host:
+            return 0
+        node = trie
+        result = 0
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            result |= node.get(_END, 0)
+        return BLOCK if result & BLOCK else result
+
+    def is_allowed(self, url: str, country: str) -> bool:
+        return self.verdict(host_of(url), country) == ALLOW
+
+    def filter_urls(self, urls: Iterable[str], country: str) -> List[bool]:
+        """
+        Bulk check: one boolean per URL. Hosts are resolved once per distinct host.
+        """
+        seen: Dict[Optional[str], bool] = {}
+        mask = []
+        for url in urls:
+            host = host_of(url)
+            allowed = seen.get(host)
+            if allowed is None:
+                allowed = seen[host] = self.verdict(host, country) == ALLOW
+            mask.append(allowed)
+        return mask
+
+    def allowed_urls(self, urls: Iterable[str], country: str) -> List[str]:
+        urls = list(urls)
+        return [u for u, ok in zip(urls, self.filter_urls(urls, country)) if ok]
+
+    def retailer_for(self, url: str, country: str) -> Optional[str]:
+        """
+        The whitelisted domain a URL belongs to (e.g. 'https://www.winpy.cl/venta/x' -> 'winpy.cl').
+        """
+        host = host_of(url)
+        trie = self.tries.get(country.lower())
+        if not trie or not host:
+            return None
+        labels = list(reversed(host.split(".")))
+        node = trie
+        match = None
+        for depth, label in enumerate(labels):
+            node = node.get(label)
+            if node is None:
+                break
+            verdict = node.get(_END, 0)
+            if verdict & BLOCK:
+                return None
+            if verdict & ALLOW:
+                match = ".".join(reversed(labels[:depth + 1]))
+        return match
+
+
+_cache_lock = threading.Lock()
+_cache: Dict[str, Any] = {}
+
+
+def get_matcher(config_path: str = CONFIG_PATH) -> DomainMatcher:
+    """
+    Returns the compiled matcher for `retailer_config.json`, recompiling only when the file changes.
+    """
+    try:
+        mtime = os.path.getmtime(config_path)
+    except OSError:
+        print(f"Warning: retailer_config.json not found at {config_path}")
+        return DomainMatcher({})
+    with _cache_lock:
+        cached = _cache.get(config_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(config_path, 'r') as f:
+            matcher = DomainMatcher(json.load(f))
+        _cache[config_path] = (mtime, matcher)
+        return matcher
+
+
+if __name__ == "__main__":
+    matcher = get_matcher()
+    tests = [
+        "https://www.pcfactory.cl/producto/1",
+        "https://mercadolibre.cl/msi",
+        "https://notpcfactory.cl/x",
+        "https://pcfactory.cl.evil.com/x",
+        "https://randomstore.cl",
+        "www.winpy.cl/venta/monitor"
+    ]
+    for url, ok in zip(tests, matcher.filter_urls(tests, "chile")):
+        print(f"{'ALLOW' if ok else 'BLOCK'}  {url}")
@@ -3,13 +3,18 @@ import sys
 import os
 import json
 import argparse
-from typing import Dict, Any
+from typing import Dict, Any, List, Iterable, Tuple
 
 # Ensure sibling imports work
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from perform_global_match import perform_global_match
+from perform_global_match import perform_global_match, search_plan, evaluate_candidate
 from push_match_results import push_results
+from rival_search_client import RivalSearchClient
+from parity_order import AdaptiveParity, load_selectivity, save_selectivity
+from parity_memo import open_memo
+from stream_pipeline import StreamPipeline, Stage, Sink
+from pipeline_trace import span, count, start_run, finish_run
 
 def load_category_rules(category: str) -> Dict[str, Any]:
     """
@@ -50,14 +55,16 @@ def process_product(product_spec: Dict[str, Any]):
     print(f"--- Processing {product_spec.get('product_name')} ({category}) ---")
     
     # 1. Load Rules
-    rules = load_category_rules(category)
+    with span("rules_load", category=category):
+        rules = load_category_rules(category)
     if not rules:
         print(f"Error: No rules found for category '{category}'")
         return
         
     # 2. Global Match
     print(f"Phase 1: Global Matching (Tolerance: {rules.get('tolerance'):.0%})")
-    global_matches = perform_global_match(category, product_spec.get("specs"), rules)
+    with span("global_match", category=category):
+        global_matches = perform_global_match(category, product_spec.get("specs"), rules)
     
     if not global_matches:
         print("No global matches found. Stopping.")
@@ -66,15 +73,86 @@ def process_product(product_spec: Dict[str, Any]):
     print(f"Found {len(global_matches)} Global Candidates. Storing in Database.")
     
     # 3. Push Global Matches to DB (Without Price)
-    push_results(global_matches, product_id)
+    with span("push", product_id=product_id):
+        push_results(global_matches, product_id)
     print("--- Global Match Process Complete ---")
 
+def process_products_streaming(products: List[Dict[str, Any]], search_workers: int = 8, batch_size: int = 50) -> Dict[str, Any]:
+    """
+    Global match for many products as one streamed run:
+    (product, brand) tasks -> search (threads) -> parity -> push_results in batches.
+    Searches for later products overlap parity and DB writes for earlier ones, and bounded
+    queues keep memory flat; matches reach the database while the run is still going.
+    """
+    client = RivalSearchClient()
+    stats = load_selectivity()
+    rules_by_category: Dict[str, Any] = {}
+    parities: Dict[str, AdaptiveParity] = {}
+    memo = open_memo()
+    known: Dict[str, Any] = {}
+
+    def tasks() -> Iterable[Tuple[Dict[str, Any], Dict[str, Any], str, str]]:
+        for product in products:
+            category = product.get("category")
+            if category not in rules_by_category:
+                rules_by_category[category] = load_category_rules(category)
+            rules = rules_by_category[category]
+            if not rules:
+                print(f"Error: No rules found for category '{category}'")
+                continue
+            for tier, brand in search_plan(rules):
+                yield product, rules, tier, brand
+
+    def search(task):
+        product, rules, tier, brand = task
+        candidates = client.search_global_model(brand, product["category"], product.get("specs"))
+        count("candidates_checked", len(candidates), category=product["category"])
+        return [(product, rules, tier, brand, cand) for cand in candidates]
+
+    def validate(item):
+        product, rules, tier, brand, cand = item
+        category = product["category"]
+        product_id = product.get("id", "unknown-id")
+        parity = parities.get(category)
+        if parity is None:
+            parity = parities[category] = AdaptiveParity(category, rules, stats)
+        if memo and product_id not in known:
+            known[product_id] = memo.target(category, product.get("specs"), rules)
+        if evaluate_candidate(cand, product.get("specs"), tier, brand, category, rules, parity, known.get(product_id)):
+            return [(product_id, cand)]
+        return []
+
+    def write(batch):
+        by_product: Dict[str, List[Dict[str, Any]]] = {}
+        for product_id, cand in batch:
+            by_product.setdefault(product_id, []).append(cand)
+        for product_id, matches in by_product.items():
+            with span("push", product_id=product_id):
+                push_results(matches, product_id)
+
+    pipeline = StreamPipeline(
+        tasks(),
+        [Stage("search", search, workers=search_workers), Stage("parity", validate, inline=True)],
+        Sink("push", write, batch_size=batch_size)
+    )
+    try:
+        summary = pipeline.run()
+    finally:
+        for parity in parities.values():
+            parity.finish()
+        try:
+            save_selectivity(stats)
+        except OSError as e:
+            print(f"Warning: could not save parity selectivity stats: {e}")
+        if memo:
+            memo.close()
+    print(f"--- Streamed Global Match Complete: {summary['sink']['written']} matches pushed in {summary['sink']['batches']} batches ({summary['seconds']:.1f}s) ---")
+    return summary
+
 if __name__ == "__main__":
-    # Example Usage: python tools/engine_orchestrator.py --spec '{"..."}'
-    # parser = argparse.ArgumentParser()
-    # ...
+    # Example Usage: python tools/engine_orchestrator.py --products products.json --stream
     
-    # HARDCODED TEST for verification
+    # HARDCODED TEST for verification (used when --products is not given)
     test_spec = {
         "id": "test-uuid-123",
         "product_name": "My MSI Clone Monitor",
@@ -89,4 +167,21 @@ if __name__ == "__main__":
         }
     }
     
-    process_product(test_spec)
+    parser = argparse.ArgumentParser(description="Global competitor matching")
+    parser.add_argument("--products", help="JSON file with a list of product specs (default: built-in test product)")
+    parser.add_argument("--stream", action="store_true", help="Stream all products through search -> parity -> push")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent searches in --stream mode")
+    args = parser.parse_args()
+
+    products = [test_spec]
+    if args.products:
+        with open(args.products, 'r') as f:
+            products = json.load(f)
+
+    start_run("engine")
+    if args.stream:
+        process_products_streaming(products, search_workers=args.workers)
+    else:
+        for product in products:
+            process_product(product)
+    finish_run()
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import http.client
 import re
@@ -7,6 +8,11 @@ from dotenv import load_dotenv
 
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_outbox import get_outbox, flush_report
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -68,7 +74,7 @@ def main():
         url = get_correct_url(sku, brand, retailer)
         if url:
             print(f"Restored URL for {brand} {sku}: {url}")
-            supabase.table('monitors_regional').update({'product_page_url': url, 'available': True}).eq('id', record_id).execute()
+            get_outbox().enqueue('monitors_regional', 'update', {'product_page_url': url, 'available': True}, filters=[('eq', 'id', record_id)])
             restored += 1
         else:
             print(f"Not actively found via Google (likely not carried anymore): {brand} {sku}")
@@ -87,9 +93,10 @@ def main():
         url = get_correct_url(sku, brand, retailer)
         if url:
             print(f"Restored URL for {brand} {sku}: {url}")
-            supabase.table('monitors_regional').update({'product_page_url': url, 'available': True}).eq('id', record_id).execute()
+            get_outbox().enqueue('monitors_regional', 'update', {'product_page_url': url, 'available': True}, filters=[('eq', 'id', record_id)])
             ur_restored += 1
             
+    flush_report(supabase, 'monitors_regional')
     print(f"\nCompleted! Recreated {restored} Winpy.cl links and {ur_restored} Nnet.com.uy links perfectly from Google.")
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import http.client
 import re
@@ -7,6 +8,11 @@ from dotenv import load_dotenv
 
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_outbox import get_outbox, flush_report
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -109,10 +115,12 @@ def main():
             updates['price'] = price
         
         if updates:
-            supabase.table('monitors_regional').update(updates).eq('id', record['id']).execute()
-            print(f"  Updated: Available={available}, Price={price}")
+            get_outbox().enqueue('monitors_regional', 'update', updates, filters=[('eq', 'id', record['id'])])
+            print(f"  Queued update: Available={available}, Price={price}")
         else:
             print(f"  No updates found for {sku}")
 
+    flush_report(supabase, 'monitors_regional')
+
 if __name__ == "__main__":
     main()
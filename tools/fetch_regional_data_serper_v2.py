@@ -2,9 +2,14 @@ import os
 import json
 import http.client
 import re
+import sys
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from snapshot_diff import diff_rows, apply_delta, regional_key, summarize
+
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
@@ -102,27 +107,36 @@ def main():
     res = supabase.table('monitors_regional').select('*').execute()
     records = res.data
     
-    print(f"Checking {len(records)} records...")
+    # Proactively check if it's the one the user mentioned
+    to_check = [r for r in records if "G27i" in r['competitor_sku'] or "G34WQi" in r['competitor_sku'] or r['price'] is None]
+    print(f"Checking {len(to_check)} of {len(records)} records...")
     
-    for record in records:
+    # One search per (competitor_sku, country, retailer); rows for several of our SKUs share the result
+    observed = {}
+    for record in to_check:
+        key = regional_key(record)
+        if key in observed:
+            continue
         sku = record['competitor_sku']
         brand = record['competitor_brand']
         retailer = record['retailer_name'] or "winpy.cl"
         
-        # Proactively check if it's the one the user mentioned
-        if "G27i" in sku or "G34WQi" in sku or record['price'] is None:
-            print(f"Processing {brand} {sku} on {retailer}...")
-            available, price = fetch_data_from_serper(sku, brand, retailer)
-            
-            updates = {}
-            if available is not None:
-                updates['available'] = available
-            if price is not None:
-                updates['price'] = price
-            
-            if updates:
-                supabase.table('monitors_regional').update(updates).eq('id', record['id']).execute()
-                print(f"  Updated: Available={available}, Price={price}")
+        print(f"Processing {brand} {sku} on {retailer}...")
+        available, price = fetch_data_from_serper(sku, brand, retailer)
+        observed[key] = {
+            "competitor_sku": sku,
+            "country": record['country'],
+            "retailer_name": record['retailer_name'],
+            "available": available,
+            "price": price
+        }
+        print(f"  Observed: Available={available}, Price={price}")
+    
+    # Write only what actually changed
+    delta = diff_rows(to_check, observed.values(), regional_key, ("available", "price"))
+    print(f"Delta: {summarize(delta)}")
+    written = apply_delta(supabase, 'monitors_regional', delta, mark_disappeared=False)
+    print(f"Updated {written['updated']} rows.")
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import http.client
 import re
@@ -9,6 +10,11 @@ from dotenv import load_dotenv
 # Load credentials
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_outbox import get_outbox, OutboxRejected
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -158,9 +164,11 @@ def main():
         "match_count": results_found
     }
     try:
-        supabase.table('discovery_status').upsert(discovery_payload, on_conflict='category,country,retailer').execute()
-        print("Updated discovery_status table.")
-    except Exception as e:
+        if get_outbox().upsert(supabase, 'discovery_status', discovery_payload, on_conflict='category,country,retailer'):
+            print("Updated discovery_status table.")
+        else:
+            print("discovery_status update queued in the local outbox.")
+    except OutboxRejected as e:
         print(f"Error updating discovery_status: {e}")
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import os
+import sys
 import re
 import json
 import http.client
@@ -7,6 +8,11 @@ from dotenv import load_dotenv
 
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_outbox import get_outbox, flush_report
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -95,7 +101,7 @@ def full_restore_pipeline():
                         'available': True,
                         'product_page_url': url
                     }
-                    supabase.table('monitors_regional').insert(insert_data).execute()
+                    get_outbox().enqueue('monitors_regional', 'insert', [insert_data])
                     print(f"[{country.upper()}] SUCCESS: Found and inserted {brand} {sku} -> {url}")
                     restored += 1
                 else:
@@ -103,13 +109,15 @@ def full_restore_pipeline():
                     not_found += 1
 
     print("\nSTEP 4: Confirming cleanup – Deleting any remaining null URLs from the database...")
-    clean_res = supabase.table('monitors_regional').delete().is_('product_page_url', 'null').execute()
+    # Queued behind the inserts above, so the outbox replays them in this order
+    get_outbox().enqueue('monitors_regional', 'delete', {}, filters=[('is_', 'product_page_url', 'null')])
+    pending = flush_report(supabase, 'monitors_regional')
     
     print(f"\n=======================")
     print(f"PIPELINE COMPLETE!")
     print(f"Restored Valid URLs: {restored}")
     print(f"Missing URLs Ignored (NO ROW CREATED): {not_found}")
-    print(f"Deleted lingering null rows: {len(clean_res.data)}")
+    print(f"Lingering null rows: {'deleted' if not pending else 'delete queued in the local outbox'}")
     print(f"=======================")
 
 if __name__ == '__main__':
@@ -1,7 +1,5 @@
 import os
-import json
-import http.client
-import urllib.request
+import sys
 import re
 from supabase import create_client, Client
 from dotenv import load_dotenv
@@ -9,6 +7,14 @@ from dotenv import load_dotenv
 # Load credentials
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from http_cassette import fetch
+from serper_client import serper_post
+from pipeline_trace import span, count, start_run, finish_run
+from db_outbox import get_outbox
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -23,34 +29,38 @@ def is_link_dead(url: str, retailer: str) -> bool:
     """Checks if a URL returns a 404 or a soft 404 (redirect to home/category)"""
     if not url:
         return True
-    try:
-        req = urllib.request.Request(
-            url, 
-            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+    with span("link_check"):
+        response = fetch(
+            url,
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+            timeout=10,
+            max_bytes=50000
         )
-        response = urllib.request.urlopen(req, timeout=10)
-        final_url = response.geturl().lower()
-        
-        # Site-specific soft 404 checks
-        if 'nnet.com.uy' in retailer.lower():
-            if 'default.php' in final_url or 'productos_por_marca.php' in final_url or 'productos.php' in final_url:
-                return True
-        elif 'winpy.cl' in retailer.lower():
-            html = response.read(50000).decode('utf-8', errors='ignore').lower()
-            if 'página no encontrada' in html or '<title>404</title>' in html:
-                return True
-                
-        return False
-    except urllib.error.HTTPError as e:
-        if e.code in [403, 503, 429]:
+    count("link_checks")
+    if response.error:
+        # Timeout or connection error
+        print(f"      [HTTP Error checking {url}: {response.error}]")
+        return True
+    if response.status >= 400:
+        if response.status in [403, 503, 429]:
             # Bot protection / WAF, treat as alive
-            print(f"      [WAF/Bot block checking {url}: {e.code}]")
+            print(f"      [WAF/Bot block checking {url}: {response.status}]")
             return False
+        print(f"      [HTTP Error checking {url}: HTTP {response.status}]")
         return True
-    except Exception as e:
-        # Timeout or HTTPError (like 404)
-        print(f"      [HTTP Error checking {url}: {e}]")
-        return True
+
+    final_url = response.url.lower()
+
+    # Site-specific soft 404 checks
+    if 'nnet.com.uy' in retailer.lower():
+        if 'default.php' in final_url or 'productos_por_marca.php' in final_url or 'productos.php' in final_url:
+            return True
+    elif 'winpy.cl' in retailer.lower():
+        html = response.body.lower()
+        if 'página no encontrada' in html or '<title>404</title>' in html:
+            return True
+
+    return False
 
 def is_valid_product_page(title, sku, brand):
     title = title.lower()
@@ -69,21 +79,15 @@ def is_valid_product_page(title, sku, brand):
     return False
 
 def get_correct_url(sku, brand, retailer):
-    conn = http.client.HTTPSConnection('google.serper.dev')
-    headers = {'X-API-KEY': SERPER_API_KEY, 'Content-Type': 'application/json'}
-    
     search_query = f'site:{retailer} {brand} {sku}'
-    search_payload = json.dumps({'q': search_query, 'hl': 'es', 'num': 5})
-    
+
     try:
-        conn.request('POST', '/search', search_payload, headers)
-        res = conn.getresponse()
-        search_data = json.loads(res.read().decode('utf-8'))
-        
+        search_data = serper_post('/search', {'q': search_query, 'hl': 'es', 'num': 5})
+
         for item in search_data.get('organic', []):
             link = item.get('link', '')
             title = item.get('title', '')
-            
+
             if retailer in link.lower() and is_valid_product_page(title, sku, brand):
                 # Verify it's actually alive and not a soft 404
                 if not is_link_dead(link, retailer):
@@ -128,12 +132,12 @@ def main():
             
             if correct_url:
                 print(f"    -> MATCH FOUND: {correct_url}")
-                supabase.table('monitors_regional').update({'product_page_url': correct_url, 'available': True}).eq('id', record_id).execute()
+                get_outbox().update(supabase, 'monitors_regional', {'product_page_url': correct_url, 'available': True}, [('eq', 'id', record_id)])
                 fixed_count += 1
             else:
                  print(f"    -> NO MATCH FOUND. Product definitely does not exist on {retailer}.")
                  print("    -> DELETING ROW: product_page_url is null so it must be eliminated.")
-                 supabase.table('monitors_regional').delete().eq('id', record_id).execute()
+                 get_outbox().delete(supabase, 'monitors_regional', [('eq', 'id', record_id)])
                  deleted_count += 1
         else:
             pass # Keep it, it's alive
@@ -141,4 +145,6 @@ def main():
     print(f"\nGlobal Cleanup Complete! Fixed {fixed_count} URLs, and permanently DELETED {deleted_count} unfindable rows.")
 
 if __name__ == "__main__":
+    start_run("fix_regional_urls")
     main()
+    finish_run()
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import http.client
 import re
@@ -8,6 +9,11 @@ from dotenv import load_dotenv
 # Load credentials
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_outbox import get_outbox, flush_report
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -87,7 +93,7 @@ def main():
             if correct_url:
                 if correct_url != url:
                     print(f"    -> MATCH FOUND: {correct_url}")
-                    supabase.table('monitors_regional').update({'product_page_url': correct_url}).eq('id', record_id).execute()
+                    get_outbox().enqueue('monitors_regional', 'update', {'product_page_url': correct_url}, filters=[('eq', 'id', record_id)])
                     fixed_count += 1
                 else:
                     print("    -> Best match is the same URL. Leaving as is.")
@@ -95,9 +101,10 @@ def main():
                  print(f"    -> NO MATCH FOUND. Product likely does not exist on {retailer}.")
                  # User note: "if you cannot find it, maybe it means it doesn't exist" -> we should remove the misleading link
                  print("    -> Removing the generic URL from the DB record to avoid misleading listing pages.")
-                 supabase.table('monitors_regional').update({'product_page_url': None, 'available': False}).eq('id', record_id).execute()
+                 get_outbox().enqueue('monitors_regional', 'update', {'product_page_url': None, 'available': False}, filters=[('eq', 'id', record_id)])
                  removed_count += 1
 
+    flush_report(supabase, 'monitors_regional')
     print(f"\nCleanup Complete! Fixed {fixed_count} URLs, and removed {removed_count} unfindable URLs.")
 
 if __name__ == "__main__":
@@ -0,0 +1,206 @@
+import os
+import sys
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import argparse
+import threading
+import urllib.request
+import urllib.error
+import urllib.parse
+from typing import Dict, Any, Callable, Optional
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_trace import span, count
+
+CASSETTE_DIR = os.environ.get("HTTP_CASSETTE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassettes")
+
+# off: live only | record: live, appended to cassette | replay: cassette only | auto: replay when recorded, else record
+MODES = ("off", "record", "replay", "auto")
+FLUSH_EVERY = 50
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+class HttpResponse:
+    """Outcome of one GET: HTTP status (0 on network error), final URL after redirects, decoded body."""
+    __slots__ = ("status", "url", "body", "error")
+
+    def __init__(self, status: int, url: str, body: str = "", error: Optional[str] = None):
+        self.status = status
+        self.url = url
+        self.body = body
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and 200 <= self.status < 400
+
+
+def _latency_setting() -> Optional[float]:
+    # Unset = replay the recorded timing; a number = fixed delay in ms (0 disables)
+    raw = os.environ.get("HTTP_CASSETTE_LATENCY_MS")
+    return float(raw) / 1000.0 if raw not in (None, "") else None
+
+
+class Cassette:
+    """
+    Record/replay store for one kind of traffic (e.g. 'serper', 'pages').
+    Interactions are keyed by a hash of method, URL and request body and kept in a
+    gzipped JSONL file; new recordings are appended as extra gzip members in batches.
+    """
+    def __init__(self, name: str, mode: str = "off", directory: str = CASSETTE_DIR, latency: Optional[float] = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {MODES}")
+        self.name = name
+        self.mode = mode
+        self.path = os.path.join(directory, f"{name}.jsonl.gz")
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: list = []
+        self._lock = threading.Lock()
+        if mode != "off" and os.path.exists(self.path):
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(method: str, url: str, body: str = "") -> str:
+        return hashlib.sha1(f"{method} {url}\n{body}".encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _replay(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        delay = entry.get("elapsed", 0.0) if self.latency is None else self.latency
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.hits += 1
+        count("cassette_hits", cassette=self.name)
+        return entry
+
+    def call(self, method: str, url: str, body: str, live: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Returns the interaction for (method, url, body): replayed from the cassette, or
+        produced by `live()` (a dict of status/url/body/error) and recorded, per mode.
+        """
+        if self.mode == "off":
+            return live()
+        key = self.key(method, url, body)
+        entry = self._entries.get(key)
+        if entry is not None and self.mode in ("replay", "auto"):
+            return self._replay(entry)
+        if self.mode == "replay":
+            with self._lock:
+                self.misses += 1
+            raise CassetteMiss(f"No recorded {method} {url} in {self.path}")
+
+        started = time.perf_counter()
+        result = live()
+        entry = dict(result, key=key, method=method, elapsed=round(time.perf_counter() - started, 4))
+        entry.setdefault("url", url)
+        with self._lock:
+            self._entries[key] = entry
+            self._pending.append(entry)
+            flush = len(self._pending) >= FLUSH_EVERY
+        if flush:
+            self.flush()
+        return entry
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                for entry in pending:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(name: str) -> Cassette:
+    """Process-wide cassette per traffic kind, configured from HTTP_CASSETTE_* environment variables."""
+    with _cassettes_lock:
+        cassette = _cassettes.get(name)
+        if cassette is None:
+            mode = os.environ.get("HTTP_CASSETTE_MODE", "off").lower()
+            cassette = _cassettes[name] = Cassette(name, mode, CASSETTE_DIR, _latency_setting())
+        return cassette
+
+
+@atexit.register
+def flush_all():
+    for cassette in list(_cassettes.values()):
+        cassette.flush()
+
+
+def fetch(url: str, headers: Optional[Dict[str, str]] = None, timeout: int = 10, max_bytes: Optional[int] = None, cassette: str = "pages") -> HttpResponse:
+    """
+    GETs a page through the cassette layer. Never raises for HTTP or network errors:
+    they come back as a status (0 when there was no HTTP response) plus `error`.
+    """
+    def live() -> Dict[str, Any]:
+        req = urllib.request.Request(url, headers=headers or {})
+        try:
+            response = urllib.request.urlopen(req, timeout=timeout)
+            raw = response.read(max_bytes) if max_bytes else response.read()
+            return {"status": response.status, "url": response.geturl(), "body": raw.decode('utf-8', errors='ignore'), "error": None}
+        except urllib.error.HTTPError as e:
+            return {"status": e.code, "url": url, "body": "", "error": None}
+        except Exception as e:
+            return {"status": 0, "url": url, "body": "", "error": str(e) or e.__class__.__name__}
+
+    with span("http_get", cassette=cassette):
+        entry = get_cassette(cassette).call("GET", url, f"max_bytes={max_bytes}", live)
+    count("http_gets", cassette=cassette, status=entry["status"])
+    return HttpResponse(entry["status"], entry["url"], entry.get("body", ""), entry.get("error"))
+
+
+def cassette_stats(name: str) -> Dict[str, Any]:
+    cassette = Cassette(name, "replay")
+    hosts: Dict[str, int] = {}
+    elapsed = []
+    for entry in cassette._entries.values():
+        host = urllib.parse.urlsplit(entry.get("url", "")).netloc or entry.get("url", "")
+        hosts[host] = hosts.get(host, 0) + 1
+        elapsed.append(entry.get("elapsed", 0.0))
+    elapsed.sort()
+    return {
+        "path": cassette.path,
+        "entries": len(cassette),
+        "bytes": os.path.getsize(cassette.path) if os.path.exists(cassette.path) else 0,
+        "hosts": hosts,
+        "median_elapsed_ms": elapsed[len(elapsed) // 2] * 1000 if elapsed else 0.0
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect recorded HTTP cassettes")
+    parser.add_argument("names", nargs="*", help="Cassette names (default: all in HTTP_CASSETTE_DIR)")
+    args = parser.parse_args()
+
+    names = args.names
+    if not names and os.path.isdir(CASSETTE_DIR):
+        names = sorted(f[:-len(".jsonl.gz")] for f in os.listdir(CASSETTE_DIR) if f.endswith(".jsonl.gz"))
+    if not names:
+        print(f"No cassettes in {CASSETTE_DIR}")
+    for name in names:
+        stats = cassette_stats(name)
+        print(f"{name}: {stats['entries']} interactions, {stats['bytes'] / 1024:.1f} KB, median latency {stats['median_elapsed_ms']:.0f}ms")
+        for host, count in sorted(stats["hosts"].items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  {count:6d}  {host}")
@@ -8,6 +8,7 @@ from typing import List, Dict, Any, Optional
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from rival_search_client import RivalSearchClient
+from domain_matcher import DomainMatcher, get_matcher, host_of, ALLOW, BLOCK
 
 def load_retailer_config() -> Dict[str, Any]:
     config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retailer_config.json")
@@ -18,7 +19,7 @@ def load_retailer_config() -> Dict[str, Any]:
         print(f"Warning: retailer_config.json not found at {config_path}")
         return {}
 
-def is_domain_allowed(url: str, country: str, config: Dict[str, Any]) -> bool:
+def is_domain_allowed(url: str, country: str, config: Optional[Dict[str, Any]] = None) -> bool:
     """
     Checks if a URL is allowed based on Whitelist/Blacklist for a country.
     Strategy:
@@ -26,27 +27,21 @@ def is_domain_allowed(url: str, country: str, config: Dict[str, Any]) -> bool:
     2. If Whitelisted -> ACCEPT.
     3. If neither -> REJECT (Strict Mode) or ACCEPT (Permissive Mode).
     User requested "Excluded MercadoLibre/Solotodo", implied Strict Whitelist for reliability.
+    Domains match on label boundaries (see domain_matcher), so look-alike hosts are rejected.
+    Without an explicit `config`, the cached matcher for retailer_config.json is used.
     """
-    country_config = config.get(country.lower())
-    if not country_config:
-        # Default policy if country not found? Maybe reject to be safe.
+    matcher = DomainMatcher(config) if config is not None else get_matcher()
+    host = host_of(url)
+    verdict = matcher.verdict(host, country)
+
+    if verdict == BLOCK:
+        print(f"Blocked Blacklisted Domain: {host}")
         return False
-        
-    domain = url.lower().replace("https://", "").replace("http://", "").split("/")[0]
-    
-    # 1. Check Blacklist
-    for bad_site in country_config.get("blacklist", []):
-        if bad_site in domain:
-            print(f"Blocked Blacklisted Domain: {domain}")
-            return False
-            
-    # 2. Check Whitelist
-    for good_site in country_config.get("whitelist", []):
-        if good_site in domain:
-            return True
-            
-    # 3. Default Reject (Strict Mode)
-    print(f"Blocked Unknown Domain: {domain}")
+    if verdict == ALLOW:
+        return True
+
+    # Default Reject (Strict Mode)
+    print(f"Blocked Unknown Domain: {host}")
     return False
 
 def fetch_local_price_on_demand(match_payload: Dict[str, Any], target_country: str) -> Optional[Dict[str, Any]]:
@@ -56,7 +51,6 @@ def fetch_local_price_on_demand(match_payload: Dict[str, Any], target_country: s
     Output: Price Data found in valid retailer.
     """
     client = RivalSearchClient()
-    config = load_retailer_config()
     
     brand = match_payload.get("competitor_brand")
     model = match_payload.get("competitor_model")
@@ -77,7 +71,7 @@ def fetch_local_price_on_demand(match_payload: Dict[str, Any], target_country: s
         
     url = raw_result.get("url", "")
     
-    if is_domain_allowed(url, target_country, config):
+    if is_domain_allowed(url, target_country):
         print(f"Price Found: {raw_result['price']} {raw_result['currency']} @ {url}")
         return raw_result
     else:
@@ -96,3 +90,4 @@ if __name__ == "__main__":
     print("Test Blacklist (MercadoLibre):", is_domain_allowed("https://mercadolibre.cl/msi", "chile", conf)) # Should be False
     print("Test Whitelist (PCFactory):", is_domain_allowed("https://www.pcfactory.cl/producto", "chile", conf)) # Should be True
     print("Test Unknown (RandomStore):", is_domain_allowed("https://randomstore.cl", "chile", conf)) # Should be False
+    print("Test Look-alike (pcfactory.cl.evil.com):", is_domain_allowed("https://notpcfactory.cl.evil.com", "chile")) # Should be False
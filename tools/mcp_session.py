@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import itertools
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+PROTOCOL_VERSION = "2025-03-26"
+
+
+class McpError(Exception):
+    pass
+
+
+class _SessionExpired(Exception):
+    pass
+
+
+class McpSession:
+    """
+    Long-lived MCP session over the Streamable HTTP transport.
+    One logical session (Mcp-Session-Id) is shared by a small pool of keep-alive connections,
+    so tool calls from several threads run concurrently. Each call carries its own JSON-RPC id
+    and timeout; dropped connections are reopened and expired sessions re-initialized automatically.
+    """
+    def __init__(self, url: str, timeout: float = 30.0, pool_size: int = 4, client_name: str = "blast-discovery"):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.https = parts.scheme == "https"
+        self.host = parts.netloc
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.client_name = client_name
+        self.session_id: Optional[str] = None
+        self._ids = itertools.count(1)
+        self._id_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._pool: "queue.Queue[http.client.HTTPConnection]" = queue.Queue()
+        self._pool_size = pool_size
+        self._created = 0
+        self._pool_lock = threading.Lock()
+
+    # --- connections ---
+    def _new_connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, timeout=self.timeout)
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._created < self._pool_size:
+                self._created += 1
+                return self._new_connection()
+        return self._pool.get()
+
+    def _checkin(self, conn: http.client.HTTPConnection):
+        self._pool.put(conn)
+
+    def _discard(self, conn: http.client.HTTPConnection):
+        conn.close()
+        # Replace it so the pool keeps its size
+        self._pool.put(self._new_connection())
+
+    def _next_id(self) -> int:
+        with self._id_lock:
+            return next(self._ids)
+
+    # --- transport ---
+    def _post(self, message: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream",
+            "MCP-Protocol-Version": PROTOCOL_VERSION
+        }
+        if self.session_id:
+            headers["Mcp-Session-Id"] = self.session_id
+        body = json.dumps(message)
+
+        for attempt in range(2):
+            conn = self._checkout()
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                conn.request("POST", self.path, body, headers)
+                response = conn.getresponse()
+                result = self._read_response(response, message.get("id"))
+                self._checkin(conn)
+                return result
+            except (_SessionExpired, McpError):
+                self._checkin(conn)
+                raise
+            except ValueError as e:
+                self._discard(conn)
+                raise McpError(f"Malformed MCP response: {e}")
+            except TimeoutError:
+                # The reply may still arrive on this socket; never reuse it
+                self._discard(conn)
+                raise McpError(f"MCP request {message.get('id')} timed out after {timeout}s")
+            except (http.client.HTTPException, ConnectionError, OSError) as e:
+                self._discard(conn)
+                if attempt:
+                    raise McpError(f"MCP transport error: {e}")
+        return None
+
+    def _read_response(self, response: http.client.HTTPResponse, request_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        if response.status == 404 and self.session_id:
+            response.read()
+            raise _SessionExpired()
+        if response.status == 202:
+            response.read()
+            return None
+        if response.status >= 400:
+            raise McpError(f"MCP HTTP {response.status}: {response.read()[:200]!r}")
+
+        session_id = response.getheader("Mcp-Session-Id")
+        if session_id:
+            self.session_id = session_id
+
+        content_type = (response.getheader("Content-Type") or "").lower()
+        if "text/event-stream" not in content_type:
+            payload = response.read()
+            return json.loads(payload) if payload else None
+
+        # SSE: read events until the one answering our request id arrives
+        data_lines: List[str] = []
+        matched = None
+        while True:
+            raw = response.readline()
+            if not raw:
+                break
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("data:"):
+                data_lines.append(line[5:].lstrip())
+            elif line == "" and data_lines:
+                message = json.loads("\n".join(data_lines))
+                data_lines = []
+                if message.get("id") == request_id and ("result" in message or "error" in message):
+                    matched = message
+                    break
+        response.close()
+        return matched
+
+    # --- protocol ---
+    def _initialize(self):
+        self.session_id = None
+        reply = self._post({
+            "jsonrpc": "2.0",
+            "id": self._next_id(),
+            "method": "initialize",
+            "params": {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": self.client_name, "version": "1.0"}
+            }
+        }, self.timeout)
+        if not reply or "error" in reply:
+            raise McpError(f"MCP initialize failed: {reply}")
+        self._post({"jsonrpc": "2.0", "method": "notifications/initialized"}, self.timeout)
+
+    def _ensure_session(self, stale: Optional[str] = None):
+        with self._init_lock:
+            if self.session_id is None or self.session_id == stale:
+                self._initialize()
+
+    def request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """
+        Sends one JSON-RPC request on the shared session and returns its `result`.
+        """
+        self._ensure_session()
+        for attempt in range(2):
+            session = self.session_id
+            request_id = self._next_id()
+            try:
+                reply = self._post({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}, timeout or self.timeout)
+            except _SessionExpired:
+                if attempt:
+                    raise McpError("MCP session expired twice in a row")
+                self._ensure_session(stale=session)
+                continue
+            if reply is None:
+                raise McpError(f"No response to MCP request {request_id} ({method})")
+            if reply.get("id") != request_id:
+                raise McpError(f"MCP response id mismatch: sent {request_id}, got {reply.get('id')}")
+            if "error" in reply:
+                raise McpError(f"MCP error on {method}: {reply['error']}")
+            return reply.get("result")
+        return None
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        return (self.request("tools/list") or {}).get("tools", [])
+
+    def call_tool(self, name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """
+        Calls a tool and decodes its output: structuredContent when present, else the JSON (or raw text) of its text content.
+        """
+        result = self.request("tools/call", {"name": name, "arguments": arguments}, timeout) or {}
+        if result.get("isError"):
+            raise McpError(f"Tool {name} failed: {result.get('content')}")
+        if "structuredContent" in result:
+            return result["structuredContent"]
+        texts = [c.get("text", "") for c in result.get("content", []) if c.get("type") == "text"]
+        text = "\n".join(texts)
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_sessions: Dict[str, McpSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url: str, **kwargs) -> McpSession:
+    """Process-wide session per server URL."""
+    with _sessions_lock:
+        session = _sessions.get(url)
+        if session is None:
+            session = _sessions[url] = McpSession(url, **kwargs)
+        return session
+
+
+def benchmark(url: str, tool: str, arguments: Dict[str, Any], calls: int, concurrency: int):
+    session = McpSession(url, pool_size=concurrency)
+    session.list_tools()  # warm up the session
+
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        session.call_tool(tool, arguments)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    wall = time.perf_counter() - started
+    session.close()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    print(f"{calls} calls x {concurrency} concurrent: {calls / wall:.1f} calls/s")
+    print(f"Latency ms: p50 {pct(0.50):.1f}  p90 {pct(0.90):.1f}  p99 {pct(0.99):.1f}  max {latencies[-1] * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MCP session client / benchmark")
+    parser.add_argument("--url", default=os.environ.get("RIVALSEARCH_URL", "http://127.0.0.1:8765/mcp"))
+    parser.add_argument("--tool", default="search_global")
+    parser.add_argument("--args", default='{"brand": "MSI", "category": "monitor", "query": "MSI monitor 165"}', help="Tool arguments as JSON")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    benchmark(args.url, args.tool, json.loads(args.args), args.calls, args.concurrency)
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_mcp_catalog.json")
+
+TOOLS = [
+    {
+        "name": "search_global",
+        "description": "Global competitor models for a brand and category",
+        "inputSchema": {"type": "object", "properties": {"brand": {"type": "string"}, "category": {"type": "string"}, "query": {"type": "string"}}}
+    },
+    {
+        "name": "search_local",
+        "description": "Local retailer price for a model in a country",
+        "inputSchema": {"type": "object", "properties": {"brand": {"type": "string"}, "model": {"type": "string"}, "country": {"type": "string"}}}
+    }
+]
+
+
+class StandInState:
+    def __init__(self, catalog: Dict[str, Any], latency_ms: float, sse: bool):
+        self.catalog = catalog
+        self.latency = latency_ms / 1000.0
+        self.sse = sse
+        self.sessions = set()
+        self.lock = threading.Lock()
+
+
+def search_global(catalog: Dict[str, Any], args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    brand = str(args.get("brand", "")).lower()
+    category = str(args.get("category", "")).lower()
+    return [
+        {"brand": c["brand"], "model": c["model"], "specs": c["specs"]}
+        for c in catalog.get("global", [])
+        if c["brand"].lower() == brand and (not category or c["category"].lower() == category)
+    ]
+
+
+def search_local(catalog: Dict[str, Any], args: Dict[str, Any]) -> Any:
+    brand = str(args.get("brand", "")).lower()
+    model = str(args.get("model", "")).lower()
+    country = str(args.get("country", "")).lower()
+    for entry in catalog.get("local", []):
+        if entry["brand"].lower() == brand and entry["model"].lower() == model and entry["country"] == country:
+            return {"price": entry["price"], "currency": entry["currency"], "country": entry["country"], "url": entry["url"]}
+    return None
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Minimal Streamable-HTTP MCP server: initialize, tools/list and tools/call over canned catalogs.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state: StandInState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, message: Any = None, session_id: str = None):
+        body = b""
+        headers = {}
+        if message is not None:
+            if self.state.sse:
+                body = f"event: message\ndata: {json.dumps(message)}\n\n".encode("utf-8")
+                headers["Content-Type"] = "text/event-stream"
+            else:
+                body = json.dumps(message).encode("utf-8")
+                headers["Content-Type"] = "application/json"
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if session_id:
+            self.send_header("Mcp-Session-Id", session_id)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        message = json.loads(self.rfile.read(length) or b"{}")
+        method = message.get("method")
+        request_id = message.get("id")
+
+        if method == "initialize":
+            session_id = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.sessions.add(session_id)
+            self._send(200, {"jsonrpc": "2.0", "id": request_id, "result": {
+                "protocolVersion": message.get("params", {}).get("protocolVersion"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "rivalsearch-stand-in", "version": "1.0"}
+            }}, session_id=session_id)
+            return
+
+        if self.headers.get("Mcp-Session-Id") not in self.state.sessions:
+            self._send(404, {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32001, "message": "Session not found"}})
+            return
+
+        if request_id is None:
+            # Notification
+            self._send(202)
+            return
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        if method == "tools/list":
+            self._send(200, {"jsonrpc": "2.0", "id": request_id, "result": {"tools": TOOLS}})
+        elif method == "tools/call":
+            params = message.get("params", {})
+            name, args = params.get("name"), params.get("arguments", {})
+            if name == "search_global":
+                data = search_global(self.state.catalog, args)
+            elif name == "search_local":
+                data = search_local(self.state.catalog, args)
+            else:
+                self._send(200, {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32602, "message": f"Unknown tool {name}"}})
+                return
+            self._send(200, {"jsonrpc": "2.0", "id": request_id, "result": {
+                "content": [{"type": "text", "text": json.dumps(data)}],
+                "isError": False
+            }})
+        else:
+            self._send(200, {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32601, "message": f"Unknown method {method}"}})
+
+    def do_DELETE(self):
+        with self.state.lock:
+            self.state.sessions.discard(self.headers.get("Mcp-Session-Id"))
+        self._send(200)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, catalog_path: str = CATALOG_PATH, latency_ms: float = 0.0, sse: bool = False) -> ThreadingHTTPServer:
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    handler = type("BoundStandInHandler", (StandInHandler,), {"state": StandInState(catalog, latency_ms, sse)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the RivalSearch MCP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Canned catalog JSON")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated per-call latency")
+    parser.add_argument("--sse", action="store_true", help="Answer as text/event-stream instead of JSON")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.catalog, args.latency_ms, args.sse)
+    print(f"Stand-in MCP server on http://{args.host}:{args.port}/mcp (latency {args.latency_ms}ms, {'SSE' if args.sse else 'JSON'})")
+    print(f"Use: RIVALSEARCH_URL=http://{args.host}:{args.port}/mcp")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
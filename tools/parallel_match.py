@@ -0,0 +1,213 @@
+import os
+import sys
+import time
+import atexit
+import array
+import argparse
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, Any, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from spec_records import SpecRecord, SpecSchema, get_schema
+
+# Targets per pool task: big enough to amortize dispatch, small enough to balance 16 workers
+CHUNK_TARGETS = 8
+
+Layout = Dict[str, Any]
+Matches = List[Tuple[int, float]]
+
+
+class SharedCatalog:
+    """
+    An encoded candidate catalog (SpecSchema.to_columns) copied once into one shared-memory
+    segment. `layout` is the small picklable description workers need to map the columns
+    in place: memoryviews over the segment, no per-worker copy or unpickling of the catalog.
+    The creating process owns the segment; close() unlinks it.
+    """
+    def __init__(self, schema: SpecSchema, records: List[SpecRecord]):
+        columns = schema.to_columns(records)
+        offsets = []
+        offset = 0
+        for name, col in columns.items():
+            offset = (offset + 7) & ~7
+            offsets.append((name, col.typecode, offset))
+            offset += len(col) * col.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (name, _, start), col in zip(offsets, columns.values()):
+            raw = memoryview(col).cast('B')
+            self.shm.buf[start:start + len(raw)] = raw
+        self.refs = [r.ref for r in records]
+        self.layout: Layout = {
+            "name": self.shm.name,
+            "rows": len(records),
+            "columns": offsets,
+            "gate_keys": schema.gate_keys,
+            "tier_keys": schema.tier_keys,
+            "numeric_keys": schema.numeric_keys,
+            "tier_steps": schema.tier_steps,
+            "tolerance": schema.tolerance
+        }
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Only the creating process may unlink the segment. Before 3.13 every attach registers it with
+    # the resource tracker, which would then unlink it (or warn) when a worker exits.
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, Dict[str, memoryview]]] = {}
+
+
+def _columns(layout: Layout) -> Dict[str, memoryview]:
+    """Worker-side column views over a shared catalog, attached once per segment."""
+    entry = _attached.get(layout["name"])
+    if entry is None:
+        shm = _attach(layout["name"])
+        rows = layout["rows"]
+        views = {}
+        for name, typecode, start in layout["columns"]:
+            size = array.array(typecode).itemsize
+            views[name] = shm.buf[start:start + rows * size].cast(typecode)
+        entry = _attached[layout["name"]] = (shm, views)
+    return entry[1]
+
+
+@atexit.register
+def _detach_all():
+    # Views must be released before the segment can be closed
+    for shm, views in _attached.values():
+        for view in views.values():
+            view.release()
+        shm.close()
+    _attached.clear()
+
+
+def scan_columns(columns: Dict[str, memoryview], layout: Layout, target: Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[Optional[float], ...]]) -> Matches:
+    """
+    SpecSchema.scan over a columnar catalog, one filter pass per constrained column:
+    same matches (row index order) and bit-identical scores.
+    """
+    cats, tiers, nums = target
+    rows = range(layout["rows"])
+    for key, t in zip(layout["gate_keys"], cats):
+        if t:
+            col = columns[key]
+            rows = [i for i in rows if not col[i] or col[i] == t]
+    for key, t, steps in zip(layout["tier_keys"], tiers, layout["tier_steps"]):
+        if steps is not None and t:
+            col = columns[key]
+            rows = [i for i in rows if not col[i] or abs(col[i] - t) <= steps]
+    tolerance = layout["tolerance"]
+    constrained = [(columns[key], columns[f"{key}:set"], t) for key, t in zip(layout["numeric_keys"], nums) if t is not None and t != 0]
+    for col, present, t in constrained:
+        # Missing specs are skipped; a present NaN/inf fails `<=` exactly as in validate_parity
+        rows = [i for i in rows if not present[i] or abs(t - col[i]) / t <= tolerance]
+
+    matches = []
+    for i in rows:
+        accum = 0.0
+        valid = 0
+        for col, present, t in constrained:
+            if not present[i]:
+                continue
+            accum += 1.0 - abs(t - col[i]) / t
+            valid += 1
+        matches.append((i, accum / valid if valid > 0 else 0.5))
+    return matches
+
+
+def _match_chunk(task: Tuple[Layout, List[Tuple[int, Tuple[Any, ...]]]]) -> List[Tuple[int, Matches]]:
+    layout, targets = task
+    columns = _columns(layout)
+    return [(index, scan_columns(columns, layout, target)) for index, target in targets]
+
+
+def parallel_scan(catalogs: Dict[str, SharedCatalog], targets: Dict[str, List[SpecRecord]], workers: Optional[int] = None, chunk: int = CHUNK_TARGETS) -> Dict[str, List[List[Tuple[Any, float]]]]:
+    """
+    Matches every category's targets against its shared catalog on a process pool.
+    Returns {category: [[(candidate ref, score)] per target, in target order]}, identical to
+    calling schema.scan for each target in one process, whatever the worker count or scheduling.
+    """
+    tasks = []
+    for category, records in targets.items():
+        layout = catalogs[category].layout
+        encoded = [(i, (r.cats, r.tiers, r.nums)) for i, r in enumerate(records)]
+        for start in range(0, len(encoded), chunk):
+            tasks.append((category, (layout, encoded[start:start + chunk])))
+
+    results: Dict[str, List[List[Tuple[Any, float]]]] = {category: [[] for _ in records] for category, records in targets.items()}
+    with multiprocessing.Pool(workers) as pool:
+        # imap keeps task order, so the merge is deterministic
+        for (category, _), chunk_result in zip(tasks, pool.imap(_match_chunk, [t for _, t in tasks])):
+            refs = catalogs[category].refs
+            for index, matches in chunk_result:
+                results[category][index] = [(refs[i], score) for i, score in matches]
+    return results
+
+
+def rematch(jobs: Dict[str, Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]], workers: Optional[int] = None) -> Dict[str, List[List[Tuple[Any, float]]]]:
+    """Full rematch: {category: (rules, candidate specs, target specs)} -> per-target matches by category."""
+    catalogs: Dict[str, SharedCatalog] = {}
+    targets: Dict[str, List[SpecRecord]] = {}
+    try:
+        for category, (rules, candidates, target_specs) in jobs.items():
+            schema = get_schema(category, rules)
+            catalogs[category] = SharedCatalog(schema, schema.parse_all(candidates))
+            targets[category] = [schema.parse(specs, i) for i, specs in enumerate(target_specs)]
+        return parallel_scan(catalogs, targets, workers)
+    finally:
+        for catalog in catalogs.values():
+            catalog.close()
+
+
+if __name__ == "__main__":
+    from bench_matching import load_rules, SpecGenerator
+
+    parser = argparse.ArgumentParser(description="Benchmark the shared-memory parallel matcher against a single-process scan")
+    parser.add_argument("--category", action="append")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--targets", type=int, default=64, help="Targets per category")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated pool sizes to time")
+    args = parser.parse_args()
+
+    all_rules = load_rules()
+    categories = args.category or list(all_rules)
+    jobs = {}
+    for category in categories:
+        gen = SpecGenerator(category, all_rules[category], 7)
+        jobs[category] = (all_rules[category], [gen.specs() for _ in range(args.size)], [gen.specs() for _ in range(args.targets)])
+    print(f"{len(categories)} categories x {args.size} candidates x {args.targets} targets, {os.cpu_count()} CPUs")
+
+    t0 = time.perf_counter()
+    expected = {}
+    for category, (rules, candidates, target_specs) in jobs.items():
+        schema = get_schema(category, rules)
+        records = schema.parse_all(candidates)
+        expected[category] = [schema.scan(schema.parse(specs), records) for specs in target_specs]
+    serial = time.perf_counter() - t0
+    print(f"  serial scan        {serial:7.2f}s")
+
+    for workers in [int(w) for w in args.workers.split(",") if w]:
+        t0 = time.perf_counter()
+        got = rematch(jobs, workers)
+        elapsed = time.perf_counter() - t0
+        same = "identical" if got == expected else "MISMATCH"
+        print(f"  {workers:>2} worker(s)       {elapsed:7.2f}s  {serial / elapsed:5.2f}x  {same}")
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import hashlib
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_trace import count
+
+MEMO_PATH = os.environ.get("PARITY_MEMO_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".parity_memo.sqlite")
+
+# Bump whenever validate_parity / check_parity change what they decide or score:
+# every memoized result is then keyed under a new rules hash and recomputed.
+PARITY_VERSION = 1
+FLUSH_EVERY = 500
+
+Result = Tuple[bool, float, Optional[str]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parity_memo (
+    rules_hash TEXT NOT NULL,
+    target_hash TEXT NOT NULL,
+    candidate_hash TEXT NOT NULL,
+    is_match INTEGER NOT NULL,
+    score REAL NOT NULL,
+    fail_code TEXT,
+    checked_at TEXT NOT NULL,
+    PRIMARY KEY (rules_hash, target_hash, candidate_hash)
+) WITHOUT ROWID
+"""
+
+
+def _digest(value: Any) -> str:
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def spec_hash(specs: Dict[str, Any]) -> str:
+    """Content hash of a spec dict (key order doesn't matter, values do: 27 and '27' differ)."""
+    return _digest(specs)
+
+
+def rules_hash(category: str, rules: Dict[str, Any]) -> str:
+    """Version of one category's compiled rules: any edit to its rules entry, or a PARITY_VERSION bump, changes it."""
+    return _digest({"version": PARITY_VERSION, "category": category.lower(), "rules": rules})
+
+
+class TargetMemo:
+    """Memoized parity results of one target product under one rules version, loaded with a single query."""
+    def __init__(self, memo: "ParityMemo", rules_key: str, target_key: str, known: Dict[str, Result]):
+        self._memo = memo
+        self.rules_key = rules_key
+        self.target_key = target_key
+        self._known = known
+
+    def check(self, candidate_specs: Dict[str, Any], compute: Callable[[], Result]) -> Result:
+        """The cached (is_match, score, fail_code) for this candidate, or compute() stored for next time."""
+        key = spec_hash(candidate_specs)
+        cached = self._known.get(key)
+        if cached is not None:
+            self._memo.hits += 1
+            return cached
+        result = compute()
+        self._memo.misses += 1
+        self._known[key] = result
+        self._memo._store(self.rules_key, self.target_key, key, result)
+        return result
+
+
+class ParityMemo:
+    """
+    Persistent (target specs, candidate specs, rules version) -> parity result store in SQLite.
+    Keys are content hashes, so a changed spec on either side or an edited category rule simply
+    misses and is recomputed; results under old hashes are never returned (`prune` drops them).
+    Writes are batched; call close() (or use as a context manager) to flush.
+    """
+    def __init__(self, path: str = MEMO_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._pending: List[Tuple[Any, ...]] = []
+        self.hits = 0
+        self.misses = 0
+
+    def target(self, category: str, target_specs: Dict[str, Any], rules: Dict[str, Any]) -> TargetMemo:
+        rules_key = rules_hash(category, rules)
+        target_key = spec_hash(target_specs)
+        rows = self._db.execute(
+            "SELECT candidate_hash, is_match, score, fail_code FROM parity_memo WHERE rules_hash = ? AND target_hash = ?",
+            (rules_key, target_key)
+        )
+        known = {h: (bool(m), s, f) for h, m, s, f in rows}
+        return TargetMemo(self, rules_key, target_key, known)
+
+    def check(self, category: str, target_specs: Dict[str, Any], candidate_specs: Dict[str, Any], rules: Dict[str, Any], compute: Callable[[], Result]) -> Result:
+        """One-off lookup; for many candidates of the same target use target() once instead."""
+        return self.target(category, target_specs, rules).check(candidate_specs, compute)
+
+    def _store(self, rules_key: str, target_key: str, candidate_key: str, result: Result):
+        is_match, score, fail_code = result
+        self._pending.append((rules_key, target_key, candidate_key, int(is_match), score, fail_code, datetime.utcnow().isoformat()))
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO parity_memo VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        count("parity_memo_hits", self.hits)
+        count("parity_memo_misses", self.misses)
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def prune(self, all_rules: Dict[str, Dict[str, Any]]) -> int:
+        """Deletes results computed under rules versions that are no longer current."""
+        current = [rules_hash(category, rules) for category, rules in all_rules.items()]
+        self.flush()
+        with self._db:
+            marks = ",".join("?" * len(current))
+            deleted = self._db.execute(f"DELETE FROM parity_memo WHERE rules_hash NOT IN ({marks})", current).rowcount
+        self._db.execute("VACUUM")
+        return deleted
+
+    def stats(self, all_rules: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        current = {rules_hash(category, rules): category for category, rules in all_rules.items()}
+        per_rules = self._db.execute("SELECT rules_hash, COUNT(*), SUM(is_match) FROM parity_memo GROUP BY rules_hash").fetchall()
+        return {
+            "rows": sum(n for _, n, _ in per_rules),
+            "current": {current[h]: {"rows": n, "matches": m} for h, n, m in per_rules if h in current},
+            "stale_rows": sum(n for h, n, _ in per_rules if h not in current),
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+
+def open_memo(path: str = MEMO_PATH) -> Optional[ParityMemo]:
+    """The shared memo, or None when disabled with PARITY_MEMO=0."""
+    if os.environ.get("PARITY_MEMO", "1") == "0":
+        return None
+    return ParityMemo(path)
+
+
+if __name__ == "__main__":
+    from bench_matching import load_rules
+
+    parser = argparse.ArgumentParser(description="Inspect or prune the persistent parity memo")
+    parser.add_argument("command", choices=["stats", "prune"])
+    parser.add_argument("--path", default=MEMO_PATH)
+    args = parser.parse_args()
+
+    all_rules = load_rules()
+    with ParityMemo(args.path) as memo:
+        if args.command == "prune":
+            print(f"Deleted {memo.prune(all_rules)} results from outdated rules versions.")
+        stats = memo.stats(all_rules)
+    print(f"{stats['rows']} memoized pairs ({stats['stale_rows']} stale), {stats['bytes'] / 1024:.1f} KB")
+    for category, entry in sorted(stats["current"].items()):
+        print(f"  {category:<13} {entry['rows']:>9} pairs  {entry['matches']:>7} matches")
@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".parity_stats.json")
+
+# Prior strength (pseudo-evaluations) given to the cardinality/tolerance guess before real stats
+PRIOR_WEIGHT = 20
+DEFAULT_GATE_CARDINALITY = 3
+REORDER_EVERY = 512
+
+# Relative cost of one check: a gate is a couple of string ops, a numeric check two float() calls
+GATE_COST = 1.0
+NUMERIC_COST = 1.3
+
+Stats = Dict[str, Dict[str, Dict[str, int]]]
+
+
+def load_selectivity(path: str = STATS_PATH) -> Stats:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_selectivity(stats: Stats, path: str = STATS_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class AdaptiveParity:
+    """
+    check_parity with the checks reordered by observed selectivity.
+    Each strict gate and numeric window is one check; checks run in descending
+    (rejection rate / cost) order, so most rejected candidates are discarded after one or two.
+    Rejection rates start from a prior (gate cardinality from structural_specs, numeric
+    tolerance) blended with stats from earlier runs, and are re-estimated every
+    REORDER_EVERY candidates. Not thread-safe: use one instance per worker and merge via `stats`.
+    Only the order changes: a candidate is accepted iff every check
+    passes, and accepted scores are summed in rules order, so results equal check_parity's
+    (except which rule is reported as fail_code when several would reject).
+    """
+    def __init__(self, category: str, rules: Dict[str, Any], stats: Optional[Stats] = None, reorder_every: int = REORDER_EVERY):
+        self.category = category
+        self.rules = rules
+        self.tolerance = rules.get("tolerance", 0.20)
+        self.numeric_keys = list(rules.get("numeric_specs", []))
+        self.reorder_every = reorder_every
+        self.stats: Stats = stats if stats is not None else {}
+
+        structural = rules.get("structural_specs", {})
+        priors: Dict[str, float] = {}
+        checks: List[Tuple[bool, str]] = []
+        for feature, strict in rules.get("gatekeeping", {}).items():
+            if strict:
+                cardinality = len(structural.get(feature) or []) or DEFAULT_GATE_CARDINALITY
+                priors[feature] = 1.0 - 1.0 / cardinality
+                checks.append((True, feature))
+        for key in self.numeric_keys:
+            # A tight window rejects more; 50% tolerance and up is treated as non-selective
+            priors[key] = max(0.05, 1.0 - self.tolerance * 2)
+            checks.append((False, key))
+        self._priors = priors
+        self._checks = checks
+        self._order = list(checks)
+        self._rejects = [0] * len(checks)
+        self._seen = 0
+        self.rejected = 0
+        self.checks_on_rejects = 0
+        self._reorder()
+
+    def _rate(self, name: str) -> float:
+        entry = self.stats.get(self.category, {}).get(name, {})
+        prior = self._priors[name]
+        return (entry.get("rejected", 0) + prior * PRIOR_WEIGHT) / (entry.get("evaluated", 0) + PRIOR_WEIGHT)
+
+    def _reorder(self):
+        self._order = sorted(self._checks, key=lambda c: self._rate(c[1]) / (GATE_COST if c[0] else NUMERIC_COST), reverse=True)
+        self._rejects = [0] * len(self._order)
+        self._seen = 0
+
+    def _fold(self):
+        # Candidates reaching position i = all seen minus those rejected earlier in this order
+        category_stats = self.stats.setdefault(self.category, {})
+        reached = self._seen
+        for pos, ((_, name), rejected) in enumerate(zip(self._order, self._rejects)):
+            entry = category_stats.setdefault(name, {"evaluated": 0, "rejected": 0})
+            entry["evaluated"] += reached
+            entry["rejected"] += rejected
+            self.rejected += rejected
+            self.checks_on_rejects += rejected * (pos + 1)
+            reached -= rejected
+
+    def _score(self, target_specs: Dict[str, Any], candidate_specs: Dict[str, Any]) -> float:
+        accum = 0.0
+        valid = 0
+        for key in self.numeric_keys:
+            t_num = target_specs.get(key)
+            c_num = candidate_specs.get(key)
+            if t_num is None or c_num is None:
+                continue
+            try:
+                t_val = float(t_num)
+                c_val = float(c_num)
+            except ValueError:
+                continue
+            if t_val == 0:
+                continue
+            accum += 1.0 - abs(t_val - c_val) / t_val
+            valid += 1
+        return accum / valid if valid > 0 else 0.5
+
+    def check(self, target_specs: Dict[str, Any], candidate_specs: Dict[str, Any]) -> Tuple[bool, float, Optional[str]]:
+        """Same contract as validate_tech_parity.check_parity."""
+        if self._seen >= self.reorder_every:
+            self._fold()
+            self._reorder()
+        self._seen += 1
+        tolerance = self.tolerance
+        for pos, (is_gate, name) in enumerate(self._order):
+            t = target_specs.get(name)
+            if t is None:
+                continue
+            c = candidate_specs.get(name)
+            if c is None:
+                continue
+            if is_gate:
+                if not t or not c or (t == c and type(t) is type(c)):
+                    continue
+                t_norm = str(t).lower().strip()
+                c_norm = str(c).lower().strip()
+                if t_norm and c_norm and t_norm != c_norm:
+                    self._rejects[pos] += 1
+                    return False, 0.0, name
+            else:
+                try:
+                    t_val = float(t)
+                    c_val = float(c)
+                except ValueError:
+                    continue
+                if t_val != 0 and not abs(t_val - c_val) / t_val <= tolerance:
+                    self._rejects[pos] += 1
+                    return False, 0.0, name
+        return True, self._score(target_specs, candidate_specs), None
+
+    def order(self) -> List[str]:
+        return [name for _, name in self._order]
+
+    def finish(self) -> Stats:
+        """Folds the current window into `stats` and returns them (for save_selectivity)."""
+        self._fold()
+        self._reorder()
+        return self.stats
+
+    def checks_per_reject(self) -> float:
+        """Average checks visited per rejected candidate (including skipped ones), over folded windows."""
+        return self.checks_on_rejects / self.rejected if self.rejected else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show learned parity check order per category")
+    parser.add_argument("--stats", default=STATS_PATH)
+    args = parser.parse_args()
+    stats = load_selectivity(args.stats)
+    if not stats:
+        print("No selectivity stats yet.")
+    for category, rules_stats in sorted(stats.items()):
+        print(f"{category}:")
+        for name, entry in sorted(rules_stats.items(), key=lambda kv: -kv[1]["rejected"] / max(1, kv[1]["evaluated"])):
+            rate = entry["rejected"] / max(1, entry["evaluated"])
+            print(f"  {rate:6.1%}  {name}  ({entry['rejected']}/{entry['evaluated']})")
@@ -2,13 +2,44 @@
 import sys
 import json
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 # Ensure we can import sibling modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from rival_search_client import RivalSearchClient
-from validate_tech_parity import validate_parity
+from validate_tech_parity import explain_parity
+from parity_order import AdaptiveParity, load_selectivity, save_selectivity
+from parity_memo import open_memo, TargetMemo
+from pipeline_trace import span, count
+
+def search_plan(rules: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(tier, brand) pairs to search, Tier 1 brands first."""
+    tier1_brands = rules.get("brands_tier1", [])
+    tier2_brands = rules.get("brands_tier2", [])
+    return [("Tier 1", b) for b in tier1_brands] + [("Tier 2", b) for b in tier2_brands]
+
+def evaluate_candidate(cand: Dict[str, Any], target_specs: Dict[str, Any], tier: str, brand: str, category: str, rules: Dict[str, Any], parity: AdaptiveParity, known: Optional[TargetMemo]) -> bool:
+    """
+    Runs parity on one candidate; on a match fills cand["match_meta"] and returns True.
+    """
+    if known:
+        is_match, score, fail_code = known.check(cand["specs"], lambda: parity.check(target_specs, cand["specs"]))
+    else:
+        is_match, score, fail_code = parity.check(target_specs, cand["specs"])
+
+    if is_match:
+        # Only matches get the full human-readable log
+        cand["match_meta"] = {
+            "score": score,
+            "tier": tier,
+            "log": explain_parity(target_specs, cand["specs"], rules)
+        }
+        count("matches", category=category, tier=tier)
+        print(f"MATCH FOUND: {brand} {cand.get('model')} (Score: {score:.2f})")
+    else:
+        print(f"Discarded {brand} {cand.get('model')}: failed {fail_code}")
+    return is_match
 
 def perform_global_match(category: str, target_specs: Dict[str, Any], rules: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -16,12 +47,14 @@ def perform_global_match(category: str, target_specs: Dict[str, Any], rules: Dic
     """
     client = RivalSearchClient()
     matched_candidates = []
+    # Checks run most-selective-first, learned across runs
+    parity = AdaptiveParity(category, rules, load_selectivity())
+    # Pairs already validated under the same specs and rules are answered from the memo
+    memo = open_memo()
+    known = memo.target(category, target_specs, rules) if memo else None
     
     # 1. Load Brands
-    tier1_brands = rules.get("brands_tier1", [])
-    tier2_brands = rules.get("brands_tier2", [])
-    
-    all_brands = [("Tier 1", b) for b in tier1_brands] + [("Tier 2", b) for b in tier2_brands]
+    all_brands = search_plan(rules)
     
     print(f"Starting Global Search for {len(all_brands)} targets...")
     
@@ -29,22 +62,22 @@ def perform_global_match(category: str, target_specs: Dict[str, Any], rules: Dic
         # Stop condition: If we have enough matches, maybe we can stop? (User said find ~4 + 1-3)
         # For now, we search all to get best options, or limit per brand
         
-        candidates = client.search_global_model(brand, category, target_specs)
+        with span("global_search", brand=brand):
+            candidates = client.search_global_model(brand, category, target_specs)
+        count("candidates_checked", len(candidates), category=category)
         
-        for cand in candidates:
-            is_match, score, log = validate_parity(target_specs, cand["specs"], rules)
-            
-            if is_match:
-                cand["match_meta"] = {
-                    "score": score,
-                    "tier": tier,
-                    "log": log
-                }
-                matched_candidates.append(cand)
-                print(f"MATCH FOUND: {brand} {cand.get('model')} (Score: {score:.2f})")
-            else:
-                 print(f"Discarded {brand} {cand.get('model')}: {log[-1]}")
+        with span("parity", brand=brand, candidates=len(candidates)):
+            for cand in candidates:
+                if evaluate_candidate(cand, target_specs, tier, brand, category, rules, parity, known):
+                    matched_candidates.append(cand)
                  
+    try:
+        save_selectivity(parity.finish())
+    except OSError as e:
+        print(f"Warning: could not save parity selectivity stats: {e}")
+    if memo:
+        print(f"Parity memo: {memo.hits} cached, {memo.misses} computed")
+        memo.close()
     return matched_candidates
 
 if __name__ == "__main__":
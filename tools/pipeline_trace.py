@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import bisect
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+TRACE_DIR = os.environ.get("PIPELINE_TRACE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".traces")
+# Raw spans kept per run for the JSONL trace; past this, stages are only counted in their histograms
+MAX_SPANS = int(os.environ.get("PIPELINE_TRACE_SPANS", "10000"))
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: Any) -> str:
+    """Prometheus label value escaping (backslash, double quote, newline)."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Fixed-bucket duration histogram: constant memory however many spans a stage records."""
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6),
+                "buckets": dict(zip([f"{b:g}" for b in BUCKETS] + ["+Inf"], self.buckets))}
+
+
+class Run:
+    """
+    Spans and counters collected for one pipeline run.
+    Spans nest per thread; counters are keyed by name plus sorted labels. Stage durations are
+    aggregated into histograms; only the first MAX_SPANS raw spans are kept for the trace file.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.run_id = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.started = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.histograms: Dict[str, Histogram] = {}
+        self.dropped_spans = 0
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = 0
+
+    def _stack(self) -> List[int]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        stack = self._stack()
+        with self._lock:
+            self._ids += 1
+            span_id = self._ids
+        parent = stack[-1] if stack else None
+        stack.append(span_id)
+        start = time.time()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - t0
+            stack.pop()
+            record = {"span": name, "id": span_id, "parent": parent, "thread": threading.current_thread().name,
+                      "start": round(start, 6), "duration_s": round(duration, 6)}
+            if attrs:
+                record["attrs"] = attrs
+            if error:
+                record["error"] = error
+            with self._lock:
+                if len(self.spans) < MAX_SPANS:
+                    self.spans.append(record)
+                else:
+                    self.dropped_spans += 1
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.observe(duration)
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition: one histogram of stage durations plus one counter per metric."""
+        run_label = f'run="{_escape(self.name)}"'
+        lines = [
+            "# HELP pipeline_stage_seconds Time spent per pipeline stage",
+            "# TYPE pipeline_stage_seconds histogram"
+        ]
+        with self._lock:
+            histograms = {k: (list(h.buckets), h.sum, h.count) for k, h in self.histograms.items()}
+            counters = dict(self.counters)
+        for stage, (buckets, total, n) in sorted(histograms.items()):
+            stage_label = f'{run_label},stage="{_escape(stage)}"'
+            cumulative = 0
+            for bound, hits in zip([f"{b:g}" for b in BUCKETS] + ["+Inf"], buckets):
+                cumulative += hits
+                lines.append(f'pipeline_stage_seconds_bucket{{{stage_label},le="{bound}"}} {cumulative}')
+            lines.append(f'pipeline_stage_seconds_sum{{{stage_label}}} {total:.6f}')
+            lines.append(f'pipeline_stage_seconds_count{{{stage_label}}} {n}')
+
+        by_name: Dict[str, List[Tuple[LabelKey, float]]] = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for name, series in sorted(by_name.items()):
+            metric = f"pipeline_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(series):
+                label_text = ",".join([run_label] + [f'{k}="{_escape(v)}"' for k, v in labels])
+                lines.append(f"{metric}{{{label_text}}} {value:g}")
+        lines.append(f'pipeline_run_seconds{{{run_label}}} {time.time() - self.started:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str = TRACE_DIR) -> Tuple[str, str]:
+        """Writes <run_id>.jsonl (kept spans, stage histograms, then counters) and <run_id>.prom; returns both paths."""
+        os.makedirs(directory, exist_ok=True)
+        trace_path = os.path.join(directory, f"{self.run_id}.jsonl")
+        prom_path = os.path.join(directory, f"{self.run_id}.prom")
+        with self._lock:
+            spans = list(self.spans)
+            histograms = {k: h.to_dict() for k, h in self.histograms.items()}
+            counters = dict(self.counters)
+            dropped = self.dropped_spans
+        with open(trace_path, 'w') as f:
+            for record in spans:
+                f.write(json.dumps(record) + "\n")
+            for stage, histogram in sorted(histograms.items()):
+                f.write(json.dumps(dict(histogram, histogram=stage)) + "\n")
+            if dropped:
+                f.write(json.dumps({"counter": "trace_spans_dropped", "labels": {}, "value": dropped}) + "\n")
+            for (name, labels), value in sorted(counters.items()):
+                f.write(json.dumps({"counter": name, "labels": dict(labels), "value": value}) + "\n")
+        with open(prom_path, 'w') as f:
+            f.write(self.prometheus())
+        return trace_path, prom_path
+
+
+_run: Optional[Run] = None
+
+
+def start_run(name: str) -> Optional[Run]:
+    """Starts collecting for this process. PIPELINE_TRACE=0 turns tracing off entirely."""
+    global _run
+    if os.environ.get("PIPELINE_TRACE", "1") == "0":
+        return None
+    _run = Run(name)
+    return _run
+
+
+def finish_run(quiet: bool = False) -> Optional[Tuple[str, str]]:
+    global _run
+    run, _run = _run, None
+    if run is None:
+        return None
+    paths = run.write()
+    if not quiet:
+        print(f"Trace: {paths[0]}\nMetrics: {paths[1]}")
+    return paths
+
+
+@atexit.register
+def _flush_at_exit():
+    # Keep the trace of runs that crashed or exited early
+    if _run is not None:
+        finish_run(quiet=True)
+
+
+@contextmanager
+def _noop():
+    yield
+
+
+def span(name: str, **attrs):
+    """Times a stage. A no-op when no run has been started."""
+    run = _run
+    return run.span(name, **attrs) if run is not None else _noop()
+
+
+def count(name: str, value: float = 1, **labels):
+    run = _run
+    if run is not None:
+        run.count(name, value, **labels)
+
+
+def summarize_trace(path: str) -> List[Tuple[str, int, float]]:
+    """(stage, spans, total seconds) from a JSONL trace, slowest first."""
+    totals: Dict[str, List[float]] = {}
+    histograms: Dict[str, Tuple[int, float]] = {}
+    with open(path, 'r') as f:
+        for line in f:
+            record = json.loads(line)
+            if "span" in record:
+                totals.setdefault(record["span"], []).append(record["duration_s"])
+            elif "histogram" in record:
+                histograms[record["histogram"]] = (record["count"], record["sum"])
+    # Histograms cover every span, including those past MAX_SPANS; older traces only have spans
+    stages = histograms or {k: (len(v), sum(v)) for k, v in totals.items()}
+    return sorted(((k, n, total) for k, (n, total) in stages.items()), key=lambda t: -t[2])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a pipeline trace")
+    parser.add_argument("trace", nargs="?", help="Trace JSONL (default: latest in PIPELINE_TRACE_DIR)")
+    args = parser.parse_args()
+
+    path = args.trace
+    if not path:
+        traces = sorted((os.path.join(TRACE_DIR, f) for f in os.listdir(TRACE_DIR) if f.endswith(".jsonl")), key=os.path.getmtime) if os.path.isdir(TRACE_DIR) else []
+        if not traces:
+            print(f"No traces in {TRACE_DIR}")
+            sys.exit(0)
+        path = traces[-1]
+    print(f"{path}:")
+    for stage, spans, total in summarize_trace(path):
+        print(f"  {stage:<16} {spans:>7} spans  {total:>9.3f}s total  {total / spans * 1000:>9.2f}ms avg")
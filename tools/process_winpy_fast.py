@@ -1,11 +1,19 @@
 import os
+import sys
 import json
+import argparse
 import http.client
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
 load_dotenv('C:/Users/rcgir/Desktop/Antigravity Pojects/Find Competitor Product/webapp/.env.local')
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from checkpoint_journal import Journal, item_key
+from db_outbox import get_outbox
+
 SUPABASE_URL = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
@@ -18,21 +26,32 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 conn = http.client.HTTPSConnection('google.serper.dev')
 headers = {'X-API-KEY': SERPER_API_KEY, 'Content-Type': 'application/json'}
 
-def run_chunk(limit=10):
+def load_work():
     manual_skus = ['X16F-PTB156E', 'X19KN', 'X27KF']
     my_monitors_res = supabase.table('my_products').select('sku').ilike('category', '%monitor%').execute()
     monitors = [m['sku'] for m in my_monitors_res.data if m['sku'] not in manual_skus]
-    inserted_count = 0
 
     regional_res = supabase.table('monitors_regional').select('your_sku, competitor_sku').execute()
     already_processed = set(f"{r['your_sku']}-{r['competitor_sku']}" for r in regional_res.data)
 
     if not monitors:
         print("No eligible monitors found.")
-        return 0
+        return []
 
     match_res = supabase.table('monitors_comparison').select('your_sku, competitor_brand, competitor_sku').in_('your_sku', monitors).execute()
-    to_process = [m for m in match_res.data if f"{m['your_sku']}-{m['competitor_sku']}" not in already_processed]
+    return [m for m in match_res.data if f"{m['your_sku']}-{m['competitor_sku']}" not in already_processed]
+
+def run_chunk(limit=10, journal=None):
+    inserted_count = 0
+
+    # With a journal, the work list is read from the tables once and progress is tracked locally
+    to_process = journal.meta("to_process") if journal else None
+    if to_process is None:
+        to_process = load_work()
+        if journal:
+            journal.set_meta("to_process", to_process)
+    if journal:
+        to_process = [m for m in to_process if not journal.is_done(item_key(m['your_sku'], m['competitor_sku']))]
     
     if not to_process:
         print("All monitors processed!")
@@ -70,7 +89,7 @@ def run_chunk(limit=10):
                     "retailer_name": "winpy.cl",
                     "product_page_url": link.split("?")[0]
                 }
-                supabase.table('monitors_regional').upsert(record, on_conflict='your_sku,competitor_sku,country,retailer_name').execute()
+                get_outbox().upsert(supabase, 'monitors_regional', record, on_conflict='your_sku,competitor_sku,country,retailer_name')
                 print(f"Inserted: {brand} {sku} - Found on Winpy (Available: {available})")
                 inserted_count += 1
                 inserted = True
@@ -78,6 +97,8 @@ def run_chunk(limit=10):
                 
         if not inserted:
             print(f"Not found on winpy.cl: {brand} {sku}")
+        if journal:
+            journal.done(item_key(your_sku, sku), {"found": inserted})
             
     # Update discovery_status
     if inserted_count > 0:
@@ -87,13 +108,25 @@ def run_chunk(limit=10):
             "retailer": "winpy.cl",
             "match_count": inserted_count
         }
-        try:
-            supabase.table('discovery_status').upsert(discovery_payload, on_conflict='category,country,retailer').execute()
+        if get_outbox().upsert(supabase, 'discovery_status', discovery_payload, on_conflict='category,country,retailer'):
             print("Updated discovery_status table.")
-        except Exception as e:
-            print(f"Error updating discovery_status: {e}")
+        else:
+            print("discovery_status update queued in the local outbox.")
             
     return len(to_process) - len(chunk)
 
 if __name__ == "__main__":
-    run_chunk(limit=50)
+    parser = argparse.ArgumentParser(description="Winpy.cl regional discovery for monitors")
+    parser.add_argument("--limit", type=int, default=50, help="Items per chunk")
+    parser.add_argument("--all", action="store_true", help="Keep processing chunks until nothing is left")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted run from its checkpoint journal")
+    args = parser.parse_args()
+
+    journal = Journal("winpy_fast:monitors", resume=args.resume)
+    print(journal.describe())
+    remaining = run_chunk(limit=args.limit, journal=journal)
+    while args.all and remaining > 0:
+        remaining = run_chunk(limit=args.limit, journal=journal)
+    if remaining == 0:
+        journal.finish()
+    journal.close()
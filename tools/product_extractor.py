@@ -0,0 +1,353 @@
+import os
+import sys
+import re
+import json
+import time
+import argparse
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+CHUNK_SIZE = 64 * 1024
+DATALAYER_MARKERS = ('dataLayer.push(', 'dataLayer=[', 'dataLayer = [')
+VOID_TAGS = {'meta', 'link', 'img', 'br', 'hr', 'input', 'source', 'area', 'base', 'col', 'embed', 'param', 'track', 'wbr'}
+
+
+class _Done(Exception):
+    """Raised from a parser callback to abandon the rest of the document."""
+
+
+def _availability(value: Any) -> Optional[bool]:
+    if value is None:
+        return None
+    text = str(value).lower()
+    if 'outofstock' in text or 'soldout' in text or 'discontinued' in text or 'agotado' in text:
+        return False
+    if 'instock' in text or 'limitedavailability' in text or 'preorder' in text:
+        return True
+    return None
+
+
+def parse_price(value: Any) -> Optional[float]:
+    """
+    Locale-aware price parsing: '$ 199.990' -> 199990, '1.299,90' -> 1299.9, '249,5' -> 249.5.
+    When both '.' and ',' appear the last one is the decimal separator; a lone separator
+    followed by exactly 3 digits (or a repeated one) groups thousands, otherwise it is decimal.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = re.sub(r'[^\d\.,]', '', str(value)).strip('.,')
+    if not re.search(r'\d', text):
+        return None
+    if '.' in text and ',' in text:
+        decimal = max(text.rfind('.'), text.rfind(','))
+        whole, frac = text[:decimal], text[decimal + 1:]
+    else:
+        sep = '.' if '.' in text else ','
+        parts = text.split(sep)
+        if len(parts) > 2 or (len(parts) == 2 and len(parts[1]) == 3):
+            whole, frac = text, ''
+        else:
+            whole, frac = parts[0], parts[1] if len(parts) == 2 else ''
+    whole = re.sub(r'[^\d]', '', whole) or '0'
+    frac = re.sub(r'[^\d]', '', frac)
+    return float(f"{whole}.{frac}" if frac else whole)
+
+
+# Most reliable first: JSON-LD is authored for search engines, dataLayer for analytics
+SOURCE_RANK = {"json-ld": 0, "microdata": 1, "datalayer": 2}
+
+
+def _is_type(node: Dict[str, Any], name: str) -> bool:
+    node_type = node.get('@type') or node.get('type') or ''
+    types = node_type if isinstance(node_type, list) else [node_type]
+    return any(str(t).rsplit('/', 1)[-1].lower() == name.lower() for t in types)
+
+
+def _normalize_jsonld(node: Dict[str, Any]) -> Dict[str, Any]:
+    offers = node.get('offers') or {}
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    if _is_type(offers, 'AggregateOffer'):
+        offers = dict(offers, price=offers.get('price') or offers.get('lowPrice'))
+    brand = node.get('brand')
+    if isinstance(brand, dict):
+        brand = brand.get('name')
+    specs = {}
+    for prop in node.get('additionalProperty') or []:
+        if isinstance(prop, dict) and prop.get('name'):
+            specs[prop['name']] = prop.get('value')
+    return {
+        "name": node.get('name'),
+        "sku": node.get('sku') or node.get('mpn'),
+        "brand": brand,
+        "price": parse_price(offers.get('price')),
+        "currency": offers.get('priceCurrency'),
+        "available": _availability(offers.get('availability')),
+        "url": offers.get('url') or node.get('url'),
+        "specs": specs,
+        "source": "json-ld"
+    }
+
+
+def _walk_jsonld(data: Any) -> List[Dict[str, Any]]:
+    """Flattens JSON-LD (lists and @graph containers) into the Product nodes it contains."""
+    found = []
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            if _is_type(node, 'Product'):
+                found.append(node)
+            elif '@graph' in node:
+                stack.append(node['@graph'])
+    return found
+
+
+def _normalize_datalayer(item: Dict[str, Any], currency: Optional[str]) -> Dict[str, Any]:
+    return {
+        "name": item.get('name') or item.get('item_name'),
+        "sku": item.get('id') or item.get('item_id') or item.get('sku'),
+        "brand": item.get('brand') or item.get('item_brand'),
+        "price": parse_price(item.get('price')),
+        "currency": item.get('currency') or currency,
+        "available": None,
+        "url": item.get('url'),
+        "specs": {},
+        "source": "datalayer"
+    }
+
+
+def _walk_datalayer(payload: Any) -> List[Dict[str, Any]]:
+    """Pulls product lists out of GA3 (detail/impressions) and GA4 (items) ecommerce payloads."""
+    found = []
+    payloads = payload if isinstance(payload, list) else [payload]
+    for entry in payloads:
+        if not isinstance(entry, dict):
+            continue
+        ecommerce = entry.get('ecommerce') or {}
+        if not isinstance(ecommerce, dict):
+            continue
+        currency = ecommerce.get('currencyCode') or ecommerce.get('currency')
+        items = list(ecommerce.get('items') or []) + list(ecommerce.get('impressions') or [])
+        detail = ecommerce.get('detail') or {}
+        if isinstance(detail, dict):
+            items += list(detail.get('products') or [])
+        found.extend(_normalize_datalayer(i, currency) for i in items if isinstance(i, dict))
+    return found
+
+
+class StructuredDataParser(HTMLParser):
+    """
+    Single-pass, event-driven extractor for JSON-LD, schema.org microdata and dataLayer payloads.
+    With `stop_at_first=True` the parse is abandoned as soon as a JSON-LD product block is found.
+    """
+    def __init__(self, stop_at_first: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.stop_at_first = stop_at_first
+        self.products: List[Dict[str, Any]] = []
+        self._script_kind: Optional[str] = None
+        self._script_buf: List[str] = []
+        self._decoder = json.JSONDecoder()
+        # Microdata: stack of open (tag, itemscope-or-None) elements
+        self._scopes: List[tuple] = []
+        self._open_prop: Optional[tuple] = None
+
+    # --- helpers ---
+    def _emit(self, products: List[Dict[str, Any]]):
+        self.products.extend(products)
+        # Nothing can outrank JSON-LD, so only a JSON-LD block ends the parse early
+        if self.stop_at_first and any(p["source"] == "json-ld" for p in products):
+            raise _Done()
+
+    def _current_scope(self) -> Optional[Dict[str, Any]]:
+        for _, scope in reversed(self._scopes):
+            if scope is not None:
+                return scope
+        return None
+
+    # --- events ---
+    def handle_starttag(self, tag, attrs):
+        if tag == 'script':
+            attr_map = dict(attrs)
+            script_type = (attr_map.get('type') or '').lower()
+            self._script_kind = 'jsonld' if script_type == 'application/ld+json' else 'js'
+            self._script_buf = []
+            return
+
+        attr_map = dict(attrs)
+        itemprop = attr_map.get('itemprop')
+        parent = self._current_scope()
+        scope = None
+        if 'itemscope' in attr_map:
+            scope = {"type": (attr_map.get('itemtype') or '').rsplit('/', 1)[-1], "props": {}}
+            if itemprop and parent is not None:
+                parent["props"][itemprop] = scope
+        elif itemprop and parent is not None:
+            value = attr_map.get('content') or attr_map.get('href') or attr_map.get('src')
+            if value is not None:
+                parent["props"].setdefault(itemprop, value.strip())
+            elif tag not in VOID_TAGS:
+                self._open_prop = (parent, itemprop, [])
+
+        # Only track element nesting once inside (or opening) an itemscope
+        if tag not in VOID_TAGS and (scope is not None or self._scopes):
+            self._scopes.append((tag, scope))
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == 'script':
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'script':
+            if self._script_kind:
+                self._finish_script("".join(self._script_buf))
+            self._script_kind = None
+            return
+        if tag in VOID_TAGS or not self._scopes:
+            return
+        if self._open_prop is not None:
+            parent, prop, parts = self._open_prop
+            parent["props"].setdefault(prop, " ".join(parts).strip())
+            self._open_prop = None
+        # Unclosed elements (<li>, <p>) are implicitly closed by the first matching end tag below them
+        if not any(open_tag == tag for open_tag, _ in self._scopes):
+            return
+        while self._scopes:
+            open_tag, scope = self._scopes.pop()
+            if scope is not None and scope["type"].lower() == 'product' and self._current_scope() is None:
+                self._emit([self._normalize_microdata(scope)])
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._script_kind:
+            self._script_buf.append(data)
+        elif self._open_prop is not None and data.strip():
+            self._open_prop[2].append(data.strip())
+
+    # --- payloads ---
+    def _finish_script(self, text: str):
+        if self._script_kind == 'jsonld':
+            try:
+                data = json.loads(text)
+            except ValueError:
+                return
+            self._emit([_normalize_jsonld(n) for n in _walk_jsonld(data)])
+            return
+
+        if 'dataLayer' not in text:
+            return
+        found = []
+        for marker in DATALAYER_MARKERS:
+            start = text.find(marker)
+            while start != -1:
+                brace = start + len(marker)
+                while brace < len(text) and text[brace] in ' \t\r\n':
+                    brace += 1
+                try:
+                    payload, end = self._decoder.raw_decode(text, brace)
+                    found.extend(_walk_datalayer(payload))
+                except ValueError:
+                    end = brace
+                start = text.find(marker, max(end, start + 1))
+        if found:
+            self._emit(found)
+
+    def _normalize_microdata(self, scope: Dict[str, Any]) -> Dict[str, Any]:
+        props = scope["props"]
+        offers = props.get('offers')
+        offers = offers["props"] if isinstance(offers, dict) else {}
+        brand = props.get('brand')
+        if isinstance(brand, dict):
+            brand = brand["props"].get('name')
+        return {
+            "name": props.get('name'),
+            "sku": props.get('sku') or props.get('mpn'),
+            "brand": brand,
+            "price": parse_price(offers.get('price') or props.get('price')),
+            "currency": offers.get('priceCurrency') or props.get('priceCurrency'),
+            "available": _availability(offers.get('availability') or props.get('availability')),
+            "url": offers.get('url') or props.get('url'),
+            "specs": {},
+            "source": "microdata"
+        }
+
+
+def _run(html: str, stop_at_first: bool) -> List[Dict[str, Any]]:
+    parser = StructuredDataParser(stop_at_first=stop_at_first)
+    try:
+        for i in range(0, len(html), CHUNK_SIZE):
+            parser.feed(html[i:i + CHUNK_SIZE])
+        parser.close()
+    except _Done:
+        pass
+    return parser.products
+
+
+def extract_product(html: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the best structured product block on a page: JSON-LD, then microdata, then dataLayer
+    (document order within a source). The parse stops at the first JSON-LD block.
+    """
+    products = _run(html, stop_at_first=True)
+    return min(products, key=lambda p: SOURCE_RANK[p["source"]]) if products else None
+
+
+def extract_all(html: str) -> List[Dict[str, Any]]:
+    """
+    Returns every structured product on a page (e.g. dataLayer impressions on a category listing).
+    """
+    return _run(html, stop_at_first=False)
+
+
+def benchmark(paths: List[str], repeat: int = 20, full: bool = False):
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            pages.append(f.read())
+    fn = extract_all if full else extract_product
+
+    hits = sum(1 for page in pages if fn(page))
+    cpu_start = time.process_time()
+    for _ in range(repeat):
+        for page in pages:
+            fn(page)
+    cpu = time.process_time() - cpu_start
+    total = repeat * len(pages)
+
+    print(f"Pages: {len(pages)} (structured data found on {hits}), iterations: {total}")
+    print(f"Throughput: {total / cpu if cpu else float('inf'):.1f} pages/s per core ({cpu * 1000 / total:.2f} ms CPU/page)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured product-data extractor (JSON-LD, microdata, dataLayer)")
+    parser.add_argument("paths", nargs="+", help="Saved HTML pages")
+    parser.add_argument("--all", action="store_true", help="Extract every product instead of stopping at the first")
+    parser.add_argument("--bench", action="store_true", help="Measure pages/s per core instead of printing results")
+    parser.add_argument("--repeat", type=int, default=20, help="Benchmark iterations per page")
+    args = parser.parse_args()
+
+    if args.bench:
+        benchmark(args.paths, repeat=args.repeat, full=args.all)
+        return
+
+    for path in args.paths:
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            html = f.read()
+        result = extract_all(html) if args.all else extract_product(html)
+        print(f"--- {path}")
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
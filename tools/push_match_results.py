@@ -1,10 +1,17 @@
 
 import os
+import sys
 import json
 import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_store import canonical_sku
+from db_outbox import get_outbox
+
 try:
     from supabase import create_client, Client
 except ImportError:
@@ -27,9 +34,23 @@ def get_supabase_client() -> Optional[Client]:
         print(f"Error initializing Supabase client: {e}")
         return None
 
+# Fixed namespace: the same (product, brand, model) gets the same id on every run and machine
+MATCH_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "competitor_matches")
+CHUNK_SIZE = 500
+
+def match_id(my_product_id: str, brand: Optional[str], model: Optional[str]) -> str:
+    """
+    Deterministic row id for one competitor of one product. Brand case/whitespace and model
+    punctuation don't matter ('MSI', 'Optix G271' == 'msi ', 'OPTIX-G271').
+    """
+    key = f"{my_product_id}|{(brand or '').lower().strip()}|{canonical_sku(model) or ''}"
+    return str(uuid.uuid5(MATCH_NAMESPACE, key))
+
 def push_results(matches: List[Dict[str, Any]], my_product_id: str):
     """
-    Pushes results to the 'competitor_matches' table in Supabase.
+    Upserts results into the 'competitor_matches' table in Supabase.
+    Row ids are derived from (my_product_id, brand, model), so re-runs update existing rows
+    instead of adding duplicates.
     """
     if not matches:
         print("No matches to push.")
@@ -38,14 +59,13 @@ def push_results(matches: List[Dict[str, Any]], my_product_id: str):
     client = get_supabase_client()
     
     # Prepare payload
-    payloads = []
+    payloads: Dict[str, Dict[str, Any]] = {}
     for m in matches:
-        # Generate match_id if not present
-        match_id = str(uuid.uuid4())
+        row_id = match_id(my_product_id, m.get("brand"), m.get("model"))
         
         # Extract data
         payload = {
-            "id": match_id, # Assuming DB has uuid PK
+            "id": row_id, # Assuming DB has uuid PK
             "my_product_id": my_product_id,
             "competitor_brand": m.get("brand"),
             "competitor_model": m.get("model"),
@@ -59,21 +79,29 @@ def push_results(matches: List[Dict[str, Any]], my_product_id: str):
             "spec_diffs": json.dumps(m.get("match_meta", {}).get("notes", [])),
             "timestamp": datetime.utcnow().isoformat()
         }
-        payloads.append(payload)
+        # One row per id in a statement (Postgres rejects upserting the same row twice); best score wins
+        previous = payloads.get(row_id)
+        if previous is None or (payload["technical_parity_score"] or 0) > (previous["technical_parity_score"] or 0):
+            payloads[row_id] = payload
+    payloads = list(payloads.values())
         
-    if client:
-        try:
-            print(f"Pushing {len(payloads)} records to Supabase...")
-            data, count = client.table("competitor_matches").insert(payloads).execute()
-            print("Successfully pushed to Supabase.")
-        except Exception as e:
-            print(f"Supabase Output Error: {e}")
-            # Fallback to print if DB fails
-            print(f"FALLBACK DB INSERT: {json.dumps(payloads, indent=2)}")
+    # Queued on disk first: an outage or a missing client leaves the rows for the next run to replay
+    outbox = get_outbox()
+    print(f"Pushing {len(payloads)} records to Supabase...")
+    for i in range(0, len(payloads), CHUNK_SIZE):
+        outbox.enqueue("competitor_matches", "upsert", payloads[i:i + CHUNK_SIZE], on_conflict="id")
+    if not client:
+        print(f"Supabase Client unavailable. Queued {len(payloads)} records in the local outbox ({outbox.path}).")
+        return
+    pending = outbox.flush(client)
+    for rejected in outbox.parked:
+        print(f"Rejected by the database and parked as dead: {rejected}")
+    if pending:
+        print(f"Not delivered yet: {pending} operations stay queued in the local outbox for replay.")
+    elif outbox.parked:
+        print(f"Pushed to Supabase except {len(outbox.parked)} rejected operations; fix them, then run 'python tools/db_outbox.py retry-dead'.")
     else:
-        # If client not available, print as fallback (mock behavior)
-        print("Supabase Client unavailable. Printing payload:")
-        print(f"DB INSERT: {json.dumps(payloads, indent=2)}")
+        print("Successfully pushed to Supabase.")
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_store import canonical_sku
+
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".query_stats.json")
+LEDGER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".query_ledger.jsonl")
+
+# Value of a successful lookup, by what we already know about the (competitor, country, retailer) row
+VALUE_NO_ROW = 1.0
+VALUE_NO_PRICE = 0.6
+VALUE_REFRESH_MAX = 0.5
+STALE_AFTER_DAYS = 30.0
+SEEN_ELSEWHERE_BOOST = 1.5
+UNSEEN_PENALTY = 0.75
+
+
+def load_stats(path: str = STATS_PATH) -> Dict[str, Dict[str, int]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_stats(stats: Dict[str, Dict[str, int]], path: str = STATS_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def hit_rate(stats: Dict[str, Dict[str, int]], retailer: str) -> float:
+    """Laplace-smoothed share of past queries on this retailer that found the product."""
+    entry = stats.get(retailer, {})
+    return (entry.get("hits", 0) + 1) / (entry.get("queries", 0) + 2)
+
+
+def _age_days(row: Dict[str, Any], now: datetime) -> Optional[float]:
+    stamp = row.get("updated_at") or row.get("created_at")
+    if not stamp:
+        return None
+    try:
+        seen = datetime.fromisoformat(str(stamp).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if seen.tzinfo is None:
+        seen = seen.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - seen).total_seconds() / 86400)
+
+
+def lookup_value(row: Optional[Dict[str, Any]], now: datetime) -> float:
+    """
+    How much coverage a successful lookup adds: a brand-new row is worth most, a row
+    without price less, and a complete row only as much as it has gone stale.
+    """
+    if row is None:
+        return VALUE_NO_ROW
+    if row.get("price") is None:
+        return VALUE_NO_PRICE
+    age = _age_days(row, now)
+    if age is None:
+        return VALUE_REFRESH_MAX
+    return VALUE_REFRESH_MAX * min(1.0, age / STALE_AFTER_DAYS)
+
+
+def plan_lookups(pairs: List[Tuple[str, str]], competitors: List[Tuple[str, str]], existing: List[Dict[str, Any]], stats: Dict[str, Dict[str, int]], budget: Optional[int], queries_per_lookup: int = 1) -> Dict[str, Any]:
+    """
+    Scores every pending (pair, competitor) lookup by expected coverage gained and
+    returns the highest-value lookups that fit in `budget` queries.
+    """
+    now = datetime.now(timezone.utc)
+    rows: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    matched_before = set()
+    for r in existing:
+        sku = canonical_sku(r.get("competitor_sku"))
+        rows[(sku, str(r.get("country") or "").lower(), str(r.get("retailer_name") or "").lower())] = r
+        if r.get("product_page_url"):
+            matched_before.add(sku)
+
+    candidates = []
+    for brand, sku in competitors:
+        csku = canonical_sku(sku)
+        seen_elsewhere = csku in matched_before
+        for country, retailer in pairs:
+            value = lookup_value(rows.get((csku, country, retailer)), now)
+            if value <= 0:
+                continue
+            p_hit = hit_rate(stats, retailer) * (SEEN_ELSEWHERE_BOOST if seen_elsewhere else UNSEEN_PENALTY)
+            p_hit = min(0.99, max(0.01, p_hit))
+            expected = p_hit * value
+            candidates.append({
+                "pair": (country, retailer),
+                "brand": brand,
+                "sku": sku,
+                "p_hit": round(p_hit, 4),
+                "value": round(value, 4),
+                "expected_gain": expected,
+                "queries": queries_per_lookup
+            })
+
+    candidates.sort(key=lambda c: c["expected_gain"] / c["queries"], reverse=True)
+    plan, spent = [], 0
+    for c in candidates:
+        if budget is not None and spent + c["queries"] > budget:
+            break
+        plan.append(c)
+        spent += c["queries"]
+
+    expected_total = sum(c["expected_gain"] for c in plan)
+    return {
+        "plan": plan,
+        "pending": len(candidates),
+        "queries_planned": spent,
+        "expected_coverage": expected_total,
+        "expected_coverage_per_query": expected_total / spent if spent else 0.0
+    }
+
+
+class QueryLedger:
+    """
+    Accounts for every query spent: appends one JSONL line per lookup and folds the
+    outcome into the per-retailer hit-rate stats used by the next plan.
+    """
+    def __init__(self, ledger_path: str = LEDGER_PATH, stats_path: str = STATS_PATH):
+        self.ledger_path = ledger_path
+        self.stats_path = stats_path
+        self.stats = load_stats(stats_path)
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, country: str, retailer: str, brand: str, sku: str, queries: int, hit: bool, expected_gain: Optional[float] = None):
+        entry = {
+            "ts": datetime.utcnow().isoformat(),
+            "country": country,
+            "retailer": retailer,
+            "brand": brand,
+            "sku": sku,
+            "queries": queries,
+            "hit": hit,
+            "expected_gain": expected_gain
+        }
+        with self._lock:
+            self.entries.append(entry)
+            stats = self.stats.setdefault(retailer, {"queries": 0, "hits": 0})
+            stats["queries"] += 1
+            stats["hits"] += int(hit)
+
+    def flush(self):
+        with self._lock:
+            if self.entries:
+                with open(self.ledger_path, 'a') as f:
+                    for entry in self.entries:
+                        f.write(json.dumps(entry) + "\n")
+            save_stats(self.stats, self.stats_path)
+            self.entries = []
+
+    def summary(self) -> Dict[str, Any]:
+        queries = sum(e["queries"] for e in self.entries)
+        hits = sum(1 for e in self.entries if e["hit"])
+        expected = sum(e["expected_gain"] or 0.0 for e in self.entries)
+        return {
+            "queries": queries,
+            "hits": hits,
+            "expected_coverage": expected,
+            "realized_hits_per_query": hits / queries if queries else 0.0
+        }
+
+
+def print_plan(result: Dict[str, Any], limit: int = 20):
+    print(f"Pending lookups: {result['pending']}, planned: {len(result['plan'])} ({result['queries_planned']} queries)")
+    print(f"Expected coverage gained: {result['expected_coverage']:.2f} rows ({result['expected_coverage_per_query']:.3f} per query)")
+    for c in result["plan"][:limit]:
+        country, retailer = c["pair"]
+        print(f"  {c['expected_gain']:.3f}  {country}/{retailer}  {c['brand']} {c['sku']}  (p_hit {c['p_hit']:.2f}, value {c['value']:.2f})")
+    if len(result["plan"]) > limit:
+        print(f"  ... {len(result['plan']) - limit} more")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show per-retailer hit-rate history")
+    parser.parse_args()
+    stats = load_stats()
+    if not stats:
+        print("No query history yet.")
+    for retailer, entry in sorted(stats.items()):
+        print(f"{retailer}: {entry['hits']}/{entry['queries']} hits (smoothed rate {hit_rate(stats, retailer):.2f})")
@@ -0,0 +1,358 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from domain_matcher import get_matcher, DomainMatcher, CONFIG_PATH
+from serper_client import SearchQuota, QuotaExceeded, serper_post, search_payload, is_valid_product_page, is_out_of_stock
+from snapshot_diff import diff_rows, apply_delta, regional_key, summarize
+from query_budget import QueryLedger, plan_lookups, print_plan
+from pipeline_trace import span, count, start_run, finish_run
+from checkpoint_journal import Journal, item_key
+from db_outbox import get_outbox
+
+Pair = Tuple[str, str]
+
+COMBINED_NUM = 10
+
+
+def build_matrix(config: Dict[str, Any], countries: Optional[List[str]] = None, retailers: Optional[List[str]] = None) -> List[Pair]:
+    """
+    Every (country, whitelisted retailer) pair in retailer_config.json, optionally narrowed down.
+    """
+    wanted_countries = {c.lower() for c in countries} if countries else None
+    wanted_retailers = {r.lower() for r in retailers} if retailers else None
+    pairs = []
+    for country, lists in config.items():
+        if wanted_countries and country.lower() not in wanted_countries:
+            continue
+        for retailer in lists.get("whitelist", []):
+            if wanted_retailers and retailer.lower() not in wanted_retailers:
+                continue
+            pairs.append((country.lower(), retailer.lower()))
+    return pairs
+
+
+class RetailerLimits:
+    """Caps in-flight lookups per retailer, independently of the global search quota."""
+    def __init__(self, per_retailer: int):
+        self.per_retailer = per_retailer
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.Semaphore] = {}
+
+    def get(self, retailer: str) -> threading.Semaphore:
+        with self._lock:
+            return self._sems.setdefault(retailer, threading.Semaphore(self.per_retailer))
+
+
+def search_retailer(brand: str, sku: str, country: str, retailer: str, matcher: DomainMatcher, quota: SearchQuota) -> Optional[Dict[str, Any]]:
+    """
+    One `site:` query for a competitor SKU on one retailer. Returns the observed product page or None.
+    """
+    data = serper_post('/search', search_payload(f'site:{retailer} {brand} {sku}', country, num=5), quota)
+    for item in data.get('organic', []):
+        link = item.get('link', '')
+        title = item.get('title', '')
+        if matcher.retailer_for(link, country) != retailer:
+            continue
+        if not is_valid_product_page(title, sku, brand):
+            continue
+        return {
+            "product_page_url": link.split('?')[0],
+            "available": not is_out_of_stock(title, item.get('snippet', ''))
+        }
+    return None
+
+
+def compose_or_query(retailers: List[str], brand: str, sku: str) -> str:
+    """`(site:a OR site:b OR site:c) brand sku`"""
+    sites = " OR ".join(f"site:{r}" for r in retailers)
+    return f"({sites}) {brand} {sku}"
+
+
+def search_retailers_combined(brand: str, sku: str, country: str, retailers: List[str], matcher: DomainMatcher, quota: SearchQuota, limits: Optional[RetailerLimits] = None) -> Tuple[Dict[str, Optional[Dict[str, Any]]], int]:
+    """
+    One OR-query across several retailers of a country, demultiplexed by result domain.
+    Every retailer with no result at all in the combined page (the OR-query may silently drop
+    a site) gets its own `site:` query; a retailer whose results were all rejected is a miss.
+    With `limits`, the OR-query runs under the country's slot and each fallback under its retailer's.
+    Returns ({retailer: observed-or-None}, queries spent). If the quota runs out during the
+    fallbacks, the retailers not searched yet are left out, so what was already paid for is kept.
+    """
+    found: Dict[str, Optional[Dict[str, Any]]] = {}
+    hit: Set[str] = set()
+    queries = 0
+    if len(retailers) > 1:
+        with (limits.get(f"combined:{country}") if limits else nullcontext()):
+            data = serper_post('/search', search_payload(compose_or_query(retailers, brand, sku), country, num=COMBINED_NUM), quota)
+        queries += 1
+        wanted = set(retailers)
+        for item in data.get('organic', []):
+            link = item.get('link', '')
+            title = item.get('title', '')
+            retailer = matcher.retailer_for(link, country)
+            if retailer not in wanted:
+                continue
+            hit.add(retailer)
+            if retailer in found or not is_valid_product_page(title, sku, brand):
+                continue
+            found[retailer] = {
+                "product_page_url": link.split('?')[0],
+                "available": not is_out_of_stock(title, item.get('snippet', ''))
+            }
+
+    for retailer in retailers:
+        if retailer in found:
+            continue
+        if retailer in hit:
+            found[retailer] = None
+            continue
+        try:
+            with (limits.get(retailer) if limits else nullcontext()):
+                found[retailer] = search_retailer(brand, sku, country, retailer, matcher, quota)
+        except QuotaExceeded:
+            break
+        queries += 1
+    return found, queries
+
+
+def unique_competitors(items: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    return sorted({(i['competitor_brand'], i['competitor_sku']) for i in items if i.get('competitor_sku')})
+
+
+def run_matrix(pairs: List[Pair], items: List[Dict[str, Any]], matcher: DomainMatcher, quota: SearchQuota, per_retailer: int = 2, workers: int = 16, plan: Optional[List[Dict[str, Any]]] = None, ledger: Optional[QueryLedger] = None, combine: int = 0, journal: Optional[Journal] = None) -> Dict[Pair, Dict[Tuple[str, str], Optional[Dict[str, Any]]]]:
+    """
+    Fans every (pair, competitor) lookup out over one thread pool.
+    With a budget `plan` (see query_budget), only the planned lookups run, highest expected gain first.
+    With `combine` > 1, up to that many retailers of one country share a single OR-query per competitor.
+    With a `journal`, every finished lookup is checkpointed and lookups already done in it are not searched again.
+    Returns {pair: {(brand, competitor_sku): observed-or-None}}; lookups skipped for quota are absent.
+    """
+    limits = RetailerLimits(per_retailer)
+    results: Dict[Pair, Dict[Tuple[str, str], Optional[Dict[str, Any]]]] = {pair: {} for pair in pairs}
+    exhausted = threading.Event()
+
+    def work(pair: Pair, brand: str, sku: str):
+        if exhausted.is_set():
+            return pair, (brand, sku), None, False
+        country, retailer = pair
+        with limits.get(retailer):
+            try:
+                observed = search_retailer(brand, sku, country, retailer, matcher, quota)
+                if journal is not None:
+                    journal.done(item_key(country, retailer, brand, sku), observed)
+                if ledger is not None:
+                    ledger.record(country, retailer, brand, sku, 1, observed is not None, expected.get((pair, brand, sku)))
+                return pair, (brand, sku), observed, True
+            except QuotaExceeded:
+                exhausted.set()
+            except Exception as e:
+                print(f"[{country}/{retailer}] Error searching {brand} {sku}: {e}")
+                if journal is not None:
+                    journal.failed(item_key(country, retailer, brand, sku), str(e))
+        return pair, (brand, sku), None, False
+
+    def work_combined(country: str, brand: str, sku: str, retailers: List[str]):
+        if exhausted.is_set():
+            return []
+        try:
+            found, queries = search_retailers_combined(brand, sku, country, retailers, matcher, quota, limits)
+        except QuotaExceeded:
+            exhausted.set()
+            return []
+        except Exception as e:
+            print(f"[{country}] Error searching {brand} {sku}: {e}")
+            if journal is not None:
+                for retailer in retailers:
+                    journal.failed(item_key(country, retailer, brand, sku), str(e))
+            return []
+        if len(found) < len(retailers):
+            # Quota ran out mid-fallback; the unsearched retailers stay pending for --resume
+            exhausted.set()
+        if journal is not None:
+            for retailer, observed in found.items():
+                journal.done(item_key(country, retailer, brand, sku), observed)
+        if ledger is not None:
+            for retailer, observed in found.items():
+                ledger.record(country, retailer, brand, sku, queries / len(found), observed is not None, expected.get(((country, retailer), brand, sku)))
+        return [((country, retailer), (brand, sku), observed, True) for retailer, observed in found.items()]
+
+    if plan is not None:
+        tasks = [(c["pair"], c["brand"], c["sku"]) for c in plan]
+    else:
+        # Interleave pairs so every market makes progress even if the quota runs out mid-run
+        tasks = [(pair, brand, sku) for brand, sku in unique_competitors(items) for pair in pairs]
+    expected = {(c["pair"], c["brand"], c["sku"]): c["expected_gain"] for c in (plan or [])}
+
+    if journal is not None:
+        # Lookups finished before an interruption are answered from the journal
+        remaining = []
+        for pair, brand, sku in tasks:
+            key = item_key(pair[0], pair[1], brand, sku)
+            if journal.is_done(key):
+                results[pair][(brand, sku)] = journal.result(key)
+            else:
+                remaining.append((pair, brand, sku))
+        if len(remaining) < len(tasks):
+            print(f"Journal: {len(tasks) - len(remaining)} lookups already done, {len(remaining)} to go.")
+        tasks = remaining
+
+    if combine > 1:
+        # Group lookups for the same competitor in the same country, keeping plan order
+        groups: Dict[Tuple[str, str, str], List[str]] = {}
+        for (country, retailer), brand, sku in tasks:
+            groups.setdefault((country, brand, sku), []).append(retailer)
+        combined_tasks = []
+        for (country, brand, sku), retailers in groups.items():
+            for i in range(0, len(retailers), combine):
+                combined_tasks.append((country, brand, sku, retailers[i:i + combine]))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(work_combined, *task) for task in combined_tasks]
+            for future in as_completed(futures):
+                for pair, key, observed, done in future.result():
+                    results[pair][key] = observed
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(work, *task) for task in tasks]
+            for future in as_completed(futures):
+                pair, key, observed, done = future.result()
+                if done:
+                    results[pair][key] = observed
+
+    if exhausted.is_set():
+        print(f"Search quota exhausted after {quota.used} queries; remaining lookups were skipped.")
+    return results
+
+
+def persist_pair(client, category: str, pair: Pair, observed: Dict[Tuple[str, str], Optional[Dict[str, Any]]], items: List[Dict[str, Any]], existing: List[Dict[str, Any]]) -> int:
+    """
+    Expands found products to one regional row per mapped SKU and writes only the delta.
+    """
+    country, retailer = pair
+    table_name = f"{category.lower().replace('-', '_').replace(' ', '_')}_regional"
+    new_rows = []
+    for item in items:
+        found = observed.get((item['competitor_brand'], item['competitor_sku']))
+        if not found:
+            # Only create rows for products we actually found on the retailer
+            continue
+        new_rows.append({
+            "your_sku": item['your_sku'],
+            "competitor_brand": item['competitor_brand'],
+            "competitor_sku": item['competitor_sku'],
+            "country": country,
+            "retailer_name": retailer,
+            "available": found['available'],
+            "price": None,
+            "product_page_url": found['product_page_url']
+        })
+
+    row_key = lambda r: regional_key(r) + (r.get('your_sku'),)
+    old_rows = [r for r in existing if regional_key(r)[1:] == (country, retailer)]
+    delta = diff_rows(old_rows, new_rows, row_key, ("available", "product_page_url"))
+    print(f"[{country}/{retailer}] {len(new_rows)} rows found: {summarize(delta)}")
+    apply_delta(client, table_name, delta, mark_disappeared=False)
+
+    found_count = sum(1 for v in observed.values() if v)
+    get_outbox().upsert(client, 'discovery_status', {
+        "category": category,
+        "country": country,
+        "retailer": retailer,
+        "match_count": found_count
+    }, on_conflict='category,country,retailer')
+    return found_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regional discovery across every (country x retailer) pair in retailer_config.json")
+    parser.add_argument("--category", default="monitors", help="Table prefix, e.g. 'monitors' for monitors_comparison/monitors_regional")
+    parser.add_argument("--country", action="append", help="Limit to a country (repeatable)")
+    parser.add_argument("--retailer", action="append", help="Limit to a retailer domain (repeatable)")
+    parser.add_argument("--budget", type=int, help="Global Serper query budget; lookups are planned by expected coverage gain")
+    parser.add_argument("--plan-only", action="store_true", help="Print the budget plan without searching")
+    parser.add_argument("--qps", type=float, default=5.0, help="Global Serper queries per second")
+    parser.add_argument("--per-retailer", type=int, default=2, help="Concurrent lookups per retailer")
+    parser.add_argument("--workers", type=int, default=16, help="Total worker threads")
+    parser.add_argument("--combine", type=int, default=0, help="Combine up to N retailers of a country into one OR-query per competitor (0 = one query per retailer)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the work matrix without searching")
+    parser.add_argument("--resume", action="store_true", help="Continue the last interrupted run from its checkpoint journal")
+    args = parser.parse_args()
+
+    with open(CONFIG_PATH, 'r') as f:
+        pairs = build_matrix(json.load(f), args.country, args.retailer)
+    print(f"Work matrix: {len(pairs)} (country, retailer) pairs")
+    for country, retailer in pairs:
+        print(f"  - {country}: {retailer}")
+
+    if args.dry_run:
+        return
+
+    start_run("regional")
+    from supabase_ingest import get_supabase_client
+    client = get_supabase_client()
+    table_prefix = args.category.lower().replace('-', '_').replace(' ', '_')
+
+    # A plan-only run searches nothing, so it opens no journal run a later --resume could pick up
+    journal = None if args.plan_only else Journal(f"regional:{table_prefix}", resume=args.resume)
+    if journal is not None:
+        print(journal.describe())
+
+    items = journal.meta("items") if journal else None
+    existing = journal.meta("existing") if journal else None
+    if items is None or existing is None:
+        with span("db_read", table_prefix=table_prefix):
+            items = client.table(f"{table_prefix}_comparison").select('your_sku, competitor_brand, competitor_sku').execute().data
+            existing = client.table(f"{table_prefix}_regional").select('*').execute().data
+        if journal is not None:
+            # Snapshot the inputs so a resumed run doesn't have to re-read both tables
+            journal.set_meta("items", items)
+            journal.set_meta("existing", existing)
+    print(f"{len(items)} competitor mappings, {len(existing)} existing regional rows.")
+
+    ledger = QueryLedger()
+    plan = None
+    if args.budget is not None or args.plan_only:
+        planned = plan_lookups(pairs, unique_competitors(items), existing, ledger.stats, args.budget)
+        print_plan(planned)
+        plan = planned["plan"]
+        if args.plan_only:
+            finish_run()
+            return
+
+    started = time.monotonic()
+    quota = SearchQuota(max_queries=args.budget, per_second=args.qps)
+    with span("search_matrix", pairs=len(pairs), combine=args.combine):
+        results = run_matrix(pairs, items, get_matcher(), quota, per_retailer=args.per_retailer, workers=args.workers, plan=plan, ledger=ledger, combine=args.combine, journal=journal)
+    spent = ledger.summary()
+    ledger.flush()
+
+    total_found = 0
+    for pair in pairs:
+        with span("persist", country=pair[0], retailer=pair[1]):
+            total_found += persist_pair(client, args.category, pair, results[pair], items, existing)
+
+    print(f"\nRegional refresh complete in {time.monotonic() - started:.1f}s: {quota.used} queries, {total_found} products found across {len(pairs)} pairs.")
+    print(f"Query accounting: {spent['queries']} spent, {spent['hits']} hits ({spent['realized_hits_per_query']:.3f} per query), expected coverage {spent['expected_coverage']:.2f}")
+    count("lookup_hits", spent["hits"])
+    count("products_found", total_found)
+    failed = journal.counts().get("failed", 0)
+    if quota.remaining == 0 or failed:
+        # Lookups skipped for quota or failed stay pending for the next --resume
+        print(f"Run left unfinished in the journal ({failed} failed lookups); continue it with --resume.")
+    else:
+        journal.finish()
+    journal.close()
+    finish_run()
+
+
+if __name__ == "__main__":
+    main()
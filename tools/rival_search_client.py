@@ -1,47 +1,52 @@
 
 import os
-import requests
+import sys
 import json
 from typing import List, Dict, Any, Optional
 
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mcp_session import get_session, McpError
+
+GLOBAL_TOOL = os.environ.get("RIVALSEARCH_GLOBAL_TOOL", "search_global")
+LOCAL_TOOL = os.environ.get("RIVALSEARCH_LOCAL_TOOL", "search_local")
+
 class RivalSearchClient:
     """
     Client for the RivalSearchMCP Tool.
-    If running as a script, this connects to the MCP Server URL via HTTP (SSE/Post) or a direct API if available.
-    For now, we will implement a generic Search API wrapper.
+    Talks to the MCP server at RIVALSEARCH_URL over one pooled, long-lived session (see mcp_session).
+    Run `tools/mock_mcp_server.py` and point RIVALSEARCH_URL at it to work offline.
     """
     def __init__(self):
         # Configuration
         # RivalSearchMCP via FastMCP (No API Key required)
         self.mcp_url = os.environ.get("RIVALSEARCH_URL", "https://RivalSearchMCP.fastmcp.app/mcp")
         self.api_key = None # No key needed
+        self.timeout = float(os.environ.get("RIVALSEARCH_TIMEOUT", "30"))
+
+    def _session(self):
+        return get_session(self.mcp_url, timeout=self.timeout)
 
-    def search_global_model(self, brand: str, specs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def search_global_model(self, brand: str, category: str, specs: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Searches for global competitor models matching the brand and specs.
         """
-        query = f"{brand} {specs.get('category', '')} {self._format_specs(specs)}"
+        query = f"{brand} {category} {self._format_specs(specs)}"
         print(f"Searching for {brand} product matching: {query}")
         
-        # Real Implementation requires an MCP Client (e.g., mcp-python sdk) to talk to the SSE endpoint.
-        # For this prototype, we mock the *action* of the tool if we can't connect.
-        
         if "mock" in self.mcp_url:
-             return self._mock_global_search(brand, specs)
+             return self._mock_global_search(brand, category, specs)
 
         try:
-             # Placeholder for MCP Client connection
-             # with mcp.Client(self.mcp_url) as client:
-             #     result = client.call_tool("search_global", query=query)
-             #     return result
-             
-             # Fallback to Mock until MCP Client library is added to environment
-             print("Notice: 'mcp' library not found. Using Mock Data for RivalSearch.")
-             return self._mock_global_search(brand, specs)
-        except Exception as e:
-            print(f"RivalSearch API Error: {e}")
+            result = self._session().call_tool(GLOBAL_TOOL, {"query": query, "brand": brand, "category": category})
+            if isinstance(result, dict):
+                result = result.get("results") or result.get("candidates") or []
+            return [c for c in result if isinstance(c, dict) and "specs" in c] if isinstance(result, list) else []
+        except McpError as e:
+            print(f"RivalSearch API Error: {e}. Using Mock Data.")
             
-        return self._mock_global_search(brand, specs) # Fallback
+        return self._mock_global_search(brand, category, specs) # Fallback
 
     def search_local_price(self, brand: str, model: str, country: str) -> Optional[Dict[str, Any]]:
         """
@@ -50,7 +55,14 @@ class RivalSearchClient:
         query = f"{brand} {model} price {country}"
         print(f"Searching {country} price for: {query}")
         
-        # Real MCP Call would go here
+        if "mock" in self.mcp_url:
+            return self._mock_local_search(brand, model, country)
+
+        try:
+            result = self._session().call_tool(LOCAL_TOOL, {"query": query, "brand": brand, "model": model, "country": country})
+            return result if isinstance(result, dict) and result.get("url") else None
+        except McpError as e:
+            print(f"RivalSearch API Error: {e}. Using Mock Data.")
         return self._mock_local_search(brand, model, country)
 
     def _format_specs(self, specs: Dict[str, Any]) -> str:
@@ -58,11 +70,11 @@ class RivalSearchClient:
         relevant = [str(v) for k,v in specs.items() if "hz" in k or "inch" in k or "gpu" in k]
         return " ".join(relevant)
 
-    def _mock_global_search(self, brand: str, specs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _mock_global_search(self, brand: str, category: str, specs: Dict[str, Any]) -> List[Dict[str, Any]]:
         # ... (Keep existing mock logic for fallback) ...
         candidates = []
         # Monitor Mocks
-        if "monitor" in str(specs).lower():
+        if "monitor" in f"{category} {specs}".lower():
             if brand.lower() == "msi":
                 candidates.append({"brand": "MSI", "model": "Optix G271", "specs": {"panel_type": "IPS", "refresh_rate_hz": 144, "resolution_width": 1920}})
                 candidates.append({"brand": "MSI", "model": "G27C4", "specs": {"panel_type": "VA", "refresh_rate_hz": 165, "resolution_width": 1920}})
@@ -1,6 +1,10 @@
+import os
+import sys
 import requests
-import re
-import json
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from product_extractor import extract_all
 
 def test_scrape_nnet_json():
     url = "https://www.nnet.com.uy/monitor-gamer/"
@@ -15,46 +19,16 @@ def test_scrape_nnet_json():
         print(f"Failed. Status code: {response.status_code}")
         return
         
-    # Since the products aren't in standard HTML divs, they are likely loaded 
-    # via a JavaScript array or JSON object inside a <script> tag.
-    # Let's search the raw text for common JSON structures related to products.
-    
-    # 1. Attempt to find a variable assignment containing products
-    scripts = re.findall(r'<script.*?>(.*?)</script>', response.text, re.DOTALL | re.IGNORECASE)
-    
-    found_products = []
-    
-    for script in scripts:
-        if 'dataLayer' in script or 'products' in script.lower() or 'items' in script.lower():
-            # Try to extract anything that looks like a JSON array of objects with id, name, price
-            try:
-                # Very basic greedy regex to find array-like structures
-                arrays = re.findall(r'\[\s*\{.*?\}\s*\]', script, re.DOTALL)
-                for arr_str in arrays:
-                    try:
-                        data = json.loads(arr_str)
-                        if isinstance(data, list) and len(data) > 0 and 'name' in data[0].keys():
-                             found_products.extend(data)
-                    except json.JSONDecodeError:
-                        pass
-            except Exception:
-                pass
+    # Products are embedded as structured data (JSON-LD, microdata or a dataLayer
+    # ecommerce payload) rather than standard HTML divs. Pull them all in one pass.
+    found_products = extract_all(response.text)
 
     if found_products:
-         print(f"Successfully extracted {len(found_products)} products directly from JS payload!")
+         print(f"Successfully extracted {len(found_products)} products from structured data!")
          for p in found_products[:5]:
-             print(f"- {p.get('name', 'Unknown')}: {p.get('price', 'No Price')}")
+             print(f"- {p.get('name', 'Unknown')}: {p.get('price', 'No Price')} ({p.get('source')})")
     else:
-         print("Could not find structured JSON product data in scripts. Exploring raw text for 'var products = ' or similar.")
-         
-         # Fallback: look for specific Nnet / PrestaShop / Magento patterns
-         matches = re.findall(r'"name":"([^"]+)","id":"([^"]+)"', response.text)
-         if matches:
-             print(f"Found {len(matches)} products using raw regex.")
-             for name, pid in matches[:5]:
-                 print(f"- {name} (ID: {pid})")
-         else:
-             print("Raw regex failed to find standard e-commerce schema.")
+         print("Could not find structured product data (JSON-LD, microdata or dataLayer) on the page.")
 
 if __name__ == "__main__":
     test_scrape_nnet_json()
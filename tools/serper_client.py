@@ -0,0 +1,147 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+import http.client
+from typing import Dict, Any, Optional
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from http_cassette import get_cassette
+from pipeline_trace import span, count
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', 'webapp', '.env.local'))
+except ImportError:
+    pass
+
+SERPER_HOST = "google.serper.dev"
+SERPER_API_KEY = os.environ.get("SERPER_API_KEY")
+
+# Google country / language codes per retailer_config.json market
+COUNTRY_GL = {
+    "chile": "cl",
+    "brazil": "br",
+    "mexico": "mx",
+    "colombia": "co",
+    "argentina": "ar",
+    "peru": "pe",
+    "uruguay": "uy"
+}
+COUNTRY_HL = {"brazil": "pt-br"}
+
+GENERIC_TITLE_WORDS = ['productos', 'categorías', 'marcas', 'lista', 'resultados', 'inicio']
+OUT_OF_STOCK_MARKERS = ('agotado', 'sin stock', 'esgotado')
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class SearchQuota:
+    """
+    One global Serper budget shared by every worker thread: a hard cap on total queries
+    plus an optional queries-per-second ceiling.
+    """
+    def __init__(self, max_queries: Optional[int] = None, per_second: Optional[float] = None):
+        self.max_queries = max_queries
+        self.min_interval = 1.0 / per_second if per_second else 0.0
+        self.used = 0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def acquire(self):
+        with self._lock:
+            if self.max_queries is not None and self.used >= self.max_queries:
+                raise QuotaExceeded(f"Search quota of {self.max_queries} queries exhausted")
+            self.used += 1
+            now = time.monotonic()
+            wait = max(0.0, self._next_at - now)
+            self._next_at = max(now, self._next_at) + self.min_interval
+        if wait:
+            time.sleep(wait)
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return None if self.max_queries is None else self.max_queries - self.used
+
+
+_local = threading.local()
+
+
+def _connection() -> http.client.HTTPSConnection:
+    # Keep-alive connection per thread; http.client connections are not thread-safe
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = http.client.HTTPSConnection(SERPER_HOST, timeout=30)
+    return conn
+
+
+def serper_post(endpoint: str, payload: Dict[str, Any], quota: Optional[SearchQuota] = None) -> Dict[str, Any]:
+    """
+    POSTs to a Serper endpoint ('/search' or '/shopping') and returns the decoded JSON.
+    Counts against `quota` when given; raises QuotaExceeded when it is spent.
+    Goes through the 'serper' cassette, so HTTP_CASSETTE_MODE=replay runs without an API key.
+    """
+    if quota is not None:
+        quota.acquire()
+    body = json.dumps(payload, sort_keys=True)
+
+    def live() -> Dict[str, Any]:
+        if not SERPER_API_KEY:
+            raise RuntimeError("SERPER_API_KEY is not set")
+        headers = {'X-API-KEY': SERPER_API_KEY, 'Content-Type': 'application/json'}
+        for attempt in range(2):
+            conn = _connection()
+            try:
+                conn.request('POST', endpoint, body, headers)
+                response = conn.getresponse()
+                return {"status": response.status, "body": response.read().decode('utf-8'), "error": None}
+            except (http.client.HTTPException, ConnectionError, OSError):
+                # Stale keep-alive socket: reconnect once
+                conn.close()
+                _local.conn = None
+                if attempt:
+                    raise
+        return {"status": 0, "body": "{}", "error": None}
+
+    with span(endpoint.strip('/') or 'serper'):
+        entry = get_cassette("serper").call('POST', f"https://{SERPER_HOST}{endpoint}", body, live)
+    count("serper_queries", endpoint=endpoint)
+    return json.loads(entry["body"] or "{}")
+
+
+def search_payload(query: str, country: Optional[str] = None, num: Optional[int] = None) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {'q': query}
+    if country:
+        gl = COUNTRY_GL.get(country.lower())
+        if gl:
+            payload['gl'] = gl
+        payload['hl'] = COUNTRY_HL.get(country.lower(), 'es')
+    if num:
+        payload['num'] = num
+    return payload
+
+
+def is_valid_product_page(title: str, sku: str, brand: str) -> bool:
+    """
+    Rejects listing/category pages: the title must mention the brand or part of the SKU.
+    """
+    title = title.lower()
+    sku_words = set(word.lower() for word in str(sku).split())
+    title_words = set(re.findall(r'\b\w+\b', title))
+
+    if any(word in title for word in GENERIC_TITLE_WORDS):
+        if not sku_words.issubset(title_words):
+            return False
+
+    return bool(brand.lower() in title or sku_words.intersection(title_words))
+
+
+def is_out_of_stock(*texts: str) -> bool:
+    lowered = " ".join(t.lower() for t in texts if t)
+    return any(marker in lowered for marker in OUT_OF_STOCK_MARKERS)
@@ -0,0 +1,209 @@
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import urllib.request
+import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_crawler import ADAPTERS, RetailerAdapter, HostLimiter, USER_AGENT, fetch_html
+from catalog_store import SnapshotWriter
+
+STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".discovery_state")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def open_stream(url: str, limiter: HostLimiter, timeout: int = 30):
+    """
+    Opens a sitemap as a byte stream, transparently un-gzipping `.xml.gz` files.
+    """
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip'})
+    with limiter.slot(host):
+        response = urllib.request.urlopen(req, timeout=timeout)
+    if url.endswith('.gz') or response.headers.get('Content-Encoding') == 'gzip':
+        return gzip.GzipFile(fileobj=response)
+    return response
+
+
+def iter_sitemap(url: str, limiter: HostLimiter) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """
+    Streams (kind, loc, lastmod) entries from a sitemap or sitemap index, where kind is 'sitemap' or 'url'.
+    Elements are cleared as soon as they are read, so memory stays flat regardless of sitemap size.
+    """
+    stream = open_stream(url, limiter)
+    root = None
+    try:
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            kind = _local(elem.tag)
+            if kind not in ('url', 'sitemap'):
+                continue
+            loc, lastmod = None, None
+            for child in elem:
+                name = _local(child.tag)
+                if name == 'loc':
+                    loc = (child.text or '').strip()
+                elif name == 'lastmod':
+                    lastmod = (child.text or '').strip() or None
+            if loc:
+                yield kind, loc, lastmod
+            root.clear()
+    finally:
+        stream.close()
+
+
+def robots_sitemaps(base_url: str, limiter: HostLimiter) -> List[str]:
+    """
+    Reads `Sitemap:` lines from robots.txt as a fallback when an adapter lists no sitemaps.
+    """
+    robots = fetch_html(urllib.parse.urljoin(base_url, '/robots.txt'), limiter) or ''
+    return [line.split(':', 1)[1].strip() for line in robots.splitlines() if line.lower().startswith('sitemap:')]
+
+
+def load_state(retailer: str) -> Dict[str, Any]:
+    path = os.path.join(STATE_DIR, f"{retailer}.json")
+    if not os.path.exists(path):
+        return {"sitemaps": {}, "urls": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(retailer: str, state: Dict[str, Any]):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    path = os.path.join(STATE_DIR, f"{retailer}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def discover_changes(adapter: RetailerAdapter, limiter: HostLimiter, state: Dict[str, Any], full: bool = False) -> Tuple[List[Tuple[str, Optional[str]]], List[str], Dict[str, Any]]:
+    """
+    Walks the retailer's sitemaps and compares each product URL's lastmod with the previous run.
+    Child sitemaps whose own lastmod has not moved are skipped entirely and their URLs carried forward.
+    Returns (changed [(url, lastmod)], removed [url], new_state).
+    """
+    old_sitemaps = state.get("sitemaps", {})
+    old_urls = state.get("urls", {})
+    new_state = {"sitemaps": {}, "urls": {}}
+    changed: List[Tuple[str, Optional[str]]] = []
+
+    roots = adapter.sitemap_urls
+    if not roots:
+        base = next(iter(adapter.category_urls.values()), f"https://www.{adapter.name}/")
+        roots = robots_sitemaps(base, limiter)
+
+    pending = [(url, None) for url in roots]
+    while pending:
+        sitemap_url, parent_lastmod = pending.pop()
+        new_state["sitemaps"][sitemap_url] = parent_lastmod
+
+        if not full and parent_lastmod and old_sitemaps.get(sitemap_url) == parent_lastmod:
+            for url, entry in old_urls.items():
+                if entry[1] == sitemap_url:
+                    new_state["urls"][url] = entry
+            continue
+
+        try:
+            for kind, loc, lastmod in iter_sitemap(sitemap_url, limiter):
+                if kind == 'sitemap':
+                    pending.append((loc, lastmod))
+                    continue
+                if not adapter.product_link_re.search(loc):
+                    continue
+                previous = old_urls.get(loc)
+                new_state["urls"][loc] = [lastmod, sitemap_url]
+                if full or previous is None or (lastmod and previous[0] != lastmod):
+                    changed.append((loc, lastmod))
+        except Exception as e:
+            # Keep the previous view of this sitemap so a transient failure doesn't look like mass removal
+            print(f"[{adapter.name}] Sitemap error {sitemap_url}: {e}")
+            new_state["sitemaps"][sitemap_url] = old_sitemaps.get(sitemap_url)
+            for url, entry in old_urls.items():
+                if entry[1] == sitemap_url:
+                    new_state["urls"].setdefault(url, entry)
+
+    removed = [url for url in old_urls if url not in new_state["urls"]]
+    return changed, removed, new_state
+
+
+def keep_unfetched(state: Dict[str, Any], new_state: Dict[str, Any], failed: List[str]) -> Dict[str, Any]:
+    """
+    Rolls back the URLs whose page could not be fetched or parsed to their previous lastmod
+    (or forgets them if they were new), together with the lastmod of the sitemap listing them,
+    so the next run reports them as changed again instead of skipping them for good.
+    """
+    old_sitemaps = state.get("sitemaps", {})
+    old_urls = state.get("urls", {})
+    for url in failed:
+        entry = new_state["urls"].pop(url, None)
+        if url in old_urls:
+            new_state["urls"][url] = old_urls[url]
+        if entry and entry[1] in new_state["sitemaps"]:
+            new_state["sitemaps"][entry[1]] = old_sitemaps.get(entry[1])
+    return new_state
+
+
+def fetch_changed(adapter: RetailerAdapter, urls: List[str], limiter: HostLimiter, workers: int = 8) -> List[Dict[str, Any]]:
+    """
+    Fetches and parses only the product pages reported as new or changed.
+    """
+    def work(url):
+        html = fetch_html(url, limiter)
+        return adapter.parse_product(html, url) if html else None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [p for p in pool.map(work, urls) if p]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sitemap-driven incremental product discovery")
+    parser.add_argument("--retailer", required=True, choices=sorted(ADAPTERS), help="Retailer to scan")
+    parser.add_argument("--fetch", action="store_true", help="Fetch and parse the new/changed product pages")
+    parser.add_argument("--full", action="store_true", help="Ignore previous lastmod state and report every product URL")
+    parser.add_argument("--per-host", type=int, default=2, help="Max concurrent requests per host")
+    parser.add_argument("--delay", type=float, default=1.0, help="Min seconds between request starts per host")
+    args = parser.parse_args()
+
+    adapter = ADAPTERS[args.retailer]
+    limiter = HostLimiter(max_concurrent=args.per_host, min_interval=args.delay)
+
+    started = time.monotonic()
+    state = load_state(adapter.name)
+    changed, removed, new_state = discover_changes(adapter, limiter, state, full=args.full)
+    print(f"[{adapter.name}] {len(new_state['urls'])} product URLs in sitemaps: {len(changed)} new/changed, {len(removed)} removed")
+
+    # Discovery-only runs leave the state alone: nothing was fetched, so nothing is settled yet
+    if args.fetch:
+        urls = [url for url, _ in changed]
+        products = fetch_changed(adapter, urls, limiter, workers=max(1, args.per_host))
+        if changed:
+            meta = {"country": adapter.country, "crawled_at": datetime.utcnow().isoformat(), "removed": removed}
+            with SnapshotWriter(adapter.name, kind="delta", meta=meta) as writer:
+                writer.extend(products)
+            print(f"[{adapter.name}] Parsed {len(products)} changed products -> delta snapshot {writer.crawl_id}")
+        fetched = {p["url"] for p in products}
+        failed = [url for url in urls if url not in fetched]
+        if failed:
+            print(f"[{adapter.name}] {len(failed)} pages failed; they will be retried on the next run")
+        save_state(adapter.name, keep_unfetched(state, new_state, failed))
+    print(f"Discovery complete in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
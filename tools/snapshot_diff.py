@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import argparse
+from typing import Dict, Any, List, Optional, Callable, Iterable, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from catalog_store import canonical_sku, canonical_url, list_snapshots, SnapshotReader
+from db_outbox import get_outbox
+
+REGIONAL_FIELDS = ("available", "price", "product_page_url")
+CATALOG_FIELDS = ("title", "price", "currency", "available")
+CHUNK_SIZE = 500
+
+
+def regional_key(row: Dict[str, Any]) -> Tuple[Optional[str], str, str]:
+    """(competitor_sku, country, retailer) with case/punctuation differences folded away."""
+    return (
+        canonical_sku(row.get("competitor_sku")),
+        str(row.get("country") or "").lower().strip(),
+        str(row.get("retailer_name") or row.get("retailer") or "").lower().strip()
+    )
+
+
+def catalog_key(row: Dict[str, Any]) -> Optional[str]:
+    return canonical_url(row.get("url"))
+
+
+def _same(old_val: Any, new_val: Any) -> bool:
+    if isinstance(old_val, (int, float)) and isinstance(new_val, (int, float)) and not isinstance(old_val, bool):
+        return abs(float(old_val) - float(new_val)) < 0.005
+    return old_val == new_val
+
+
+def changed_fields(old: Dict[str, Any], new: Dict[str, Any], fields: Iterable[str], null_is_unknown: bool = True) -> Dict[str, Any]:
+    """
+    Fields whose value differs between `old` and `new`.
+    With `null_is_unknown`, a None in `new` means "not observed this run" and never overwrites a known value.
+    """
+    delta = {}
+    for field in fields:
+        if field not in new:
+            continue
+        new_val = new[field]
+        if new_val is None and null_is_unknown:
+            continue
+        if not _same(old.get(field), new_val):
+            delta[field] = new_val
+    return delta
+
+
+def diff_rows(old_rows: Iterable[Dict[str, Any]], new_rows: Iterable[Dict[str, Any]], key_fn: Callable[[Dict[str, Any]], Any], fields: Iterable[str], null_is_unknown: bool = True) -> Dict[str, List[Any]]:
+    """
+    Compares a new snapshot with the last known state.
+    Returns {"inserts": [new_row], "changes": [{"row": old_row, "changes": {...}}], "disappeared": [old_row]}.
+    Several old rows may share a key (e.g. one competitor mapped to several of our SKUs); each gets its own change.
+    """
+    fields = tuple(fields)
+    old_by_key: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in old_rows:
+        old_by_key.setdefault(key_fn(row), []).append(row)
+
+    inserts, changes = [], []
+    seen = set()
+    for new in new_rows:
+        key = key_fn(new)
+        if key in seen:
+            continue
+        seen.add(key)
+        olds = old_by_key.get(key)
+        if not olds:
+            inserts.append(new)
+            continue
+        for old in olds:
+            delta = changed_fields(old, new, fields, null_is_unknown)
+            if delta:
+                changes.append({"row": old, "changes": delta})
+
+    disappeared = [row for key, rows in old_by_key.items() if key not in seen for row in rows]
+    return {"inserts": inserts, "changes": changes, "disappeared": disappeared}
+
+
+def summarize(delta: Dict[str, List[Any]]) -> str:
+    return f"{len(delta['inserts'])} inserts, {len(delta['changes'])} changes, {len(delta['disappeared'])} disappeared"
+
+
+def apply_delta(client, table_name: str, delta: Dict[str, List[Any]], on_conflict: str = "your_sku,competitor_sku,country,retailer_name", mark_disappeared: bool = True) -> Dict[str, int]:
+    """
+    Writes only the delta: chunked upserts for inserts, one update per distinct change set
+    (filtered by id list), and availability=false for rows that disappeared.
+    Returns the rows written or queued per kind; undelivered writes stay in the outbox.
+    """
+    written = {"inserted": 0, "updated": 0, "disappeared": 0}
+    # Every write is queued on disk first, then the outbox replays it in order (merging upsert chunks)
+    outbox = get_outbox()
+
+    inserts = delta["inserts"]
+    for i in range(0, len(inserts), CHUNK_SIZE):
+        chunk = inserts[i:i + CHUNK_SIZE]
+        outbox.enqueue(table_name, "upsert", chunk, on_conflict=on_conflict)
+        written["inserted"] += len(chunk)
+
+    grouped: Dict[str, List[Any]] = {}
+    for change in delta["changes"]:
+        grouped.setdefault(json.dumps(change["changes"], sort_keys=True), []).append(change["row"]["id"])
+    for payload, ids in grouped.items():
+        for i in range(0, len(ids), CHUNK_SIZE):
+            outbox.enqueue(table_name, "update", json.loads(payload), filters=[("in_", "id", ids[i:i + CHUNK_SIZE])])
+        written["updated"] += len(ids)
+
+    if mark_disappeared:
+        ids = [row["id"] for row in delta["disappeared"] if row.get("available") is not False and row.get("id") is not None]
+        for i in range(0, len(ids), CHUNK_SIZE):
+            outbox.enqueue(table_name, "update", {"available": False}, filters=[("in_", "id", ids[i:i + CHUNK_SIZE])])
+        written["disappeared"] = len(ids)
+
+    pending = outbox.flush(client)
+    if pending:
+        print(f"{table_name}: {pending} write operations queued in the local outbox for replay")
+    for rejected in outbox.parked:
+        print(f"{table_name}: rejected by the database and parked as dead: {rejected}")
+    return written
+
+
+def diff_catalog_snapshots(retailer: str, old_crawl_id: Optional[str] = None, new_crawl_id: Optional[str] = None) -> Dict[str, List[Any]]:
+    """
+    Diffs two full catalog crawls of a retailer by canonical URL (defaults to the two most recent).
+    """
+    snapshots = list_snapshots(retailer)
+    new_crawl_id = new_crawl_id or (snapshots[-1] if snapshots else None)
+    if old_crawl_id is None:
+        older = [s for s in snapshots if s < (new_crawl_id or "")]
+        old_crawl_id = older[-1] if older else None
+    if not new_crawl_id:
+        raise FileNotFoundError(f"No snapshots for {retailer}")
+
+    with SnapshotReader(retailer, new_crawl_id) as new_reader:
+        if not old_crawl_id:
+            return diff_rows([], new_reader, catalog_key, CATALOG_FIELDS, null_is_unknown=False)
+        with SnapshotReader(retailer, old_crawl_id) as old_reader:
+            return diff_rows(old_reader, new_reader, catalog_key, CATALOG_FIELDS, null_is_unknown=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two catalog snapshots of a retailer")
+    parser.add_argument("--retailer", required=True)
+    parser.add_argument("--old", help="Older crawl id (default: the one before --new)")
+    parser.add_argument("--new", help="Newer crawl id (default: latest)")
+    parser.add_argument("--verbose", action="store_true", help="Print every changed row")
+    args = parser.parse_args()
+
+    delta = diff_catalog_snapshots(args.retailer, args.old, args.new)
+    print(f"[{args.retailer}] {summarize(delta)}")
+    if args.verbose:
+        for row in delta["inserts"]:
+            print(f"  + {row.get('title')} {row.get('price')} {row.get('url')}")
+        for change in delta["changes"]:
+            print(f"  ~ {change['row'].get('title')}: {change['changes']}")
+        for row in delta["disappeared"]:
+            print(f"  - {row.get('title')} {row.get('url')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import sys
+import math
+import time
+import heapq
+import argparse
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from spec_records import SpecRecord, SpecSchema, get_schema
+
+LEAF_SIZE = 16
+# The tolerance box is widened by this much in log space (a relative slack on the raw values) so
+# rounding in log() never prunes a candidate sitting exactly on the edge; check() decides those
+BOX_SLACK = 1e-9
+
+Point = Tuple[float, ...]
+Neighbor = Tuple[float, float, Any]
+
+
+def _log_point(nums: Tuple[Optional[float], ...]) -> Optional[Point]:
+    # Parity tolerance is relative (|t - c| / t), which is a near-constant window in log space
+    if any(v is None or v <= 0 for v in nums):
+        return None
+    return tuple(math.log(v) for v in nums)
+
+
+class _Leaf:
+    __slots__ = ("points", "records")
+
+    def __init__(self, points: List[Point], records: List[SpecRecord]):
+        self.points = points
+        self.records = records
+
+
+class _Split:
+    __slots__ = ("axis", "value", "left", "right")
+
+    def __init__(self, axis: int, value: float, left, right):
+        self.axis = axis
+        self.value = value
+        self.left = left
+        self.right = right
+
+
+def _build(items: List[Tuple[Point, SpecRecord]], depth: int, dims: int):
+    if len(items) <= LEAF_SIZE:
+        return _Leaf([p for p, _ in items], [r for _, r in items])
+    # Split on the widest axis at the median
+    axis = max(range(dims), key=lambda d: max(p[d] for p, _ in items) - min(p[d] for p, _ in items))
+    items.sort(key=lambda it: it[0][axis])
+    mid = len(items) // 2
+    return _Split(axis, items[mid][0][axis], _build(items[:mid], depth + 1, dims), _build(items[mid:], depth + 1, dims))
+
+
+class _Partition:
+    """Candidates sharing one combination of strict-gate codes: a KD-tree plus the ones it can't hold."""
+    __slots__ = ("key", "tree", "loose", "size")
+
+    def __init__(self, key: Tuple[int, ...], items: List[Tuple[Point, SpecRecord]], loose: List[SpecRecord], dims: int):
+        self.key = key
+        self.tree = _build(items, 0, dims) if items and dims else None
+        # Records missing a numeric spec (or with no numeric specs at all) are scanned linearly
+        self.loose = loose + ([r for _, r in items] if items and not dims else [])
+        self.size = len(items) + len(loose)
+
+
+class SpecIndex:
+    """
+    Per-category nearest-neighbor index over parsed spec records.
+    Candidates are partitioned by their strict-gate codes, so a query only visits gate-compatible
+    partitions. Inside each one a KD-tree over log-scaled, weighted numeric specs answers
+    "k closest competitors within tolerance": subtrees outside the tolerance box or farther than
+    the current k-th neighbor are pruned. Every returned neighbor passes SpecSchema.check and
+    carries its exact parity score next to the distance.
+    `weights` maps numeric spec -> weight (default 1); build_index reads them from the optional
+    rules key `numeric_weights`.
+    """
+    def __init__(self, schema: SpecSchema, records: List[SpecRecord], weights: Optional[Dict[str, float]] = None):
+        self.schema = schema
+        self.dims = len(schema.numeric_keys)
+        weights = weights or {}
+        self.weights = [float(weights.get(k, 1.0)) for k in schema.numeric_keys]
+        groups: Dict[Tuple[int, ...], Tuple[List[Tuple[Point, SpecRecord]], List[SpecRecord]]] = {}
+        for rec in records:
+            items, loose = groups.setdefault(rec.cats, ([], []))
+            point = _log_point(rec.nums)
+            if point is None:
+                loose.append(rec)
+            else:
+                items.append((tuple(w * x for w, x in zip(self.weights, point)), rec))
+        self.partitions = [_Partition(key, items, loose, self.dims) for key, (items, loose) in groups.items()]
+        self.size = len(records)
+        self.visited = 0
+
+    def _compatible(self, target: SpecRecord) -> List[_Partition]:
+        cats = target.cats
+        return [
+            p for p in self.partitions
+            if all(not t or not k or t == k for t, k in zip(cats, p.key))
+        ]
+
+    def knn(self, target: SpecRecord, k: int = 5) -> List[Neighbor]:
+        """
+        The k nearest candidates that pass parity, as [(distance, parity_score, ref)] nearest first.
+        Distance is the weighted Euclidean distance between log numeric specs, over the specs
+        the target has; specs it lacks (or has as 0) don't constrain the search, and a spec only
+        the target has counts as sitting at the edge of the tolerance window.
+        """
+        schema = self.schema
+        check = schema.check
+        tolerance = schema.tolerance
+        weights = self.weights
+
+        # Query point, per-axis activity and the tolerance box in index space
+        q: List[float] = []
+        active: List[bool] = []
+        lo: List[float] = []
+        hi: List[float] = []
+        for w, t in zip(weights, target.nums):
+            if t is None or t <= 0:
+                q.append(0.0)
+                active.append(False)
+                lo.append(-math.inf)
+                hi.append(math.inf)
+            else:
+                x = math.log(t)
+                q.append(w * x)
+                active.append(True)
+                lo.append(w * (x + math.log(1 - tolerance) - BOX_SLACK) if tolerance < 1 else -math.inf)
+                hi.append(w * (x + math.log(1 + tolerance) + BOX_SLACK))
+
+        # A spec the candidate lacks counts as a miss at the edge of the tolerance window
+        edge = [w * math.log(1 + tolerance) for w in weights]
+
+        heap: List[Tuple[float, int, float, Any]] = []
+        counter = 0
+
+        def consider(d2: float, rec: SpecRecord):
+            nonlocal counter
+            if len(heap) >= k and d2 >= -heap[0][0]:
+                return
+            ok, score, _ = check(target, rec)
+            if not ok:
+                return
+            counter += 1
+            entry = (-d2, counter, score, rec.ref)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heapreplace(heap, entry)
+
+        def search(node):
+            if isinstance(node, _Leaf):
+                self.visited += len(node.points)
+                for point, rec in zip(node.points, node.records):
+                    d2 = 0.0
+                    inside = True
+                    for d in range(self.dims):
+                        if active[d]:
+                            x = point[d]
+                            if x < lo[d] or x > hi[d]:
+                                inside = False
+                                break
+                            diff = x - q[d]
+                            d2 += diff * diff
+                    if inside:
+                        consider(d2, rec)
+                return
+            axis = node.axis
+            if not active[axis]:
+                search(node.left)
+                search(node.right)
+                return
+            diff = q[axis] - node.value
+            near, far = (node.left, node.right) if diff <= 0 else (node.right, node.left)
+            search(near)
+            # The far side must overlap the tolerance box and could hold something closer than the k-th
+            far_in_box = hi[axis] >= node.value if far is node.right else lo[axis] <= node.value
+            if far_in_box and (len(heap) < k or diff * diff < -heap[0][0]):
+                search(far)
+
+        for partition in self._compatible(target):
+            if partition.tree is not None:
+                search(partition.tree)
+            for rec in partition.loose:
+                self.visited += 1
+                d2 = 0.0
+                for d, t in enumerate(target.nums):
+                    if not active[d]:
+                        continue
+                    c = rec.nums[d]
+                    diff = weights[d] * (math.log(c) - math.log(t)) if c is not None and c > 0 else edge[d]
+                    d2 += diff * diff
+                consider(d2, rec)
+
+        return [(math.sqrt(-neg), score, ref) for neg, _, score, ref in sorted(heap, key=lambda e: (-e[0], e[1]))]
+
+
+def build_index(category: str, rules: Dict[str, Any], catalog: Iterable[Tuple[Any, Dict[str, Any]]]) -> SpecIndex:
+    """Parses (ref, specs) pairs with the category's schema and indexes them."""
+    schema = get_schema(category, rules)
+    records = [schema.parse(specs, ref) for ref, specs in catalog]
+    return SpecIndex(schema, records, rules.get("numeric_weights"))
+
+
+def brute_force_knn(schema: SpecSchema, target: SpecRecord, records: List[SpecRecord], k: int, weights: Optional[Dict[str, float]] = None) -> List[Neighbor]:
+    """Reference answer for SpecIndex.knn: check and measure every candidate."""
+    w = [float((weights or {}).get(key, 1.0)) for key in schema.numeric_keys]
+    out = []
+    for rec in records:
+        ok, score, _ = schema.check(target, rec)
+        if not ok:
+            continue
+        d2 = 0.0
+        for d, t in enumerate(target.nums):
+            if t is None or t <= 0:
+                continue
+            c = rec.nums[d]
+            diff = w[d] * (math.log(c) - math.log(t)) if c is not None and c > 0 else w[d] * math.log(1 + schema.tolerance)
+            d2 += diff * diff
+        out.append((math.sqrt(d2), score, rec.ref))
+    out.sort(key=lambda n: n[0])
+    return out[:k]
+
+
+if __name__ == "__main__":
+    from bench_matching import load_rules, SpecGenerator
+
+    parser = argparse.ArgumentParser(description="Benchmark the spec kNN index against a brute-force scan")
+    parser.add_argument("--category", action="append")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    all_rules = load_rules()
+    for category in args.category or list(all_rules):
+        rules = all_rules[category]
+        gen = SpecGenerator(category, rules, 7)
+        schema = SpecSchema(category, rules)
+        records = schema.parse_all(gen.specs() for _ in range(args.size))
+        targets = [schema.parse(gen.specs()) for _ in range(args.queries)]
+
+        t0 = time.perf_counter()
+        index = SpecIndex(schema, records)
+        build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        answers = [index.knn(t, args.k) for t in targets]
+        indexed = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        expected = [brute_force_knn(schema, t, records, args.k) for t in targets]
+        brute = time.perf_counter() - t0
+
+        agree = sum(1 for a, e in zip(answers, expected) if [round(n[0], 9) for n in a] == [round(n[0], 9) for n in e])
+        print(f"{category:<13} build {build:.2f}s  query {indexed / args.queries * 1000:.2f}ms vs scan {brute / args.queries * 1000:.1f}ms "
+              f"({brute / max(indexed, 1e-9):.0f}x)  visited {index.visited / args.queries / args.size:.1%}  "
+              f"partitions {len(index.partitions)}  agree {agree}/{args.queries}")
@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import array
+import hashlib
+import argparse
+import threading
+import tracemalloc
+from typing import Dict, Any, List, Optional, Tuple, Iterable, Union
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+MISSING = 0
+
+
+class SpecRecord:
+    """
+    One product's specs parsed once against a category schema.
+    `cats` holds the strict-gate values and `tiers` the structural tiers as small integer codes
+    (MISSING = 0 where check_parity would skip the value); `nums` holds the numeric specs as
+    floats (None where skipped). All three follow rules order.
+    """
+    __slots__ = ("cats", "tiers", "nums", "ref")
+
+    def __init__(self, cats: Tuple[int, ...], tiers: Tuple[int, ...], nums: Tuple[Optional[float], ...], ref: Any = None):
+        self.cats = cats
+        self.tiers = tiers
+        self.nums = nums
+        self.ref = ref
+
+    def __repr__(self):
+        return f"SpecRecord(cats={self.cats!r}, tiers={self.tiers!r}, nums={self.nums!r}, ref={self.ref!r})"
+
+
+def _norm_cat(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    norm = str(value).lower().strip()
+    return norm or None
+
+
+class Codebook:
+    """
+    Dictionary encoding of one categorical spec: normalized value -> code (1-based, 0 = missing).
+    Ordinal codebooks are fixed to the rules' tier list, so codes keep the tier ordering and
+    unknown values encode as missing; open codebooks (gates) assign the next code to new values.
+    """
+    def __init__(self, name: str, values: Optional[List[Any]] = None, ordinal: bool = False):
+        self.name = name
+        self.ordinal = ordinal
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for value in values or []:
+            norm = _norm_cat(value)
+            if norm is not None and norm not in self.codes:
+                self.values.append(norm)
+                self.codes[norm] = len(self.values)
+
+    def encode(self, value: Any) -> int:
+        norm = _norm_cat(value)
+        if norm is None:
+            return MISSING
+        code = self.codes.get(norm)
+        if code is not None:
+            return code
+        if self.ordinal:
+            return MISSING
+        with self._lock:
+            code = self.codes.get(norm)
+            if code is None:
+                self.values.append(norm)
+                code = self.codes[norm] = len(self.values)
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code - 1] if code else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "ordinal": self.ordinal, "values": self.values}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Codebook":
+        return cls(data["name"], data["values"], data["ordinal"])
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SpecSchema:
+    """
+    Field layout and codebooks of one category's records, taken from its category_rules.json entry.
+    Gates get open codebooks (seeded from structural_specs when the feature is also listed there);
+    every structural spec gets an ordinal codebook in rules order.
+    Tier checks are off unless the rules set `structural_tolerance`: a number of tier steps
+    allowed for every structural spec, or {spec: steps} for some of them.
+    """
+    def __init__(self, category: str, rules: Dict[str, Any]):
+        self.category = category
+        structural = rules.get("structural_specs", {})
+        self.gate_keys: List[str] = [f for f, strict in rules.get("gatekeeping", {}).items() if strict]
+        self.tier_keys: List[str] = list(structural)
+        self.numeric_keys: List[str] = list(rules.get("numeric_specs", []))
+        self.tolerance: float = rules.get("tolerance", 0.20)
+        self.gate_books = [Codebook(k, structural.get(k)) for k in self.gate_keys]
+        self.tier_books = [Codebook(k, structural[k], ordinal=True) for k in self.tier_keys]
+        self.tier_steps = self._tier_steps(rules.get("structural_tolerance"))
+
+    def _tier_steps(self, setting: Union[None, int, Dict[str, int]]) -> List[Optional[int]]:
+        if setting is None:
+            return [None] * len(self.tier_keys)
+        if isinstance(setting, dict):
+            return [setting.get(k) for k in self.tier_keys]
+        return [int(setting)] * len(self.tier_keys)
+
+    def parse(self, specs: Dict[str, Any], ref: Any = None) -> SpecRecord:
+        get = specs.get
+        return SpecRecord(
+            tuple(book.encode(get(book.name)) for book in self.gate_books),
+            tuple(book.encode(get(book.name)) for book in self.tier_books),
+            tuple(_to_float(get(k)) for k in self.numeric_keys),
+            ref
+        )
+
+    def decode(self, record: SpecRecord) -> Dict[str, Any]:
+        """Normalized spec dict back from a record (gate and tier values lowercased)."""
+        specs: Dict[str, Any] = {}
+        for book, code in zip(self.gate_books + self.tier_books, record.cats + record.tiers):
+            if code:
+                specs[book.name] = book.decode(code)
+        for key, value in zip(self.numeric_keys, record.nums):
+            if value is not None:
+                specs[key] = value
+        return specs
+
+    def parse_all(self, specs_list: Iterable[Dict[str, Any]]) -> List[SpecRecord]:
+        """Parses a catalog; each record's `ref` is its index in the input."""
+        parse = self.parse
+        return [parse(specs, i) for i, specs in enumerate(specs_list)]
+
+    def check(self, target: SpecRecord, candidate: SpecRecord) -> Tuple[bool, float, Optional[str]]:
+        """
+        check_parity on parsed records: same decision, score and fail_code (plus tier checks
+        when enabled), as integer and float comparisons only.
+        """
+        cats = candidate.cats
+        for i, t in enumerate(target.cats):
+            if t:
+                c = cats[i]
+                if c and c != t:
+                    return False, 0.0, self.gate_keys[i]
+
+        tiers = candidate.tiers
+        for i, steps in enumerate(self.tier_steps):
+            if steps is not None:
+                t = target.tiers[i]
+                c = tiers[i]
+                if t and c and abs(t - c) > steps:
+                    return False, 0.0, self.tier_keys[i]
+
+        tolerance = self.tolerance
+        accum = 0.0
+        valid = 0
+        c_nums = candidate.nums
+        for i, t in enumerate(target.nums):
+            if t is None or t == 0:
+                continue
+            c = c_nums[i]
+            if c is None:
+                continue
+            delta = abs(t - c) / t
+            if not delta <= tolerance:
+                return False, 0.0, self.numeric_keys[i]
+            accum += 1.0 - delta
+            valid += 1
+        return True, (accum / valid if valid > 0 else 0.5), None
+
+    def scan(self, target: SpecRecord, records: List[SpecRecord]) -> List[Tuple[Any, float]]:
+        """
+        Matches one target against a parsed catalog; returns [(record.ref, score)] of matches.
+        The gate and numeric positions the target actually constrains are resolved once up front.
+        """
+        gates = [(i, t) for i, t in enumerate(target.cats) if t]
+        tier_checks = [(i, target.tiers[i], steps) for i, steps in enumerate(self.tier_steps) if steps is not None and target.tiers[i]]
+        nums = [(i, t) for i, t in enumerate(target.nums) if t is not None and t != 0]
+        tolerance = self.tolerance
+        matches = []
+        for rec in records:
+            cats = rec.cats
+            for i, t in gates:
+                c = cats[i]
+                if c and c != t:
+                    break
+            else:
+                if tier_checks:
+                    tiers = rec.tiers
+                    if any(tiers[i] and abs(tiers[i] - t) > steps for i, t, steps in tier_checks):
+                        continue
+                values = rec.nums
+                accum = 0.0
+                valid = 0
+                for i, t in nums:
+                    c = values[i]
+                    if c is None:
+                        continue
+                    delta = abs(t - c) / t
+                    if not delta <= tolerance:
+                        break
+                    accum += 1.0 - delta
+                    valid += 1
+                else:
+                    matches.append((rec.ref, accum / valid if valid > 0 else 0.5))
+        return matches
+
+
+    def to_columns(self, records: List[SpecRecord]) -> Dict[str, array.array]:
+        """
+        Columnar form of a parsed catalog: one uint16 code array per gate/tier spec, and per
+        numeric spec one float64 value array plus a uint8 `<spec>:set` presence mask (a spec can
+        genuinely be NaN or inf, which must not read as missing), ready for vectorized evaluation.
+        """
+        columns: Dict[str, array.array] = {}
+        for i, key in enumerate(self.gate_keys):
+            columns[key] = array.array('H', (r.cats[i] for r in records))
+        for i, key in enumerate(self.tier_keys):
+            columns[key] = array.array('H', (r.tiers[i] for r in records))
+        nan = float("nan")
+        for i, key in enumerate(self.numeric_keys):
+            columns[key] = array.array('d', (nan if r.nums[i] is None else r.nums[i] for r in records))
+            columns[f"{key}:set"] = array.array('B', (r.nums[i] is not None for r in records))
+        return columns
+
+    def save_encoded(self, path: str, records: List[SpecRecord]):
+        """
+        Compact on-disk catalog: one JSON header line (codebooks, column layout, row count)
+        followed by the raw column arrays.
+        """
+        columns = self.to_columns(records)
+        header = {
+            "category": self.category,
+            "rows": len(records),
+            "gates": [b.to_dict() for b in self.gate_books],
+            "tiers": [b.to_dict() for b in self.tier_books],
+            "numeric": self.numeric_keys,
+            "columns": [[name, col.typecode] for name, col in columns.items()],
+            "refs": [r.ref for r in records]
+        }
+        with open(path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            for col in columns.values():
+                col.tofile(f)
+
+    def load_encoded(self, path: str) -> List[SpecRecord]:
+        """Reads a catalog written by save_encoded, remapping its codes onto this schema's codebooks."""
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            rows = header["rows"]
+            columns: Dict[str, array.array] = {}
+            for name, typecode in header["columns"]:
+                col = array.array(typecode)
+                col.fromfile(f, rows)
+                columns[name] = col
+
+        def remap(saved: List[Dict[str, Any]], books: List[Codebook]) -> List[List[int]]:
+            maps = []
+            for data, book in zip(saved, books):
+                maps.append([MISSING] + [book.encode(v) for v in data["values"]])
+            return maps
+
+        gate_maps = remap(header["gates"], self.gate_books)
+        tier_maps = remap(header["tiers"], self.tier_books)
+        gate_cols = [columns[k] for k in self.gate_keys]
+        tier_cols = [columns[k] for k in self.tier_keys]
+        num_cols = [columns[k] for k in self.numeric_keys]
+        # Catalogs saved before presence masks existed used NaN for missing
+        set_cols = [columns.get(f"{k}:set") for k in self.numeric_keys]
+        refs = header["refs"]
+        records = []
+        for row in range(rows):
+            nums = tuple(
+                (col[row] if present[row] else None) if present is not None else (None if col[row] != col[row] else col[row])
+                for col, present in zip(num_cols, set_cols)
+            )
+            records.append(SpecRecord(
+                tuple(m[col[row]] for m, col in zip(gate_maps, gate_cols)),
+                tuple(m[col[row]] for m, col in zip(tier_maps, tier_cols)),
+                nums,
+                refs[row]
+            ))
+        return records
+
+
+_schemas: Dict[Tuple[str, str], SpecSchema] = {}
+
+
+def get_schema(category: str, rules: Dict[str, Any]) -> SpecSchema:
+    """
+    Schema per (category, rules content), built on first use. Keyed by a hash of the rules
+    rather than the dict's id(), which a reloaded rules dict can reuse after the old one is freed.
+    """
+    digest = hashlib.sha1(json.dumps(rules, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    key = (category, digest)
+    schema = _schemas.get(key)
+    if schema is None:
+        schema = _schemas[key] = SpecSchema(category, rules)
+    return schema
+
+
+def measure_memory(specs_list: List[Dict[str, Any]], schema: SpecSchema) -> Dict[str, float]:
+    """Bytes per product held by the raw spec dicts versus the parsed records (tracemalloc)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    raw = [json.loads(json.dumps(s)) for s in specs_list]
+    raw_bytes = tracemalloc.get_traced_memory()[0] - before
+    before = tracemalloc.get_traced_memory()[0]
+    records = schema.parse_all(raw)
+    record_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    n = max(1, len(records))
+    return {"dict_bytes": raw_bytes / n, "record_bytes": record_bytes / n}
+
+
+if __name__ == "__main__":
+    from bench_matching import load_rules, SpecGenerator
+
+    parser = argparse.ArgumentParser(description="Compare spec dict vs parsed record memory per category")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--category", action="append")
+    args = parser.parse_args()
+
+    all_rules = load_rules()
+    for category in args.category or list(all_rules):
+        rules = all_rules[category]
+        gen = SpecGenerator(category, rules, 7)
+        specs = [gen.specs() for _ in range(args.size)]
+        mem = measure_memory(specs, SpecSchema(category, rules))
+        print(f"{category:<13} dict {mem['dict_bytes']:7.0f} B/product  record {mem['record_bytes']:6.0f} B/product  ({mem['dict_bytes'] / max(1.0, mem['record_bytes']):.1f}x smaller)")
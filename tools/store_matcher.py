@@ -0,0 +1,380 @@
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import bisect
+import argparse
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from spec_records import SpecRecord, SpecSchema, get_schema
+from catalog_store import SnapshotReader, list_snapshots, canonical_sku, canonical_url, STORE_DIR
+from product_extractor import parse_price
+from pipeline_trace import span, count, start_run, finish_run
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_PATH = os.path.join(ROOT_DIR, ".agent", "skills", "matching-hardware", "resources", "category_rules.json")
+
+MAX_PER_SKU = 2
+# README Phase 4: "If you find one excellent match, one is enough"
+EXCELLENT_SCORE = 0.97
+# Widens the pre-filter window so float rounding never drops a pair the exact check would keep
+WINDOW_SLACK = 1e-9
+
+Match = Tuple[float, int]
+
+# Retailer spec names (JSON-LD additionalProperty, normalized by _spec_name) -> category_rules keys.
+# Names equal to a rules key, or to a numeric key without its unit suffix, map without an entry here.
+SPEC_ALIASES = {
+    "tipo_de_panel": "panel_type", "panel": "panel_type", "tecnologia_de_panel": "panel_type",
+    "resolucion": "resolution", "resolucion_maxima": "resolution", "resolucion_nativa": "resolution",
+    "relacion_de_aspecto": "aspect_ratio", "formato": "aspect_ratio",
+    "tamano_de_pantalla": "size_inch", "tamano_pantalla": "size_inch", "tamano": "size_inch", "screen_size": "size_inch", "pulgadas": "size_inch",
+    "frecuencia_de_actualizacion": "refresh_rate_hz", "tasa_de_refresco": "refresh_rate_hz", "frecuencia": "refresh_rate_hz", "refresh_rate": "refresh_rate_hz",
+    "tiempo_de_respuesta": "response_time_ms", "response_time": "response_time_ms",
+    "curvatura": "screen_curvature", "curvature": "screen_curvature",
+    "sensor": "sensor_tier", "peso": "weight_g", "dpi": "dpi_max", "tasa_de_sondeo": "polling_rate_hz", "polling_rate": "polling_rate_hz",
+    "tipo_de_switch": "switch_type", "switches": "switch_type", "conectividad": "connection_type", "conexion": "connection_type",
+}
+UNIT_SUFFIXES = ("hz", "ms", "inch", "mm", "cm", "g", "kg", "db", "mhz", "gb", "rpm", "max")
+NUMBER_RE = re.compile(r'\d[\d\.,]*')
+
+
+def _category_key(value: Optional[str]) -> str:
+    """'Monitors', 'monitor ' and 'monitor' block together."""
+    key = (value or "").lower().strip().replace('-', '_').replace(' ', '_')
+    return key[:-1] if key.endswith('s') else key
+
+
+def _spec_name(name: str) -> str:
+    """'Tamaño de Pantalla' -> 'tamano_de_pantalla'."""
+    plain = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', plain.lower()).strip('_')
+
+
+def _number(value: Any) -> Any:
+    """'240 Hz' -> 240.0, '23,8"' -> 23.8; numbers and unparseable values pass through."""
+    if not isinstance(value, str):
+        return value
+    found = NUMBER_RE.search(value)
+    return parse_price(found.group(0)) if found else value
+
+
+def _specs_of(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    specs = row.get("specs")
+    if isinstance(specs, str):
+        try:
+            specs = json.loads(specs)
+        except ValueError:
+            return None
+    return specs if isinstance(specs, dict) else None
+
+
+def _fill(row: Dict[str, Any], update: Dict[str, Any], overwrite: bool) -> Dict[str, Any]:
+    merged = dict(row)
+    for key, value in update.items():
+        if value is None or value == {}:
+            continue
+        if overwrite or merged.get(key) in (None, {}):
+            merged[key] = value
+    return merged
+
+
+def catalog_rows(retailer: str, crawl_id: Optional[str] = None, store_dir: str = STORE_DIR) -> List[Dict[str, Any]]:
+    """
+    A retailer's catalog for the join. Listing crawls (catalog_crawler) give the full product set
+    but no SKU or specs; those come from the product pages in sitemap_discovery's delta segments.
+    Starts from the full crawl (latest unless `crawl_id`) and lays every delta over it by canonical
+    URL: deltas taken after the crawl win field by field and add or remove products, older ones only
+    fill in what the crawl lacks. Without a full crawl, the deltas alone make up the catalog.
+    """
+    fulls = list_snapshots(retailer, store_dir=store_dir)
+    full_id = crawl_id or (fulls[-1] if fulls else None)
+    catalog: Dict[str, Dict[str, Any]] = {}
+    if full_id:
+        with SnapshotReader(retailer, full_id, store_dir=store_dir) as reader:
+            for row in reader:
+                catalog[canonical_url(row.get("url")) or f"#{len(catalog)}"] = row
+    for delta_id in list_snapshots(retailer, kind="delta", store_dir=store_dir):
+        newer = full_id is None or delta_id > full_id
+        with SnapshotReader(retailer, delta_id, store_dir=store_dir) as reader:
+            if newer:
+                for url in reader.meta.get("removed") or []:
+                    catalog.pop(canonical_url(url), None)
+            for row in reader:
+                url = canonical_url(row.get("url"))
+                if url in catalog:
+                    catalog[url] = _fill(catalog[url], row, overwrite=newer)
+                elif url and newer:
+                    catalog[url] = row
+    return list(catalog.values())
+
+
+class _Block:
+    """Candidates sharing one combination of strict-gate codes, sorted by their first numeric spec."""
+    __slots__ = ("key", "keys", "sorted", "loose")
+
+    def __init__(self, key: Tuple[int, ...]):
+        self.key = key
+        self.keys: List[float] = []
+        self.sorted: List[SpecRecord] = []
+        self.loose: List[SpecRecord] = []
+
+
+def _compatible(target: Tuple[int, ...], candidate: Tuple[int, ...]) -> bool:
+    # Stricter than validate_parity, where a missing gate never blocks: a catalog row must
+    # state every gate the SKU states, or empty/unmapped specs would match everything
+    return all(not t or t == c for t, c in zip(target, candidate))
+
+
+def _shares_numeric(target: SpecRecord, candidate: SpecRecord) -> bool:
+    # Without one numeric spec in common the 0.5 "no comparison" score means nothing
+    return any(t is not None and t != 0 and c is not None for t, c in zip(target.nums, candidate.nums))
+
+
+class StoreJoin:
+    """
+    Bottom-up join of one retailer catalog against all of my SKUs in a category.
+    Both sides are parsed once into spec records and blocked by strict-gate codes, so only
+    gate-compatible (SKU block, candidate block) pairs are ever compared. Inside a block,
+    candidates are sorted by the first numeric spec and each SKU only scores the slice inside
+    its tolerance window (plus candidates missing that spec). The best `max_per_sku` matches
+    per SKU are kept in a bounded heap; a single match scoring `excellent` or more is enough.
+    Catalog spec names are mapped onto the rules keys first (see SPEC_ALIASES), a candidate must
+    carry every gate its SKU has, and it must share at least one numeric spec to be scored
+    (unless the category has no numeric specs, e.g. motherboard).
+    """
+    def __init__(self, category: str, rules: Dict[str, Any], max_per_sku: int = MAX_PER_SKU, excellent: Optional[float] = EXCELLENT_SCORE):
+        self.category = category
+        self.schema: SpecSchema = get_schema(category, rules)
+        self.max_per_sku = max_per_sku
+        self.excellent = excellent
+        self.candidates: List[Dict[str, Any]] = []
+        self.blocks: Dict[Tuple[int, ...], _Block] = {}
+        self.pairs_scored = 0
+        self.skipped = {"category": 0, "brand": 0, "no_sku": 0, "no_url": 0}
+        keys = self.schema.gate_keys + self.schema.tier_keys + self.schema.numeric_keys
+        self._names: Dict[str, str] = {alias: key for alias, key in SPEC_ALIASES.items() if key in keys}
+        for key in self.schema.numeric_keys:
+            stem, _, unit = key.rpartition('_')
+            if stem and unit in UNIT_SUFFIXES:
+                self._names.setdefault(stem, key)
+        self._names.update({key: key for key in keys})
+        self._numeric = set(self.schema.numeric_keys)
+
+    def map_specs(self, specs: Dict[str, Any]) -> Dict[str, Any]:
+        """Retailer spec names and values onto this category's rules keys; unknown specs are dropped."""
+        mapped: Dict[str, Any] = {}
+        for name, value in specs.items():
+            key = self._names.get(_spec_name(name))
+            if key is None or value in (None, ""):
+                continue
+            mapped.setdefault(key, _number(value) if key in self._numeric else value)
+        return mapped
+
+    def load_catalog(self, rows, brands: Optional[List[str]] = None) -> int:
+        """Parses and blocks the retailer rows of this category (optionally only some brands)."""
+        wanted = _category_key(self.category)
+        allowed = {b.lower().strip() for b in brands} if brands else None
+        staged: Dict[Tuple[int, ...], List[Tuple[Optional[float], SpecRecord]]] = {}
+        for row in rows:
+            if row.get("category") and _category_key(row["category"]) != wanted:
+                self.skipped["category"] += 1
+                continue
+            if allowed is not None and (row.get("brand") or "").lower().strip() not in allowed:
+                self.skipped["brand"] += 1
+                continue
+            if not canonical_sku(row.get("sku")):
+                # competitor_sku is part of both tables' conflict keys
+                self.skipped["no_sku"] += 1
+                continue
+            if not row.get("url"):
+                # Regional rows without a product page are never written
+                self.skipped["no_url"] += 1
+                continue
+            record = self.schema.parse(self.map_specs(_specs_of(row) or {}), len(self.candidates))
+            self.candidates.append(row)
+            first = record.nums[0] if record.nums else None
+            staged.setdefault(record.cats, []).append((first, record))
+
+        for key, items in staged.items():
+            block = self.blocks[key] = _Block(key)
+            ordered = sorted((it for it in items if it[0] is not None), key=lambda it: it[0])
+            block.keys = [k for k, _ in ordered]
+            block.sorted = [r for _, r in ordered]
+            block.loose = [r for k, r in items if k is None]
+        return len(self.candidates)
+
+    def _window(self, block: _Block, t: Optional[float]) -> List[SpecRecord]:
+        if t is None or t == 0 or not block.keys:
+            return block.sorted + block.loose
+        # Same window as the numeric check: |t - c| / t <= tolerance
+        spread = abs(t) * self.schema.tolerance
+        lo = bisect.bisect_left(block.keys, t - spread - WINDOW_SLACK * abs(t))
+        hi = bisect.bisect_right(block.keys, t + spread + WINDOW_SLACK * abs(t))
+        return block.sorted[lo:hi] + block.loose
+
+    def match(self, my_products: List[Dict[str, Any]]) -> Dict[str, List[Match]]:
+        """
+        {my sku: [(score, candidate index)] best first} for every SKU with specs.
+        """
+        schema = self.schema
+        check = schema.check
+        needs_numeric = bool(schema.numeric_keys)
+        targets: Dict[Tuple[int, ...], List[Tuple[str, SpecRecord]]] = {}
+        for product in my_products:
+            specs = _specs_of(product)
+            if product.get("sku") and specs is not None:
+                record = schema.parse(specs)
+                targets.setdefault(record.cats, []).append((product["sku"], record))
+
+        best: Dict[str, List[Match]] = {}
+        for target_key, group in targets.items():
+            blocks = [b for key, b in self.blocks.items() if _compatible(target_key, key)]
+            for sku, target in group:
+                heap: List[Tuple[float, int, int]] = []
+                first = target.nums[0] if target.nums else None
+                for block in blocks:
+                    window = self._window(block, first)
+                    self.pairs_scored += len(window)
+                    for candidate in window:
+                        ok, score, _ = check(target, candidate)
+                        if not ok or (needs_numeric and not _shares_numeric(target, candidate)):
+                            continue
+                        # Ties go to the earlier catalog row
+                        entry = (score, -candidate.ref, candidate.ref)
+                        if len(heap) < self.max_per_sku:
+                            heapq.heappush(heap, entry)
+                        elif entry > heap[0]:
+                            heapq.heapreplace(heap, entry)
+                ranked = [(score, ref) for score, _, ref in sorted(heap, reverse=True)]
+                if ranked and self.excellent is not None and ranked[0][0] >= self.excellent:
+                    ranked = ranked[:1]
+                best[sku] = ranked
+        return best
+
+    def rows(self, best: Dict[str, List[Match]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Rows for [category]_comparison and [category]_regional, shaped like supabase_ingest's payloads."""
+        comparison = []
+        regional = []
+        for sku, matches in best.items():
+            for score, ref in matches:
+                row = self.candidates[ref]
+                specs = _specs_of(row) or {}
+                comparison.append({
+                    "your_sku": sku,
+                    "competitor_brand": row.get("brand"),
+                    "competitor_sku": row["sku"],
+                    "competitor_url": row["url"],
+                    "competitor_specs": "; ".join(f"{k}: {v}" for k, v in specs.items()) or row.get("title")
+                })
+                regional.append({
+                    "your_sku": sku,
+                    "competitor_sku": row["sku"],
+                    "competitor_brand": row.get("brand"),
+                    "country": row.get("country"),
+                    "available": row.get("available"),
+                    "price": row.get("price"),
+                    "retailer_name": row.get("retailer"),
+                    "product_page_url": row["url"]
+                })
+        return comparison, regional
+
+
+def load_my_products(client, category: str) -> List[Dict[str, Any]]:
+    """my_products rows of a category; rows without a specs object are dropped by StoreJoin.match."""
+    wanted = _category_key(category)
+    rows = client.table("my_products").select("*").execute().data
+    return [r for r in rows if _category_key(r.get("category")) == wanted]
+
+
+def push(client, table_prefix: str, comparison: List[Dict[str, Any]], regional: List[Dict[str, Any]]):
+    from snapshot_diff import apply_delta
+
+    for suffix, rows, on_conflict in (
+        ("comparison", comparison, "your_sku,competitor_sku"),
+        ("regional", regional, "your_sku,competitor_sku,country,retailer_name")
+    ):
+        written = apply_delta(client, f"{table_prefix}_{suffix}", {"inserts": rows, "changes": [], "disappeared": []}, on_conflict=on_conflict, mark_disappeared=False)
+        print(f"{table_prefix}_{suffix}: {written['inserted']} rows upserted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phase 4: match a retailer's catalog snapshot against my SKUs of one category")
+    parser.add_argument("--retailer", required=True, help="Retailer in the catalog store, e.g. winpy.cl")
+    parser.add_argument("--crawl-id", help="Full crawl to use (default: latest); delta segments are laid over it")
+    parser.add_argument("--category", required=True, help="Rules category, e.g. monitor")
+    parser.add_argument("--table-prefix", help="Table prefix (default: category + 's', e.g. monitors)")
+    parser.add_argument("--brands", help="Comma-separated competitor brands to consider (default: all)")
+    parser.add_argument("--my-products", help="JSON file with [{sku, specs}] instead of reading my_products")
+    parser.add_argument("--max-per-sku", type=int, default=MAX_PER_SKU)
+    parser.add_argument("--excellent", type=float, default=EXCELLENT_SCORE, help="Keep only the best match when it scores at least this")
+    parser.add_argument("--out", help="Write the comparison/regional rows to this JSON file")
+    parser.add_argument("--push", action="store_true", help="Upsert the rows into Supabase")
+    args = parser.parse_args()
+
+    with open(RULES_PATH, 'r') as f:
+        rules = json.load(f).get(args.category.lower())
+    if not rules:
+        print(f"Error: No rules found for category '{args.category}'")
+        sys.exit(1)
+    table_prefix = (args.table_prefix or _category_key(args.category) + "s").lower()
+
+    catalog = catalog_rows(args.retailer, args.crawl_id)
+    if not catalog:
+        print(f"No snapshots for {args.retailer}")
+        sys.exit(1)
+
+    start_run("store_match")
+    client = None
+    if args.my_products:
+        with open(args.my_products, 'r', encoding='utf-8') as f:
+            my_products = json.load(f)
+    else:
+        from supabase_ingest import get_supabase_client
+        client = get_supabase_client()
+        with span("db_read", table="my_products"):
+            my_products = load_my_products(client, args.category)
+
+    started = time.perf_counter()
+    join = StoreJoin(args.category, rules, args.max_per_sku, args.excellent)
+    brands = [b for b in args.brands.split(",") if b.strip()] if args.brands else None
+    with span("catalog_load", retailer=args.retailer):
+        loaded = join.load_catalog(catalog, brands)
+    with span("store_join", skus=len(my_products), candidates=loaded):
+        best = join.match(my_products)
+    comparison, regional = join.rows(best)
+    elapsed = time.perf_counter() - started
+    count("candidates_checked", join.pairs_scored, category=args.category)
+    count("matches", len(comparison), category=args.category)
+
+    matched = sum(1 for m in best.values() if m)
+    full = len(best) * loaded
+    print(f"{args.retailer}: {loaded} candidates ({', '.join(f'{v} {k}' for k, v in join.skipped.items() if v) or 'none'} skipped), "
+          f"{len(best)} SKUs, {len(join.blocks)} gate blocks")
+    print(f"Scored {join.pairs_scored} of {full} pairs ({join.pairs_scored / full:.1%}) in {elapsed:.2f}s; "
+          f"{matched} SKUs matched, {len(comparison)} rows" if full else "Nothing to join.")
+    for sku, matches in best.items():
+        for score, ref in matches:
+            row = join.candidates[ref]
+            print(f"  {sku} -> {row.get('brand')} {row['sku']} ({score:.3f})")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({"comparison": comparison, "regional": regional}, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+    if args.push:
+        if client is None:
+            from supabase_ingest import get_supabase_client
+            client = get_supabase_client()
+        push(client, table_prefix, comparison, regional)
+    finish_run()
+
+
+if __name__ == "__main__":
+    main()
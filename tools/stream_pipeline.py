@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_trace import span, count
+
+QUEUE_SIZE = 64
+BATCH_SIZE = 50
+MAX_WAIT = 2.0
+
+_DONE = object()
+
+
+def _traced(name: str, fn: Callable[[Any], Any], arg: Any) -> Any:
+    # Spans open and close on the thread doing the work, never across an await
+    with span("stream_stage", stage=name):
+        return fn(arg)
+
+
+class Stage:
+    """
+    One step of a streaming pipeline: `fn(item)` returns the (0..n) items passed downstream.
+    Blocking stages (network) run on `workers` threads; `inline` stages run on the event loop
+    itself, for quick CPU work that must stay on one thread (e.g. AdaptiveParity, the SQLite memo).
+    """
+    def __init__(self, name: str, fn: Callable[[Any], Optional[Iterable[Any]]], workers: int = 1, inline: bool = False):
+        if inline and workers != 1:
+            raise ValueError(f"Inline stage {name!r} can only have one worker")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.inline = inline
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+
+
+class Sink:
+    """Terminal stage: `write(batch)` gets up to `batch_size` items, or fewer after `max_wait` seconds."""
+    def __init__(self, name: str, write: Callable[[List[Any]], None], batch_size: int = BATCH_SIZE, max_wait: float = MAX_WAIT):
+        self.name = name
+        self.write = write
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.written = 0
+        self.errors = 0
+
+
+class StreamPipeline:
+    """
+    source -> stage -> ... -> sink, connected by bounded asyncio queues.
+    A full queue blocks the stage feeding it, so a slow database write throttles searching
+    instead of piling results up in memory, and the first batches are written while the
+    source is still being read. An exception in a stage or sink is reported and counted
+    against that item or batch; it doesn't stop the run.
+    """
+    def __init__(self, source: Iterable[Any], stages: List[Stage], sink: Sink, queue_size: int = QUEUE_SIZE):
+        self.source = source
+        self.stages = stages
+        self.sink = sink
+        self.queue_size = queue_size
+        self.high_water: List[int] = []
+
+    async def _put(self, queue: asyncio.Queue, index: int, item: Any):
+        await queue.put(item)
+        self.high_water[index] = max(self.high_water[index], queue.qsize())
+
+    async def _feed(self, queue: asyncio.Queue):
+        # The source may block (DB cursor, file reader), so it is advanced off the event loop
+        iterator = iter(self.source)
+        while True:
+            item = await asyncio.to_thread(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            await self._put(queue, 0, item)
+
+    async def _worker(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue, index: int):
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            try:
+                if stage.inline:
+                    out = _traced(stage.name, stage.fn, item)
+                else:
+                    out = await asyncio.to_thread(_traced, stage.name, stage.fn, item)
+            except Exception as e:
+                stage.errors += 1
+                print(f"[{stage.name}] error: {e}")
+                continue
+            stage.processed += 1
+            for result in out or ():
+                stage.emitted += 1
+                await self._put(outbox, index, result)
+
+    async def _flush(self, batch: List[Any]):
+        sink = self.sink
+        try:
+            await asyncio.to_thread(_traced, sink.name, sink.write, batch)
+            sink.batches += 1
+            sink.written += len(batch)
+        except Exception as e:
+            sink.errors += 1
+            print(f"[{sink.name}] error writing {len(batch)} items: {e}")
+
+    async def _drain(self, inbox: asyncio.Queue):
+        sink = self.sink
+        loop = asyncio.get_running_loop()
+        batch: List[Any] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(inbox.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._flush(batch)
+                batch, deadline = [], None
+                continue
+            if item is _DONE:
+                break
+            batch.append(item)
+            if deadline is None:
+                deadline = loop.time() + sink.max_wait
+            if len(batch) >= sink.batch_size:
+                await self._flush(batch)
+                batch, deadline = [], None
+        if batch:
+            await self._flush(batch)
+
+    def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        asyncio.run(self._run())
+        return self.summary(time.perf_counter() - started)
+
+    async def _run(self):
+        # Enough threads for every blocking worker plus the source and the sink, beyond asyncio's small default pool
+        threads = sum(s.workers for s in self.stages if not s.inline) + 2
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self.high_water = [0] * len(queues)
+        drain = asyncio.create_task(self._drain(queues[-1]))
+        stage_tasks = [
+            [asyncio.create_task(self._worker(stage, queues[i], queues[i + 1], i + 1)) for _ in range(stage.workers)]
+            for i, stage in enumerate(self.stages)
+        ]
+        await self._feed(queues[0])
+        # Shut down stage by stage: once every worker of a stage has exited, nothing more reaches the next queue
+        for i, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                await queues[i].put(_DONE)
+            await asyncio.gather(*stage_tasks[i])
+        await queues[-1].put(_DONE)
+        await drain
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        for stage in self.stages:
+            count("stream_items", stage.processed, stage=stage.name)
+        count("stream_items", self.sink.written, stage=self.sink.name)
+        return {
+            "seconds": round(elapsed, 3),
+            "stages": {s.name: {"processed": s.processed, "emitted": s.emitted, "errors": s.errors} for s in self.stages},
+            "sink": {"batches": self.sink.batches, "written": self.sink.written, "errors": self.sink.errors},
+            "queue_high_water": self.high_water
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated search -> validate -> write run, streamed vs sequential")
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--search-ms", type=float, default=40.0)
+    parser.add_argument("--write-ms", type=float, default=150.0, help="Per batch")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    def search(i):
+        time.sleep(args.search_ms / 1000)
+        return [(i, j) for j in range(3)]
+
+    def validate(pair):
+        return [pair] if sum(range(2000)) and pair[1] != 1 else []
+
+    first_write: List[float] = []
+
+    def write(batch):
+        time.sleep(args.write_ms / 1000)
+        first_write.append(time.perf_counter())
+
+    started = time.perf_counter()
+    pending = []
+    for i in range(args.items):
+        for pair in search(i):
+            pending.extend(validate(pair))
+    for i in range(0, len(pending), args.batch):
+        write(pending[i:i + args.batch])
+    sequential = time.perf_counter() - started
+    print(f"sequential: {sequential:.2f}s, first write after {first_write[0] - started:.2f}s")
+
+    first_write.clear()
+    started = time.perf_counter()
+    summary = StreamPipeline(
+        range(args.items),
+        [Stage("search", search, workers=args.workers), Stage("validate", validate, inline=True)],
+        Sink("write", write, batch_size=args.batch)
+    ).run()
+    print(f"streamed:   {summary['seconds']:.2f}s, first write after {first_write[0] - started:.2f}s "
+          f"({sequential / summary['seconds']:.1f}x), queue high water {summary['queue_high_water']}")
+    print(summary)
@@ -3,6 +3,8 @@ import argparse
 import sys
 from supabase import create_client, Client
 
+from db_outbox import get_outbox
+
 try:
     from dotenv import load_dotenv
     load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', 'webapp', '.env.local'))
@@ -20,22 +22,20 @@ def get_supabase_client() -> Client:
         sys.exit(1)
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-import time
+def retry_upsert(client: Client, table_name: str, payload: dict, on_conflict: str) -> bool:
+    """
+    Upserts through the local outbox: the row is saved on disk first, so an outage or a stale
+    schema cache (PGRST205, retried inline) leaves it queued for replay instead of losing it.
+    Returns True once delivered; raises OutboxRejected if the database refuses the row
+    (constraint violation, invalid input), which is parked as dead rather than retried.
+    """
+    return get_outbox().upsert(client, table_name, payload, on_conflict)
 
-def retry_upsert(client: Client, table_name: str, payload: dict, on_conflict: str, retries: int = 3):
-    last_err = None
-    for attempt in range(retries):
-        try:
-            res = client.table(table_name).upsert(payload, on_conflict=on_conflict).execute()
-            return res
-        except Exception as e:
-            last_err = e
-            # If the schema cache is stale (PGRST205), wait and retry
-            if 'PGRST205' in str(e) or 'Could not find the table' in str(e):
-                time.sleep(1.5)
-            else:
-                raise e
-    raise last_err
+def _report(delivered: bool, message: str):
+    if delivered:
+        print(f"Successfully {message}.")
+    else:
+        print(f"Queued in the local outbox (not delivered yet): {message}. Replay with 'python tools/db_outbox.py flush'.")
 
 def handle_upload_phase(sku: str, category: str, description: str):
     """
@@ -49,8 +49,8 @@ def handle_upload_phase(sku: str, category: str, description: str):
         "description": description
     }
     
-    res = retry_upsert(client, "my_products", payload, "sku")
-    print(f"Successfully uploaded {sku} to my_products (Table A).")
+    delivered = retry_upsert(client, "my_products", payload, "sku")
+    _report(delivered, f"uploaded {sku} to my_products (Table A)")
 
 def handle_matching_phase(your_sku: str, category: str, comp_brand: str, comp_sku: str, comp_url: str, comp_specs: str):
     """
@@ -67,8 +67,8 @@ def handle_matching_phase(your_sku: str, category: str, comp_brand: str, comp_sk
         "competitor_specs": comp_specs
     }
     
-    res = retry_upsert(client, table_b_name, payload, "your_sku,competitor_sku")
-    print(f"Successfully added match {comp_sku} for {your_sku} in {table_b_name} (Table B).")
+    delivered = retry_upsert(client, table_b_name, payload, "your_sku,competitor_sku")
+    _report(delivered, f"added match {comp_sku} for {your_sku} in {table_b_name} (Table B)")
 
 def handle_pricing_phase(your_sku: str, category: str, comp_brand: str, comp_sku: str, country: str, available: bool, price: float, retailer_name: str, product_page_url: str):
     """
@@ -88,8 +88,8 @@ def handle_pricing_phase(your_sku: str, category: str, comp_brand: str, comp_sku
         "product_page_url": product_page_url
     }
     
-    res = retry_upsert(client, table_c_name, payload, "your_sku,competitor_sku,country,retailer_name")
-    print(f"Successfully added price entry for {comp_sku} in {country} via {retailer_name} to {table_c_name} (Table C).")
+    delivered = retry_upsert(client, table_c_name, payload, "your_sku,competitor_sku,country,retailer_name")
+    _report(delivered, f"added price entry for {comp_sku} in {country} via {retailer_name} to {table_c_name} (Table C)")
 
 
 
@@ -0,0 +1,153 @@
+import os
+import sys
+import tempfile
+import threading
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_outbox import Outbox, OutboxRejected, is_permanent
+
+
+class APIError(Exception):
+    """Shaped like postgrest's APIError: the error dict is the message, `code` is its code."""
+    def __init__(self, error):
+        super().__init__(error)
+        self.code = error.get("code")
+
+
+class FakeClient:
+    """Records delivered writes; `fail(table, error, when)` makes matching writes raise."""
+    def __init__(self):
+        self.written = []
+        self.rules = []
+
+    def fail(self, table_name, error, when=lambda payload: True):
+        self.rules.append((table_name, error, when))
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+        self.payload = None
+
+    def upsert(self, rows, on_conflict=None):
+        self.payload = rows
+        return self
+
+    def update(self, values):
+        self.payload = values
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        for table_name, error, when in self.client.rules:
+            if table_name == self.table_name and when(self.payload):
+                raise error
+        self.client.written.append((self.table_name, self.payload))
+        return self
+
+
+def _outbox():
+    return Outbox(os.path.join(tempfile.mkdtemp(), "outbox.sqlite"))
+
+
+def test_classifies_errors():
+    assert is_permanent(APIError({"code": "23505", "message": "duplicate key value violates unique constraint"}))
+    assert is_permanent(APIError({"code": "22P02", "message": "invalid input syntax for type integer"}))
+    assert is_permanent(APIError({"code": "PGRST204", "message": "Could not find the 'x' column"}))
+    assert is_permanent(Exception("{'code': '23502', 'message': 'null value violates not-null constraint'}"))
+    assert not is_permanent(APIError({"code": "PGRST205", "message": "Could not find the table"}))
+    assert not is_permanent(APIError({"code": "PGRST003", "message": "Timed out acquiring connection"}))
+    assert not is_permanent(APIError({"code": "57014", "message": "canceling statement due to statement timeout"}))
+    assert not is_permanent(TimeoutError("timed out"))
+    assert not is_permanent(ConnectionError("connection reset"))
+
+
+def test_permanent_error_is_parked_and_raised_at_once():
+    outbox, client = _outbox(), FakeClient()
+    client.fail("my_products", APIError({"code": "23502", "message": "null value violates not-null constraint"}))
+    try:
+        outbox.upsert(client, "my_products", {"sku": None}, "sku")
+        raise AssertionError("a rejected write must raise")
+    except OutboxRejected as e:
+        assert e.table_name == "my_products"
+    assert outbox.pending() == 0 and outbox.dead() == 1
+    # The parked row doesn't hold back the next writer
+    assert outbox.upsert(client, "discovery_status", {"category": "monitors"}, "category")
+
+
+def test_bad_row_in_merged_batch_parks_only_its_op():
+    outbox, client = _outbox(), FakeClient()
+    client.fail("competitor_matches", APIError({"code": "23505", "message": "duplicate key"}),
+                when=lambda rows: any(row["id"] == "bad" for row in rows))
+    for row_id in ("a", "bad", "b"):
+        outbox.enqueue("competitor_matches", "upsert", [{"id": row_id}], on_conflict="id")
+    assert outbox.flush(client) == 0
+    assert [rejected.seq for rejected in outbox.parked] == [2]
+    assert sorted(row["id"] for _, rows in client.written for row in rows) == ["a", "b"]
+
+
+def test_only_rows_with_the_same_columns_are_merged():
+    outbox, client = _outbox(), FakeClient()
+    outbox.enqueue("monitors_regional", "upsert", [{"id": 1, "price": 10}], on_conflict="id")
+    outbox.enqueue("monitors_regional", "upsert", [{"id": 2, "price": 20}], on_conflict="id")
+    # No price: merged with the rows above, PostgREST would write price = NULL for id 3
+    outbox.enqueue("monitors_regional", "upsert", [{"id": 3, "available": False}], on_conflict="id")
+    assert outbox.flush(client) == 0
+    assert [sorted(row["id"] for row in rows) for _, rows in client.written] == [[1, 2], [3]]
+
+
+def test_enqueue_does_not_wait_for_a_slow_flush():
+    outbox, client = _outbox(), FakeClient()
+    sending, release = threading.Event(), threading.Event()
+
+    def slow(payload):
+        sending.set()
+        release.wait(5)
+        return False
+
+    client.fail("monitors_regional", None, when=slow)
+    outbox.enqueue("monitors_regional", "upsert", [{"id": 1}], on_conflict="id")
+    flusher = threading.Thread(target=outbox.flush, args=(client,))
+    flusher.start()
+    assert sending.wait(5)
+    # The flush is mid-request; queuing another write must not block on it
+    done = threading.Event()
+    threading.Thread(target=lambda: (outbox.enqueue("discovery_status", "upsert", [{"id": 1}], on_conflict="id"), done.set())).start()
+    assert done.wait(1)
+    release.set()
+    flusher.join(5)
+    assert outbox.flush(client) == 0
+    assert [table for table, _ in client.written] == ["monitors_regional", "discovery_status"]
+
+
+def test_backing_off_table_does_not_block_other_tables():
+    outbox, client = _outbox(), FakeClient()
+    client.fail("monitors_regional", ConnectionError("connection reset"))
+    assert not outbox.upsert(client, "monitors_regional", {"id": 1}, "id")
+    # Writes to the backing-off table queue behind it, in order; other tables are delivered
+    assert not outbox.update(client, "monitors_regional", {"available": False}, [("eq", "id", 1)])
+    assert outbox.upsert(client, "discovery_status", {"category": "monitors"}, "category")
+    assert [table for table, _ in client.written] == ["discovery_status"]
+    assert outbox.pending() == 2 and not outbox.parked
+
+    client.rules = []
+    assert outbox.flush(client, force=True) == 0
+    assert [table for table, _ in client.written][1:] == ["monitors_regional", "monitors_regional"]
+
+
+if __name__ == "__main__":
+    test_classifies_errors()
+    test_permanent_error_is_parked_and_raised_at_once()
+    test_bad_row_in_merged_batch_parks_only_its_op()
+    test_only_rows_with_the_same_columns_are_merged()
+    test_enqueue_does_not_wait_for_a_slow_flush()
+    test_backing_off_table_does_not_block_other_tables()
+    print("db_outbox replay: OK")
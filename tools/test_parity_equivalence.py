@@ -0,0 +1,79 @@
+import os
+import sys
+import itertools
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from validate_tech_parity import validate_parity, check_parity
+from parity_order import AdaptiveParity
+from spec_records import SpecSchema
+from parallel_match import scan_columns
+
+RULES = {
+    "gatekeeping": {"panel": True},
+    "numeric_specs": ["refresh_rate", "size"],
+    "tolerance": 0.20
+}
+
+# Values float() accepts that are not ordinary numbers, next to ordinary ones
+VALUES = [None, 0, 27, 27.5, -27, "27", "nan", "inf", "-inf", float("nan"), float("inf"), float("-inf")]
+
+
+def _same(a: float, b: float) -> bool:
+    return a == b or (a != a and b != b)
+
+
+def _cases():
+    for t_rate, c_rate in itertools.product(VALUES, repeat=2):
+        target = {"panel": "IPS", "refresh_rate": t_rate, "size": 27}
+        candidate = {"panel": "ips", "refresh_rate": c_rate, "size": 27}
+        yield target, candidate
+
+
+def test_fast_paths_match_validate_parity_on_nan_and_inf():
+    schema = SpecSchema("monitor", RULES)
+    adaptive = AdaptiveParity("monitor", RULES)
+    for target, candidate in _cases():
+        expected_match, expected_score, _ = validate_parity(target, candidate, RULES)
+        results = {
+            "check_parity": check_parity(target, candidate, RULES),
+            "AdaptiveParity": adaptive.check(target, candidate),
+            "SpecSchema.check": schema.check(schema.parse(target), schema.parse(candidate))
+        }
+        for name, (is_match, score, _) in results.items():
+            assert is_match == expected_match, (name, target, candidate)
+            assert _same(score, expected_score), (name, target, candidate, score, expected_score)
+
+
+def test_catalog_scans_match_validate_parity_on_nan_and_inf():
+    schema = SpecSchema("monitor", RULES)
+    candidates = [{"panel": "ips", "refresh_rate": c, "size": 27} for c in VALUES]
+    records = schema.parse_all(candidates)
+    columns = schema.to_columns(records)
+    layout = {
+        "rows": len(records),
+        "gate_keys": schema.gate_keys,
+        "tier_keys": schema.tier_keys,
+        "numeric_keys": schema.numeric_keys,
+        "tier_steps": schema.tier_steps,
+        "tolerance": schema.tolerance
+    }
+    for t_rate in VALUES:
+        target_specs = {"panel": "IPS", "refresh_rate": t_rate, "size": 27}
+        expected = []
+        for i, specs in enumerate(candidates):
+            is_match, score, _ = validate_parity(target_specs, specs, RULES)
+            if is_match:
+                expected.append((i, score))
+        target = schema.parse(target_specs)
+        for name, got in (("scan", schema.scan(target, records)),
+                          ("scan_columns", scan_columns(columns, layout, (target.cats, target.tiers, target.nums)))):
+            assert [i for i, _ in got] == [i for i, _ in expected], (name, t_rate)
+            assert all(_same(a, b) for (_, a), (_, b) in zip(got, expected)), (name, t_rate)
+
+
+if __name__ == "__main__":
+    test_fast_paths_match_validate_parity_on_nan_and_inf()
+    test_catalog_scans_match_validate_parity_on_nan_and_inf()
+    print("NaN/inf parity equivalence: OK")
@@ -0,0 +1,122 @@
+import os
+import sys
+import types
+import tempfile
+import functools
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import db_outbox
+import regional_scheduler
+from checkpoint_journal import Journal, list_runs
+from query_budget import QueryLedger
+from serper_client import SearchQuota
+from domain_matcher import get_matcher
+
+ITEMS = [{"your_sku": "MY-27", "competitor_brand": "LG", "competitor_sku": "27GP850"}]
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+
+    def __getattr__(self, name):
+        # select/upsert/update/eq/in_ all chain back to the same query
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return self
+
+
+class FakeClient:
+    def __init__(self):
+        self.tables = {"monitors_comparison": ITEMS, "monitors_regional": []}
+
+    def table(self, name):
+        return FakeQuery(self.tables.get(name, []))
+
+
+def fake_serper_post(endpoint, payload, quota=None):
+    if quota is not None:
+        quota.acquire()
+    return {"organic": [{"link": "https://www.winpy.cl/venta/lg-27gp850/", "title": "Monitor LG 27GP850 UltraGear", "snippet": ""}]}
+
+
+def _run_main(argv):
+    """Runs regional_scheduler.main() against temp state and fakes; returns the journal's runs."""
+    tmp = tempfile.mkdtemp()
+    journal_path = os.path.join(tmp, "journal.sqlite")
+    patched = {
+        "Journal": functools.partial(Journal, path=journal_path),
+        "QueryLedger": functools.partial(QueryLedger, os.path.join(tmp, "ledger.jsonl"), os.path.join(tmp, "stats.json")),
+        "serper_post": fake_serper_post
+    }
+    saved = {name: getattr(regional_scheduler, name) for name in patched}
+    saved_argv, saved_outbox = sys.argv, db_outbox._outbox
+    saved_ingest = sys.modules.get("supabase_ingest")
+    saved_trace = os.environ.get("PIPELINE_TRACE")
+    try:
+        for name, value in patched.items():
+            setattr(regional_scheduler, name, value)
+        db_outbox._outbox = db_outbox.Outbox(os.path.join(tmp, "outbox.sqlite"))
+        sys.modules["supabase_ingest"] = types.SimpleNamespace(get_supabase_client=FakeClient)
+        os.environ["PIPELINE_TRACE"] = "0"
+        sys.argv = ["regional_scheduler.py", "--country", "chile", "--retailer", "winpy.cl", "--qps", "0"] + argv
+        regional_scheduler.main()
+        assert db_outbox._outbox.pending() == 0
+    finally:
+        for name, value in saved.items():
+            setattr(regional_scheduler, name, value)
+        db_outbox._outbox.close()
+        db_outbox._outbox = saved_outbox
+        sys.argv = saved_argv
+        if saved_ingest is None:
+            sys.modules.pop("supabase_ingest", None)
+        else:
+            sys.modules["supabase_ingest"] = saved_ingest
+        if saved_trace is None:
+            os.environ.pop("PIPELINE_TRACE", None)
+        else:
+            os.environ["PIPELINE_TRACE"] = saved_trace
+    return list_runs(journal_path)
+
+
+def test_main_finishes_journal_without_budget():
+    runs = _run_main([])
+    assert len(runs) == 1 and runs[0]["finished_at"] is not None, runs
+
+
+def test_main_finishes_journal_with_budget_left():
+    runs = _run_main(["--budget", "5"])
+    assert len(runs) == 1 and runs[0]["finished_at"] is not None, runs
+
+
+def test_combined_query_result_survives_quota_running_out_in_fallback():
+    saved = regional_scheduler.serper_post
+    regional_scheduler.serper_post = fake_serper_post
+    try:
+        # The OR-query spends the whole budget; pcfactory.cl isn't in its results, so its fallback hits the quota
+        quota = SearchQuota(max_queries=1)
+        found, queries = regional_scheduler.search_retailers_combined(
+            "LG", "27GP850", "chile", ["winpy.cl", "pcfactory.cl"], get_matcher(), quota)
+        assert list(found) == ["winpy.cl"] and found["winpy.cl"] and queries == 1
+
+        pairs = [("chile", "winpy.cl"), ("chile", "pcfactory.cl")]
+        results = regional_scheduler.run_matrix(pairs, ITEMS, get_matcher(), SearchQuota(max_queries=1), combine=2)
+        assert results[("chile", "winpy.cl")][("LG", "27GP850")] is not None
+        assert ("LG", "27GP850") not in results[("chile", "pcfactory.cl")]
+    finally:
+        regional_scheduler.serper_post = saved
+
+
+def test_plan_only_leaves_no_run_to_resume():
+    assert _run_main(["--budget", "5", "--plan-only"]) == []
+
+
+if __name__ == "__main__":
+    test_main_finishes_journal_without_budget()
+    test_main_finishes_journal_with_budget_left()
+    test_combined_query_result_survives_quota_running_out_in_fallback()
+    test_plan_only_leaves_no_run_to_resume()
+    print("regional_scheduler main() end to end: OK")
@@ -0,0 +1,31 @@
+import os
+import sys
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from spec_records import SpecSchema
+from spec_index import SpecIndex, brute_force_knn
+
+RULES = {
+    "gatekeeping": {"panel": True},
+    "numeric_specs": ["refresh_rate", "size"],
+    "tolerance": 0.20
+}
+
+
+def test_knn_keeps_candidates_on_the_tolerance_edge():
+    schema = SpecSchema("monitor", RULES)
+    for t in range(5, 3000, 7):
+        # Integer and float specs exactly at t * (1 - tol) and t * (1 + tol), plus one just outside
+        edges = [t * 0.8, t * 1.2, round(t * 0.8), round(t * 1.2), t * 1.2 + 1]
+        records = [schema.parse({"panel": "IPS", "refresh_rate": c, "size": 27}, i) for i, c in enumerate(edges)]
+        target = schema.parse({"panel": "IPS", "refresh_rate": t, "size": 27})
+        got = SpecIndex(schema, records).knn(target, len(records))
+        expected = brute_force_knn(schema, target, records, len(records))
+        assert sorted(ref for _, _, ref in got) == sorted(ref for _, _, ref in expected), t
+
+
+if __name__ == "__main__":
+    test_knn_keeps_candidates_on_the_tolerance_edge()
+    print("spec_index tolerance edge: OK")
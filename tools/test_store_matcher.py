@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import catalog_crawler
+from catalog_crawler import ADAPTERS, HostLimiter, crawl_category, write_snapshot
+from catalog_store import SnapshotWriter
+from http_cassette import HttpResponse
+from store_matcher import StoreJoin, catalog_rows
+
+RULES = {
+    "gatekeeping": {"aspect_ratio": True, "panel_type": True, "use_case_market_segment": True, "resolution": True},
+    "numeric_specs": ["refresh_rate_hz", "response_time_ms", "size_inch"],
+    "tolerance": 0.15
+}
+
+LISTING = """
+<a href="/venta/lg-27gp850/"><img alt="Monitor LG UltraGear 27GP850"></a> $399.990
+<a href="/venta/aoc-24g2/"><img alt="Monitor AOC 24G2"></a> $189.990 Agotado
+"""
+
+
+def _product_page(name, sku, brand, price, specs):
+    node = {
+        "@type": "Product", "name": name, "sku": sku, "brand": {"name": brand},
+        "offers": {"price": price, "priceCurrency": "CLP"},
+        "additionalProperty": [{"name": k, "value": v} for k, v in specs.items()]
+    }
+    return f'<script type="application/ld+json">{json.dumps(node)}</script>'
+
+
+PAGES = {
+    "https://www.winpy.cl/monitores/": LISTING,
+    "https://www.winpy.cl/venta/lg-27gp850/": _product_page("LG UltraGear 27GP850", "27GP850-B", "LG", "399990", {
+        "Tipo de Panel": "IPS", "Resolución": "2560x1440", "Relación de aspecto": "16:9", "Tamaño de pantalla": "27 pulgadas",
+        "Frecuencia de actualización": "165 Hz", "Tiempo de respuesta": "1 ms"
+    }),
+    "https://www.winpy.cl/venta/aoc-24g2/": _product_page("AOC 24G2", "24G2", "AOC", "189990", {
+        "Tipo de Panel": "IPS", "Resolución": "1920x1080", "Relación de aspecto": "16:9", "Tamaño de pantalla": "23,8 pulgadas",
+        "Frecuencia de actualización": "144 Hz", "Tiempo de respuesta": "1 ms"
+    })
+}
+
+MY_PRODUCTS = [{"sku": "MY-27Q", "specs": {
+    "panel_type": "IPS", "resolution": "2560x1440", "aspect_ratio": "16:9",
+    "size_inch": 27, "refresh_rate_hz": 170, "response_time_ms": 1
+}}]
+
+
+def fake_fetch(url, headers=None, timeout=10, **kwargs):
+    body = PAGES.get(url)
+    return HttpResponse(200 if body else 404, url, body or "", None)
+
+
+def test_joins_a_crawled_snapshot_with_product_page_deltas():
+    store_dir = tempfile.mkdtemp()
+    adapter = ADAPTERS["winpy.cl"]
+    saved_fetch = catalog_crawler.fetch
+    catalog_crawler.fetch = fake_fetch
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            products, complete = crawl_category(adapter, "monitors", HostLimiter(min_interval=0), pool)
+        assert complete and len(products) == 2
+        write_snapshot(adapter, products, store_dir=store_dir)
+
+        # A listing crawl alone has no SKU or specs to join on
+        join = StoreJoin("monitor", RULES)
+        assert join.load_catalog(catalog_rows(adapter.name, store_dir=store_dir)) == 0
+
+        # Product pages, as sitemap_discovery --fetch stores them, fill those in
+        with SnapshotWriter(adapter.name, kind="delta", meta={"removed": []}, store_dir=store_dir) as writer:
+            for product in products:
+                page = fake_fetch(product["url"]).body
+                writer.append(adapter.parse_product(page, product["url"]))
+    finally:
+        catalog_crawler.fetch = saved_fetch
+
+    rows = catalog_rows(adapter.name, store_dir=store_dir)
+    assert {r["sku"] for r in rows} == {"27GP850-B", "24G2"}
+    assert all(r["category"] == "monitors" for r in rows)
+
+    join = StoreJoin("monitor", RULES)
+    assert join.load_catalog(rows) == 2
+    best = join.match(MY_PRODUCTS)
+    comparison, regional = join.rows(best)
+    assert [c["competitor_sku"] for c in comparison] == ["27GP850-B"]
+    assert regional[0]["product_page_url"] == "https://www.winpy.cl/venta/lg-27gp850/"
+    assert regional[0]["available"] is True
+
+
+def test_unknown_availability_stays_unknown():
+    join = StoreJoin("monitor", RULES)
+    join.load_catalog([{"sku": "27GP850", "url": "https://www.winpy.cl/venta/lg-27gp850/", "specs": MY_PRODUCTS[0]["specs"]}])
+    _, regional = join.rows(join.match(MY_PRODUCTS))
+    assert regional and regional[0]["available"] is None
+
+
+def test_category_without_numeric_specs_can_match():
+    rules = {"gatekeeping": {"socket": True, "chipset": True}, "numeric_specs": [], "tolerance": 0.0}
+    join = StoreJoin("motherboard", rules)
+    join.load_catalog([
+        {"sku": "B650M", "url": "https://example.com/b650m", "specs": {"socket": "AM5", "chipset": "B650"}},
+        {"sku": "B760M", "url": "https://example.com/b760m", "specs": {"socket": "LGA1700", "chipset": "B760"}}
+    ])
+    best = join.match([{"sku": "MY-AM5", "specs": {"socket": "AM5", "chipset": "B650"}}])
+    assert [join.candidates[ref]["sku"] for _, ref in best["MY-AM5"]] == ["B650M"]
+
+
+if __name__ == "__main__":
+    test_joins_a_crawled_snapshot_with_product_page_deltas()
+    test_unknown_availability_stays_unknown()
+    test_category_without_numeric_specs_can_match()
+    print("store_matcher end to end: OK")
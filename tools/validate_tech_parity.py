@@ -1,7 +1,64 @@
 
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
 import json
 
+def check_parity(target_specs: Dict[str, Any], candidate_specs: Dict[str, Any], rules: Dict[str, Any]) -> Tuple[bool, float, Optional[str]]:
+    """
+    Fast path of validate_parity for hot loops: same decision and score, but no log.
+    Returns: (is_match, parity_score, fail_code) where fail_code is the name of the
+    gate or numeric spec that rejected the candidate (None on a match).
+    Use explain_parity to get the human-readable log for the few candidates that need it.
+    """
+    # 1. Gatekeeping: only strict gates can reject
+    for feature, strict in rules.get("gatekeeping", {}).items():
+        if not strict:
+            continue
+        target_val = target_specs.get(feature)
+        if not target_val:
+            continue
+        candidate_val = candidate_specs.get(feature)
+        if not candidate_val:
+            continue
+        if target_val == candidate_val and type(target_val) is type(candidate_val):
+            continue
+        t_norm = str(target_val).lower().strip()
+        c_norm = str(candidate_val).lower().strip()
+        if t_norm and c_norm and t_norm != c_norm:
+            return False, 0.0, feature
+
+    # 2. Numeric Tolerance
+    tolerance_pct = rules.get("tolerance", 0.20)
+    match_score_accum = 0.0
+    valid_comparisons = 0
+    for key in rules.get("numeric_specs", []):
+        t_num = target_specs.get(key)
+        if t_num is None:
+            continue
+        c_num = candidate_specs.get(key)
+        if c_num is None:
+            continue
+        try:
+            t_val = float(t_num)
+            c_val = float(c_num)
+        except ValueError:
+            continue
+        if t_val == 0:
+            continue
+        delta = abs(t_val - c_val) / t_val
+        # Written as validate_parity's pass test so NaN/inf deltas fail here too
+        if not delta <= tolerance_pct:
+            return False, 0.0, key
+        match_score_accum += (1.0 - delta)
+        valid_comparisons += 1
+
+    return True, (match_score_accum / valid_comparisons if valid_comparisons > 0 else 0.5), None
+
+def explain_parity(target_specs: Dict[str, Any], candidate_specs: Dict[str, Any], rules: Dict[str, Any]) -> List[str]:
+    """
+    The full logic log of validate_parity, for matches that are pushed or displayed.
+    """
+    return validate_parity(target_specs, candidate_specs, rules)[2]
+
 def validate_parity(target_specs: Dict[str, Any], candidate_specs: Dict[str, Any], rules: Dict[str, Any]) -> Tuple[bool, float, List[str]]:
     """
     Validates if a candidate matches the target specs based on Rules.
@@ -81,3 +138,4 @@ if __name__ == "__main__":
     print("Test Pass:", validate_parity(t_spec, c_spec_pass, rules_mock))
     print("Test Fail Gate:", validate_parity(t_spec, c_spec_fail_gate, rules_mock))
     print("Test Fail Num:", validate_parity(t_spec, c_spec_fail_num, rules_mock))
+    print("Fast Path:", [check_parity(t_spec, c, rules_mock) for c in (c_spec_pass, c_spec_fail_gate, c_spec_fail_num)])
@@ -2,11 +2,15 @@ import os
 import argparse
 import sys
 import json
-import urllib.request
-import urllib.parse
-import urllib.error
 from supabase import create_client, Client
-import http.client
+
+# Ensure sibling imports work
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from http_cassette import fetch, get_cassette
+from serper_client import serper_post
+from pipeline_trace import span, count, start_run, finish_run
+from db_outbox import get_outbox, flush_report
 
 try:
     from dotenv import load_dotenv
@@ -29,69 +33,54 @@ def is_broken_link(url: str) -> bool:
     """
     Checks if a link returns a 4xx/5xx error or contains 'soft 404' indicators.
     """
-    try:
-        req = urllib.request.Request(
-            url, 
-            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    with span("link_check"):
+        response = fetch(
+            url,
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'},
+            timeout=10,
+            max_bytes=100000
         )
-        response = urllib.request.urlopen(req, timeout=10)
-        
-        # If redirect, check the final URL
-        final_url = response.geturl()
-        
-        # Read a portion of the response to check for soft 404s
-        html = response.read(100000).decode('utf-8', errors='ignore').lower()
-
-        soft_404_markers = [
-            "page not found",
-            "could not find requested resource",
-            "sorry, the page you're looking for is not available",
-            "the page you requested was not found",
-            "we can't seem to find the page you're looking for",
-            "404 not found",
-            "<title>404</title>",
-            "<title>page not found</title>"
-        ]
-        
-        for marker in soft_404_markers:
-            if marker in html:
-                return True
-                
-        return False
-    except urllib.error.HTTPError as e:
-        # 403 Forbidden and 503 Service Unavailable are often WAF/Cloudflare bot protection, NOT broken links.
-        if e.code in [403, 503, 429]:
-            return False
-        return True
-    except Exception as e:
-        # Timeout, 404, etc are considered broken
+    count("link_checks")
+    if response.error:
+        # Timeouts and connection errors are considered broken
         return True
+    if response.status >= 400:
+        # 403 Forbidden and 503 Service Unavailable are often WAF/Cloudflare bot protection, NOT broken links.
+        return response.status not in [403, 503, 429]
+
+    # Check the (post-redirect) page for soft 404s
+    html = response.body.lower()
+
+    soft_404_markers = [
+        "page not found",
+        "could not find requested resource",
+        "sorry, the page you're looking for is not available",
+        "the page you requested was not found",
+        "we can't seem to find the page you're looking for",
+        "404 not found",
+        "<title>404</title>",
+        "<title>page not found</title>"
+    ]
+
+    for marker in soft_404_markers:
+        if marker in html:
+            return True
+
+    return False
 
 def find_new_link(brand: str, sku: str) -> str:
     """
     Use Google Serper API to find the official product page.
     """
-    if not SERPER_API_KEY:
+    if not SERPER_API_KEY and get_cassette("serper").mode not in ("replay", "auto"):
         print("Warning: SERPER_API_KEY not found. Cannot search for replacement.")
         return None
-        
-    conn = http.client.HTTPSConnection("google.serper.dev")
+
     query = f"{brand} {sku} official product page"
-    payload = json.dumps({
-        "q": query,
-        "num": 5
-    })
-    headers = {
-        'X-API-KEY': SERPER_API_KEY,
-        'Content-Type': 'application/json'
-    }
-    
+
     try:
-        conn.request("POST", "/search", payload, headers)
-        res = conn.getresponse()
-        data = res.read().decode("utf-8")
-        json_data = json.loads(data)
-        
+        json_data = serper_post("/search", {"q": query, "num": 5})
+
         if 'organic' in json_data and len(json_data['organic']) > 0:
             brand_lower = brand.lower().replace(" ", "")
             # Try to find an official site first
@@ -99,12 +88,12 @@ def find_new_link(brand: str, sku: str) -> str:
                 link = result.get('link', '')
                 if brand_lower in link.lower() and ('support' not in link.lower() or 'manual' not in link.lower()):
                     return link
-            
+
             # Fallback to first organic
             return json_data['organic'][0]['link']
     except Exception as e:
         print(f"Serper Search Error: {e}")
-        
+
     return None
 
 def verify_and_repair(table_name: str, check_all: bool = False, recheck_valid: bool = False):
@@ -121,6 +110,8 @@ def verify_and_repair(table_name: str, check_all: bool = False, recheck_valid: b
     
     repaired_count = 0
     broken_count = 0
+    # Status updates are queued on disk and delivered in one flush at the end
+    outbox = get_outbox()
     
     for row in data:
         url = row['competitor_url']
@@ -140,25 +131,20 @@ def verify_and_repair(table_name: str, check_all: bool = False, recheck_valid: b
                 if not is_broken_link(new_url):
                     print("OK!")
                     # Update Supabase with new URL and status
-                    try:
-                        update_res = client.table(table_name).update({"competitor_url": new_url, "link_status": "valid"}).eq("id", rid).execute()
-                        print(f"  -> Updated successfully.")
-                        repaired_count += 1
-                    except Exception as e:
-                        print(f"  -> Failed to update: {e}")
+                    outbox.enqueue(table_name, "update", {"competitor_url": new_url, "link_status": "valid"}, filters=[("eq", "id", rid)])
+                    print(f"  -> Update queued.")
+                    repaired_count += 1
                 else:
                     print("New link is also broken! Marking as broken.")
-                    client.table(table_name).update({"link_status": "broken"}).eq("id", rid).execute()
+                    outbox.enqueue(table_name, "update", {"link_status": "broken"}, filters=[("eq", "id", rid)])
             else:
                 print("  -> Could not find a suitable replacement. Marking as broken.")
-                client.table(table_name).update({"link_status": "broken"}).eq("id", rid).execute()
+                outbox.enqueue(table_name, "update", {"link_status": "broken"}, filters=[("eq", "id", rid)])
         else:
             print("OK. Marking as valid.")
-            try:
-                client.table(table_name).update({"link_status": "valid"}).eq("id", rid).execute()
-            except Exception as e:
-                pass
-            
+            outbox.enqueue(table_name, "update", {"link_status": "valid"}, filters=[("eq", "id", rid)])
+
+    flush_report(client, table_name)
     print(f"\nVerification Complete!")
     print(f"Total checked: {len(data)}")
     print(f"Broken links found: {broken_count}")
@@ -170,4 +156,6 @@ if __name__ == "__main__":
     parser.add_argument("--recheck-valid", action="store_true", help="Recheck links that are already marked as valid")
     
     args = parser.parse_args()
+    start_run("verify_links")
     verify_and_repair(args.table, recheck_valid=args.recheck_valid)
+    finish_run()